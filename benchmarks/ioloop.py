@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Compare the requests per second a worker serves on each event loop backend
+using a JSON endpoint on tinman.handlers.base.RequestHandler. Each backend
+runs in its own process and is driven by a client process on the default
+IOLoop so the client is the same for every run. Backends that are not
+available in this environment are skipped.
+
+    python benchmarks/ioloop.py --requests 5000 --concurrency 50
+
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tornado import httpclient
+from tornado import httpserver
+
+from tinman import application
+from tinman import eventloop
+from tinman import sockets
+from tinman.handlers import base
+
+ROUTES = [['/', '__main__.Handler']]
+
+
+class Handler(base.RequestHandler):
+
+    def get(self):
+        self.write({'message': 'Hello World',
+                    'request': {'method': self.request.method,
+                                'path': self.request.path,
+                                'remote_ip': self.request.remote_ip}})
+
+
+def serve(backend, port, ready):
+    """Run the application on the event loop backend.
+
+    :param str backend: The event loop backend
+    :param int port: The port to listen on
+    :param multiprocessing.Event ready: Set once the server is listening
+
+    """
+    io_loop = eventloop.install(backend)
+    app = application.Application({'ui_modules': {}}, ROUTES, port)
+    server = httpserver.HTTPServer(app)
+    server.add_sockets(sockets.bind(port, '127.0.0.1'))
+    io_loop.add_callback(ready.set)
+    io_loop.start()
+
+
+def drive(port, requests, concurrency, result):
+    """Send the requests with the concurrency, putting the elapsed time and
+    number of failed requests on the result queue.
+
+    :param int port: The port to send the requests to
+    :param int requests: The number of requests to send
+    :param int concurrency: The number of requests in flight
+    :param multiprocessing.Queue result: The result queue
+
+    """
+    from tornado import ioloop
+    io_loop = ioloop.IOLoop.instance()
+    client = httpclient.AsyncHTTPClient(io_loop=io_loop,
+                                        max_clients=concurrency)
+    state = {'sent': 0, 'done': 0, 'failed': 0}
+    url = 'http://127.0.0.1:%i/' % port
+
+    def on_response(response):
+        state['done'] += 1
+        if response.error:
+            state['failed'] += 1
+        if state['done'] == requests:
+            io_loop.stop()
+        elif state['sent'] < requests:
+            send()
+
+    def send():
+        state['sent'] += 1
+        client.fetch(url, on_response)
+
+    start = time.time()
+    for _ in range(0, min(concurrency, requests)):
+        send()
+    io_loop.start()
+    result.put((time.time() - start, state['failed']))
+
+
+def run(backend, port, requests, concurrency):
+    """Benchmark the event loop backend, returning the requests per second
+    and the number of failed requests.
+
+    :param str backend: The event loop backend
+    :param int port: The port to listen on
+    :param int requests: The number of requests to send
+    :param int concurrency: The number of requests in flight
+    :rtype: tuple(float, int)
+
+    """
+    ready, result = multiprocessing.Event(), multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve,
+                                     args=(backend, port, ready))
+    server.start()
+    try:
+        if not ready.wait(10):
+            raise RuntimeError('The %s server did not start' % backend)
+        client = multiprocessing.Process(target=drive,
+                                         args=(port, requests, concurrency,
+                                               result))
+        client.start()
+        elapsed, failed = result.get()
+        client.join()
+    finally:
+        server.terminate()
+        server.join()
+    return requests / elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--backends', nargs='+', default=eventloop.BACKENDS,
+                        choices=eventloop.BACKENDS)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--port', type=int, default=8910)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+    # Run the default backend first so the others are compared against it
+    backends = sorted(args.backends,
+                      key=lambda value: (value != eventloop.DEFAULT, value))
+    baseline = None
+    for offset, backend in enumerate(backends):
+        try:
+            eventloop.check(backend)
+        except ValueError as error:
+            print('%-8s skipped: %s' % (backend, error))
+            continue
+        rps, failed = run(backend, args.port + offset, args.requests,
+                          args.concurrency)
+        baseline = baseline or rps
+        print('%-8s %10.1f req/s %6i failed %+7.1f%%' %
+              (backend, rps, failed, (rps / baseline - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
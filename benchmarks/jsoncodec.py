@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Compare the cost of encoding a large dict response with each installed JSON
+backend in tinman.jsoncodec against the way RequestHandler.write encoded
+dicts before, with json.dumps, a copy to escape "</", a copy to append the
+newline and a copy to encode it as UTF-8.
+
+    python benchmarks/jsoncodec.py --records 1000 --iterations 200
+
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tornado import escape
+
+from tinman import jsoncodec
+
+
+def build(records, generator):
+    """Return a response dict with the number of records in it.
+
+    :param int records: The number of records
+    :param random.Random generator: The random number generator
+    :rtype: dict
+
+    """
+    return {'count': records,
+            'next': '/api/v1/items?page=2',
+            'items': [{'id': offset,
+                       'name': u'Item %i \u2603' % offset,
+                       'description': '<p>Item %i</p>' % offset,
+                       'price': round(generator.random() * 100, 2),
+                       'tags': ['tag%i' % generator.randint(0, 50)
+                                for _ in range(0, 5)],
+                       'available': generator.random() > 0.5,
+                       'dimensions': {'height': generator.randint(1, 100),
+                                      'width': generator.randint(1, 100)}}
+                      for offset in range(0, records)]}
+
+
+def current(value):
+    """Encode the value the way RequestHandler.write did before the JSON
+    backends were added.
+
+    :param dict value: The value to encode
+    :rtype: list
+
+    """
+    chunk = json.dumps(value, ensure_ascii=False).replace("</", "<\\/") + '\n'
+    return [escape.utf8(chunk)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--records', type=int, default=1000)
+    args = parser.parse_args()
+    value = build(args.records, random.Random(0))
+    size = len(current(value)[0])
+    baseline = timeit.timeit(lambda: current(value),
+                             number=args.iterations) / args.iterations
+    print('%i records, %.1f KB per response' % (args.records, size / 1024.0))
+    print('%-8s %12s %10s %9s' % ('backend', 'responses/s', 'MB/s',
+                                  'speedup'))
+    print('%-8s %12.1f %10.1f %8.1fx' % ('current', 1 / baseline,
+                                         size / baseline / 1048576, 1.0))
+    for backend in [jsoncodec.DEFAULT, jsoncodec.UJSON, jsoncodec.ORJSON]:
+        codec = jsoncodec.codec(backend)
+        if codec.name != backend:
+            print('%-8s %12s' % (backend, 'not installed'))
+            continue
+        elapsed = timeit.timeit(lambda: [codec.dumps(value), b'\n'],
+                                number=args.iterations) / args.iterations
+        print('%-8s %12.1f %10.1f %8.1fx' % (backend, 1 / elapsed,
+                                             size / elapsed / 1048576,
+                                             baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
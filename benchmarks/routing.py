@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Compare the per-request cost of finding the request handler for a request in
+a tornado.web.Application, which tries every route's regex in order, with the
+cost in a tinman.application.Application, which uses the dispatch index in
+tinman.routing, as the number of routes grows. Both are timed through the
+request dispatcher the HTTP server uses. Half of the routes are literal paths
+and half have path arguments, and the requested paths are spread across the
+whole table so the hot routes are not first.
+
+    python benchmarks/routing.py --routes 10 100 500 1000
+
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tornado import web
+
+from tinman import application
+
+HANDLER = 'tornado.web.RequestHandler'
+
+
+def build(count, generator):
+    """Return the tinman routes for a route table and paths that match them.
+
+    :param int count: The number of routes
+    :param random.Random generator: The random number generator
+    :rtype: tuple(list, list)
+
+    """
+    routes, paths = list(), list()
+    for offset in range(0, count):
+        resource = 'resource%i' % offset
+        if offset % 2:
+            routes.append(['re', r'/api/v1/%s/([0-9]+)' % resource, HANDLER])
+            paths.append('/api/v1/%s/%i' % (resource,
+                                            generator.randint(1, 1000)))
+        else:
+            routes.append(['/api/v1/%s' % resource, HANDLER])
+            paths.append('/api/v1/%s' % resource)
+    generator.shuffle(paths)
+    return routes, paths
+
+
+def request(path):
+    """Return a GET request for the path.
+
+    :param str path: The request path
+    :rtype: tornado.httputil.HTTPServerRequest
+
+    """
+    try:
+        from tornado import httputil
+        return httputil.HTTPServerRequest('GET', path)
+    except (AttributeError, ImportError):
+        from tornado import httpserver
+        return httpserver.HTTPRequest('GET', path)
+
+
+def tornado_app(routes):
+    """Return a tornado.web.Application for the tinman routes.
+
+    :param list routes: The tinman routes
+    :rtype: tornado.web.Application
+
+    """
+    return web.Application([(route[-2], web.RequestHandler)
+                            for route in routes])
+
+
+def find_handler(app, value):
+    """Find the request handler for the request the way the HTTP server
+    does, returning the path arguments.
+
+    :param tornado.web.Application app: The application
+    :param request value: The request
+    :rtype: list
+
+    """
+    if application.REQUEST_DISPATCHER:
+        if isinstance(app, application.Application):
+            dispatcher = application.RequestDispatcher(app, None)
+        else:
+            dispatcher = web._RequestDispatcher(app, None)
+        dispatcher.request = value
+        dispatcher._find_handler()
+        return dispatcher.path_args
+    if isinstance(app, application.Application):
+        return app._find_handler(value).path_args
+    for spec in app._get_host_handlers(value):
+        match = spec.regex.match(value.path)
+        if match:
+            return [web._unquote_or_none(arg) if hasattr(web, '_unquote_or_none')
+                    else arg for arg in match.groups()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--routes', nargs='+', type=int,
+                        default=[10, 100, 500, 1000])
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+    generator = random.Random(0)
+    print('%8s %14s %14s %9s' % ('routes', 'linear us/req', 'index us/req',
+                                 'speedup'))
+    for count in args.routes:
+        routes, paths = build(count, generator)
+        linear = tornado_app(routes)
+        indexed = application.Application({'ui_modules': {}}, routes, 8000)
+        requests = [request(paths[offset % len(paths)])
+                    for offset in range(0, args.requests)]
+        for value in requests[:len(paths)]:
+            assert (find_handler(indexed, value) ==
+                    find_handler(linear, value)), value.path
+        linear_time = timeit.timeit(
+            lambda: [find_handler(linear, value) for value in requests],
+            number=1)
+        index_time = timeit.timeit(
+            lambda: [find_handler(indexed, value) for value in requests],
+            number=1)
+        print('%8i %14.2f %14.2f %8.1fx' %
+              (count, linear_time / args.requests * 1000000,
+               index_time / args.requests * 1000000,
+               linear_time / index_time))
+
+
+if __name__ == '__main__':
+    main()
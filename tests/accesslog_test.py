@@ -0,0 +1,108 @@
+import json
+import logging
+import sys
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tinman import accesslog
+
+
+class Request(object):
+    method = 'GET'
+    remote_ip = '127.0.0.1'
+
+    def __init__(self, uri, duration):
+        self.uri = uri
+        self.duration = duration
+
+    def request_time(self):
+        return self.duration
+
+
+class Handler(object):
+
+    def __init__(self, status, uri='/', duration=0.001):
+        self.request = Request(uri, duration)
+        self.status = status
+
+    def get_status(self):
+        return self.status
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class AccessLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        accesslog.ACCESS_LOGGER.addHandler(self.handler)
+        accesslog.ACCESS_LOGGER.setLevel(logging.INFO)
+
+    def tearDown(self):
+        accesslog.ACCESS_LOGGER.removeHandler(self.handler)
+
+    def lines(self):
+        return [json.loads(line) for message in self.handler.messages
+                for line in message.split('\n')]
+
+    def test_records_are_written_in_batches(self):
+        log = accesslog.AccessLog(batch_size=10, flush_interval=0.01)
+        for offset in range(0, 25):
+            log.add(Handler(200, '/%i' % offset), '/$')
+        log.stop(5)
+        self.assertEqual(len(self.lines()), 25)
+        self.assertLessEqual(len(self.handler.messages), 3)
+        self.assertEqual(self.lines()[0]['route'], '/$')
+
+    def test_successful_requests_are_sampled(self):
+        log = accesslog.AccessLog(flush_interval=0.01, sample_rate=0.0)
+        log.add(Handler(200))
+        log.stop(5)
+        self.assertEqual(log.sampled_out, 1)
+        self.assertEqual(self.lines(), [])
+
+    def test_failed_and_slow_requests_are_always_logged(self):
+        log = accesslog.AccessLog(flush_interval=0.01, sample_rate=0.0,
+                                  slow_threshold=0.5)
+        log.add(Handler(500))
+        log.add(Handler(404))
+        log.add(Handler(200, duration=1.0))
+        log.stop(5)
+        self.assertEqual([line['status'] for line in self.lines()],
+                         [500, 404, 200])
+
+    def test_records_are_dropped_when_the_queue_is_full(self):
+        log = accesslog.AccessLog(flush_interval=0.01, max_queue=1)
+        log._stopping.set()
+        log._thread.join(5)
+        log.add(Handler(200))
+        log.add(Handler(200))
+        self.assertEqual(log.dropped, 1)
+
+    def test_non_utf8_uri_is_logged(self):
+        log = accesslog.AccessLog(flush_interval=0.01)
+        log.add(Handler(200, b'/\xff'))
+        log.add(Handler(200, '/ok'))
+        log.stop(5)
+        self.assertEqual([line['uri'] for line in self.lines()],
+                         [u'/\ufffd', u'/ok'])
+
+    def test_unformattable_record_does_not_drop_batch(self):
+        log = accesslog.AccessLog(batch_size=10, flush_interval=0.01)
+        log.add(Handler(200, '/before'))
+        log.add(Handler(200, '/bad'), object())
+        log.add(Handler(200, '/after'))
+        log.stop(5)
+        self.assertEqual([line['uri'] for line in self.lines()],
+                         ['/before', '/after'])
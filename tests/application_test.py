@@ -1,5 +1,15 @@
+import json
 import mock
+import os
+import shutil
+import socket
 import sys
+import tempfile
+import time
+from tornado import gen
+from tornado import ioloop
+from tornado import iostream
+from tornado import testing
 from tornado import web
 try:
     import unittest2 as unittest
@@ -8,6 +18,10 @@ except ImportError:
 sys.path.insert(0, '..')
 
 from tinman import application
+from tinman import exceptions
+from tinman import jsoncodec
+from tinman import routing
+from tinman import stats
 
 
 class ApplicationTests(unittest.TestCase):
@@ -79,3 +93,611 @@ class AttributeTests(unittest.TestCase):
     def test_attribute_remove_raises(self):
         obj = application.TinmanAttributes()
         self.assertRaises(AttributeError, obj.remove, 'test_attr')
+
+
+class AttributeRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.obj = application.Attributes()
+        self.created = list()
+        self.closed = list()
+
+    def register(self, name):
+        def factory():
+            self.created.append(name)
+            return name.upper()
+        self.obj.register(name, factory, self.closed.append)
+
+    def test_registered_attribute_in_obj(self):
+        self.register('test_attr')
+        self.assertTrue('test_attr' in self.obj)
+
+    def test_factory_is_lazy(self):
+        self.register('test_attr')
+        self.assertEqual(self.created, [])
+
+    def test_factory_is_invoked_once(self):
+        self.register('test_attr')
+        self.assertEqual(self.obj.test_attr, 'TEST_ATTR')
+        self.assertEqual(self.obj.test_attr, 'TEST_ATTR')
+        self.assertEqual(self.created, ['test_attr'])
+
+    def test_register_existing_raises(self):
+        self.obj.test_attr = 'value'
+        self.assertRaises(AttributeError, self.obj.register, 'test_attr',
+                          lambda: None)
+
+    def test_close_in_reverse_creation_order(self):
+        for name in ['first', 'second', 'third']:
+            self.register(name)
+        self.obj.third, self.obj.first
+        self.obj.close()
+        self.assertEqual(self.closed, ['FIRST', 'THIRD'])
+
+    def test_not_created_after_close(self):
+        self.register('test_attr')
+        self.obj.close()
+        self.assertIsNone(self.obj.test_attr)
+
+    def test_reset_creates_new_value(self):
+        self.register('test_attr')
+        self.obj.test_attr
+        self.obj.reset('test_attr')
+        self.assertFalse(self.obj.created('test_attr'))
+        self.obj.test_attr
+        self.assertEqual(self.created, ['test_attr', 'test_attr'])
+
+
+class PrecompileTemplatesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, 'admin'))
+        self.write('base.html', '<html>{% block content %}{% end %}</html>')
+        self.write('admin/page.html', '{% extends "../base.html" %}'
+                                      '{% block content %}page{% end %}')
+        self.write('notes.md', '{% if %}')
+        self.settings = {'precompile_templates': True}
+
+    def tearDown(self):
+        web.RequestHandler._template_loaders.pop(self.path, None)
+        shutil.rmtree(self.path)
+
+    def write(self, name, value):
+        with open(os.path.join(self.path, name), 'w') as handle:
+            handle.write(value)
+
+    def test_templates_are_compiled(self):
+        application.precompile_templates(self.path, self.settings)
+        loader = web.RequestHandler._template_loaders[self.path]
+        self.assertEqual(sorted(loader.templates),
+                         ['admin/page.html', 'base.html'])
+
+    def test_errors_are_returned(self):
+        self.write('broken.html', '{% if %}')
+        errors = application.precompile_templates(self.path, self.settings)
+        self.assertEqual(list(errors), ['broken.html'])
+
+    def test_missing_parent_is_an_error(self):
+        self.write('orphan.html', '{% extends "missing.html" %}')
+        errors = application.precompile_templates(self.path, self.settings)
+        self.assertEqual(list(errors), ['orphan.html'])
+
+    def test_patterns(self):
+        self.settings['precompile_templates'] = ['*.md']
+        errors = application.precompile_templates(self.path, self.settings)
+        self.assertEqual(list(errors), ['notes.md'])
+
+    def test_template_cache_disabled(self):
+        self.settings['compiled_template_cache'] = False
+        application.precompile_templates(self.path, self.settings)
+        self.assertNotIn(self.path, web.RequestHandler._template_loaders)
+
+
+class PreloadTests(unittest.TestCase):
+
+    ROUTES = [['/', 'tinman.handlers.base.RequestHandler'],
+              ['re', r'/(\d+)', 'tinman.handlers.static.StaticFileHandler'],
+              'invalid']
+    SETTINGS = {'transforms': ['tinman.transforms.Transform',
+                               {'name': 'tinman.transforms.Other'}],
+                'ui_modules': {'Module': 'tinman.modules.Module'}}
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        application._translations_path = None
+
+    def tearDown(self):
+        application._translations_path = None
+        web.RequestHandler._template_loaders.pop(self.path, None)
+        shutil.rmtree(self.path)
+
+    def preload(self, settings, routes=None):
+        with mock.patch('gc.freeze', create=True):
+            application.preload(settings, routes)
+
+    def test_classes_are_imported(self):
+        with mock.patch('tinman.utils.import_namespaced_class') as import_:
+            self.preload(self.SETTINGS, self.ROUTES)
+        self.assertEqual([call[0][0] for call in import_.call_args_list],
+                         ['tinman.handlers.base.RequestHandler',
+                          'tinman.handlers.static.StaticFileHandler',
+                          'tinman.transforms.Transform',
+                          'tinman.transforms.Other',
+                          'tinman.modules.Module'])
+
+    def test_modules_are_imported(self):
+        name = 'tinman.example'
+        module = sys.modules.pop(name, None)
+        try:
+            self.preload({}, [['/', '%s.Handler' % name]])
+            self.assertIn(name, sys.modules)
+        finally:
+            if module:
+                sys.modules[name] = module
+
+    def test_import_failures_are_logged(self):
+        errors = {'tinman.transforms.Transform': ImportError('missing'),
+                  'tinman.transforms.Other': AttributeError('missing')}
+
+        def import_class(class_path):
+            if class_path in errors:
+                raise errors[class_path]
+
+        with mock.patch('tinman.utils.import_namespaced_class') as import_:
+            import_.side_effect = import_class
+            with mock.patch('tinman.application.LOGGER') as logger:
+                self.preload(self.SETTINGS, self.ROUTES)
+        self.assertEqual(import_.call_count, 5)
+        self.assertEqual([call[0][1] for call in logger.error.call_args_list],
+                         ['tinman.transforms.Transform',
+                          'tinman.transforms.Other'])
+
+    def test_translations_are_loaded_once(self):
+        settings = {'paths': {'base': self.path,
+                              'translations': '{{base}}/i18n'}}
+        with mock.patch('tornado.locale.load_translations') as load:
+            self.preload(settings)
+            application.load_translations(os.path.join(self.path, 'i18n'))
+        load.assert_called_once_with(os.path.join(self.path, 'i18n'))
+
+    def test_templates_are_precompiled(self):
+        with open(os.path.join(self.path, 'page.html'), 'w') as handle:
+            handle.write('page')
+        self.preload({'paths': {'templates': self.path},
+                      'precompile_templates': True})
+        loader = web.RequestHandler._template_loaders[self.path]
+        self.assertEqual(list(loader.templates), ['page.html'])
+
+    def test_templates_are_not_precompiled_by_default(self):
+        self.preload({'paths': {'templates': self.path}})
+        self.assertNotIn(self.path, web.RequestHandler._template_loaders)
+
+
+class Handler(web.RequestHandler):
+
+    def get(self, *args, **kwargs):
+        value = {'args': args, 'kwargs': kwargs,
+                 'handler': self.__class__.__name__,
+                 'in_flight': self.application.requests_in_flight}
+        if self.application.stats:
+            value['routes'] = self.application.stats.fleet.as_dict()['routes']
+        self.write(value)
+
+
+class OtherHandler(Handler):
+    pass
+
+
+class SlowHandler(web.RequestHandler):
+
+    @web.asynchronous
+    def get(self):
+        ioloop.IOLoop.current().add_timeout(time.time() + 0.1, self.finish)
+
+
+class UploadHandler(web.RequestHandler):
+
+    def post(self):
+        self.write({'body': self.request.body.decode('utf-8')})
+
+
+ROUTES = [['/', '%s.Handler' % __name__],
+          ['re', r'/items/(?P<item>[0-9]+)', '%s.Handler' % __name__]]
+
+
+class ApplicationCreateTests(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = {'ui_modules': {}}
+
+    def test_create(self):
+        app = application.Application(self.settings, ROUTES, 8000)
+        self.assertEqual(app.port, 8000)
+        self.assertEqual(app.requests_in_flight, 0)
+
+    def test_default_json_codec(self):
+        app = application.Application(self.settings, ROUTES, 8000)
+        self.assertEqual(app.json_codec.name, jsoncodec.DEFAULT)
+
+    def test_json_backend(self):
+        self.settings['json_backend'] = jsoncodec.AUTOMATIC
+        app = application.Application(self.settings, ROUTES, 8000)
+        self.assertEqual(app.json_codec.name,
+                         jsoncodec.codec(jsoncodec.AUTOMATIC).name)
+
+    def test_no_routes(self):
+        self.assertRaises(exceptions.NoRoutesException,
+                          application.Application, self.settings, [], 8000)
+
+
+class DispatchTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return application.Application({'ui_modules': {}}, ROUTES,
+                                       self.get_http_port())
+
+    def handler(self, path):
+        response = self.fetch(path)
+        return json.loads(response.body.decode('utf-8'))['handler']
+
+    def test_request_is_in_flight_while_handled(self):
+        response = self.fetch('/')
+        self.assertEqual(json.loads(response.body.decode('utf-8'))['in_flight'],
+                         1)
+
+    def test_requests_in_flight_after_requests(self):
+        for _ in range(0, 3):
+            self.assertEqual(self.fetch('/').code, 200)
+        self.assertEqual(self._app.requests_in_flight, 0)
+        self.assertEqual(self._app.request_count, 3)
+        self.assertTrue(self._app.idle)
+
+    def test_not_found_is_not_left_in_flight(self):
+        self.assertEqual(self.fetch('/missing').code, 404)
+        self.assertEqual(self._app.requests_in_flight, 0)
+
+    def test_reverse_url(self):
+        self._app.add_handlers(r'.*$', [web.URLSpec(r'/named/([0-9]+)',
+                                                    OtherHandler,
+                                                    name='named')])
+        self.assertEqual(self._app.reverse_url('named', 1), '/named/1')
+        self.assertEqual(self.handler('/named/1'), 'OtherHandler')
+
+    def test_reverse_url_missing(self):
+        self.assertRaises(KeyError, self._app.reverse_url, 'missing')
+
+    def test_path_kwargs(self):
+        response = self.fetch('/items/10')
+        self.assertEqual(json.loads(response.body.decode('utf-8'))['kwargs'],
+                         {'item': '10'})
+
+
+class RouteIndexTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return application.Application({'ui_modules': {}}, ROUTES,
+                                       self.get_http_port())
+
+    def fetch_all(self, count):
+        for offset in range(0, count):
+            self.assertEqual(self.fetch('/items/%i' % offset).code, 200)
+
+    def test_index_built_once(self):
+        with mock.patch('tinman.routing.RouteIndex',
+                        wraps=routing.RouteIndex) as index:
+            self.fetch_all(20)
+            self.assertEqual(index.call_count, 1)
+        self.assertEqual(len(self._app._route_indexes), 1)
+
+    def test_index_rebuilt_after_add_handlers(self):
+        self.fetch_all(1)
+        self._app.add_handlers(r'other\.example\.com$',
+                               [('/other', OtherHandler)])
+        with mock.patch('tinman.routing.RouteIndex',
+                        wraps=routing.RouteIndex) as index:
+            self.fetch_all(5)
+            self.assertEqual(index.call_count, 1)
+
+    def test_index_rebuilt_after_reload(self):
+        self.fetch_all(1)
+        self._app.reload({'ui_modules': {}},
+                         ROUTES + [['/other', '%s.OtherHandler' % __name__]])
+        with mock.patch('tinman.routing.RouteIndex',
+                        wraps=routing.RouteIndex) as index:
+            self.fetch_all(5)
+            self.assertEqual(self.fetch('/other').code, 200)
+            self.assertEqual(index.call_count, 1)
+
+    def test_host_routes(self):
+        self._app.add_handlers(r'other\.example\.com$',
+                               [('/other', OtherHandler)])
+        self.assertEqual(self.fetch('/other').code, 404)
+        self.assertEqual(self.fetch('/other', headers={
+            'Host': 'other.example.com'}).code, 200)
+
+
+class StatsDispatchTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.stats = stats.Stats(ROUTES, [(self.get_http_port(), 0)])
+        return application.Application({'ui_modules': {}}, ROUTES,
+                                       self.get_http_port(),
+                                       self.stats.worker(0))
+
+    def test_route_in_flight_while_handled(self):
+        response = self.fetch('/items/1')
+        routes = json.loads(response.body.decode('utf-8'))['routes']
+        self.assertEqual(routes['/items/(?P<item>[0-9]+)$']['in_flight'], 1)
+        self.assertEqual(routes['/$']['in_flight'], 0)
+
+    def test_route_in_flight_after_requests(self):
+        for path in ['/', '/items/1', '/items/2']:
+            self.fetch(path)
+        routes = self.stats.as_dict()['routes']
+        self.assertEqual(routes['/$']['in_flight'], 0)
+        self.assertEqual(routes['/items/(?P<item>[0-9]+)$']['in_flight'], 0)
+
+    def test_requests_recorded_by_route(self):
+        for path in ['/', '/items/1', '/items/2', '/missing']:
+            self.fetch(path)
+        routes = self.stats.as_dict()['routes']
+        self.assertEqual(routes['/$']['requests'], 1)
+        self.assertEqual(routes['/items/(?P<item>[0-9]+)$']['requests'], 2)
+        self.assertEqual(routes[stats.OTHER]['requests'], 1)
+
+
+class AdmissionTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.stats = stats.Stats(ROUTES, [(self.get_http_port(), 0)])
+        settings = {'admission': {'max_in_flight': 1, 'retry_after': 5},
+                    'ui_modules': {}}
+        return application.Application(
+            settings, ROUTES + [['/slow', '%s.SlowHandler' % __name__],
+                                ['/upload', '%s.UploadHandler' % __name__]],
+            self.get_http_port(), self.stats.worker(0))
+
+    @gen.coroutine
+    def start_upload(self):
+        stream = iostream.IOStream(socket.socket())
+        yield stream.connect(('127.0.0.1', self.get_http_port()))
+        yield stream.write(b'POST /upload HTTP/1.1\r\nHost: localhost\r\n'
+                           b'Content-Length: 4\r\n\r\nab')
+        raise gen.Return(stream)
+
+    @unittest.skipUnless(application.REQUEST_DISPATCHER, 'Tornado 4 only')
+    @testing.gen_test
+    def test_uploads_over_limit_are_shed(self):
+        streams = list()
+        for _ in range(0, 3):
+            streams.append((yield self.start_upload()))
+        yield gen.sleep(0.1)
+        codes = list()
+        for stream in streams:
+            yield stream.write(b'cd')
+            status = yield stream.read_until(b'\r\n')
+            codes.append(int(status.split()[1]))
+            stream.close()
+        self.assertEqual(sorted(codes), [200, 503, 503])
+
+    @unittest.skipUnless(application.REQUEST_DISPATCHER, 'Tornado 4 only')
+    @testing.gen_test
+    def test_closed_upload_is_released(self):
+        stream = yield self.start_upload()
+        yield gen.sleep(0.1)
+        self.assertEqual(self._app.requests_in_flight, 1)
+        stream.close()
+        yield gen.sleep(0.1)
+        self.assertEqual(self._app.requests_in_flight, 0)
+
+    def fetch_concurrently(self, path, count):
+        responses = list()
+
+        def on_response(response):
+            responses.append(response)
+            if len(responses) == count:
+                self.stop()
+
+        for _ in range(0, count):
+            self.http_client.fetch(self.get_url(path), on_response)
+        self.wait()
+        return responses
+
+    def test_requests_over_limit_are_shed(self):
+        codes = sorted([response.code for response
+                        in self.fetch_concurrently('/slow', 3)])
+        self.assertEqual(codes, [200, 503, 503])
+
+    def test_shed_response_has_retry_after(self):
+        responses = self.fetch_concurrently('/slow', 2)
+        shed = [response for response in responses if response.code == 503]
+        self.assertEqual(shed[0].headers['Retry-After'], '5')
+
+    def test_shed_requests_are_counted(self):
+        self.fetch_concurrently('/slow', 3)
+        self.assertEqual(self._app.shed_count, 2)
+        self.assertEqual(self.stats.as_dict()['workers'][0]['shed'], 2)
+
+    def test_requests_under_limit_are_not_shed(self):
+        for _ in range(0, 3):
+            self.assertEqual(self.fetch('/slow').code, 200)
+        self.assertEqual(self._app.shed_count, 0)
+        self.assertEqual(self._app.requests_in_flight, 0)
+
+
+class ReloadTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return application.Application({'ui_modules': {}}, list(ROUTES),
+                                       self.get_http_port())
+
+    def handler(self, path):
+        response = self.fetch(path)
+        if response.code != 200:
+            return response.code
+        return json.loads(response.body.decode('utf-8'))['handler']
+
+    def specs(self):
+        return list(self._app._route_specs)
+
+    def test_unchanged_routes(self):
+        specs = self.specs()
+        self.assertTrue(self._app.reload({'ui_modules': {}}, list(ROUTES)))
+        self.assertEqual(self.specs(), specs)
+        self.assertEqual(self.handler('/'), 'Handler')
+
+    def test_added_route(self):
+        self.assertEqual(self.handler('/other'), 404)
+        self.assertTrue(self._app.reload(
+            {'ui_modules': {}},
+            ROUTES + [['/other', '%s.OtherHandler' % __name__]]))
+        self.assertEqual(self.handler('/other'), 'OtherHandler')
+        self.assertEqual(self.handler('/'), 'Handler')
+
+    def test_changed_route(self):
+        self.assertTrue(self._app.reload(
+            {'ui_modules': {}},
+            [['/', '%s.OtherHandler' % __name__], ROUTES[1]]))
+        self.assertEqual(self.handler('/'), 'OtherHandler')
+        self.assertEqual(self.handler('/items/1'), 'Handler')
+
+    def test_removed_route(self):
+        self.assertTrue(self._app.reload({'ui_modules': {}}, ROUTES[:1]))
+        self.assertEqual(self.handler('/items/1'), 404)
+        self.assertEqual(self.handler('/'), 'Handler')
+        self.assertEqual(len(self.specs()), 1)
+
+    def test_unchanged_specs_are_reused(self):
+        specs = self.specs()
+        self._app.reload({'ui_modules': {}},
+                         ROUTES + [['/other', '%s.OtherHandler' % __name__]])
+        self.assertIs(self.specs()[0], specs[0])
+        self.assertIs(self.specs()[1], specs[1])
+
+    def test_only_new_handlers_are_imported(self):
+        with mock.patch('tinman.utils.import_namespaced_class',
+                        return_value=OtherHandler) as import_class:
+            self._app.reload(
+                {'ui_modules': {}},
+                ROUTES + [['/other', '%s.OtherHandler' % __name__]])
+            import_class.assert_called_once_with(
+                '%s.OtherHandler' % __name__)
+
+    def test_import_error_keeps_routes(self):
+        specs = self.specs()
+        self.assertFalse(self._app.reload(
+            {'ui_modules': {}}, [['/', 'tinman.missing.Handler']]))
+        self.assertEqual(self.specs(), specs)
+        self.assertEqual(self.handler('/items/1'), 'Handler')
+
+    def test_named_routes(self):
+        self._app.reload({'ui_modules': {}},
+                         ROUTES + [['/other', '%s.OtherHandler' % __name__,
+                                    {}]])
+        self.assertEqual(self.handler('/other'), 'OtherHandler')
+
+    def test_restart_setting_is_not_applied(self):
+        self._app.reload({'ui_modules': {}, 'gzip': True}, list(ROUTES))
+        self.assertNotIn('gzip', self._app.settings)
+
+    def test_setting_is_applied(self):
+        self._app.reload({'ui_modules': {}, 'serve_traceback': True},
+                         list(ROUTES))
+        self.assertTrue(self._app.settings['serve_traceback'])
+
+    def test_removed_setting(self):
+        self._app.reload({'ui_modules': {}, 'serve_traceback': True},
+                         list(ROUTES))
+        self._app.reload({'ui_modules': {}}, list(ROUTES))
+        self.assertNotIn('serve_traceback', self._app.settings)
+
+    def test_admission_setting_is_applied(self):
+        self._app.reload({'ui_modules': {},
+                          'admission': {'max_in_flight': 2}}, list(ROUTES))
+        self.assertEqual(self._app._admission, {'max_in_flight': 2})
+
+
+class LazyURLSpecTests(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = mock.Mock(return_value=Handler)
+        self.spec = application.LazyURLSpec(r'/', '%s.Handler' % __name__,
+                                            {'value': 1}, 'home',
+                                            resolver=self.resolver)
+
+    def test_not_resolved_when_created(self):
+        self.assertFalse(self.resolver.called)
+
+    def test_resolves_handler_class(self):
+        self.assertIs(self.spec.handler_class, Handler)
+        self.resolver.assert_called_once_with('%s.Handler' % __name__)
+
+    def test_resolves_once(self):
+        for _ in range(0, 3):
+            self.spec.handler_class
+        self.assertEqual(self.resolver.call_count, 1)
+
+    def test_failed_import_is_cached(self):
+        self.resolver.return_value = None
+        for _ in range(0, 3):
+            self.assertIsNone(self.spec.handler_class)
+        self.assertEqual(self.resolver.call_count, 1)
+        self.assertTrue(self.spec.failed)
+
+    def test_kwargs_and_name(self):
+        self.assertEqual(self.spec.kwargs, {'value': 1})
+        self.assertEqual(self.spec.name, 'home')
+
+
+class LazyRoutesTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.import_class = mock.patch(
+            'tinman.utils.import_namespaced_class',
+            side_effect=lambda value: {'%s.Handler' % __name__: Handler}[value]
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+        super(LazyRoutesTests, self).setUp()
+
+    def get_app(self):
+        return application.Application({'lazy_routes': True,
+                                        'ui_modules': {}},
+                                       list(ROUTES), self.get_http_port())
+
+    def test_handlers_not_imported_when_created(self):
+        self.assertFalse(self.import_class.called)
+
+    def test_handler_imported_when_requested(self):
+        self.assertEqual(self.fetch('/').code, 200)
+        self.import_class.assert_called_once_with('%s.Handler' % __name__)
+
+    def test_handler_imported_once(self):
+        for path in ['/', '/', '/items/1']:
+            self.assertEqual(self.fetch(path).code, 200)
+        self.assertEqual(self.import_class.call_count, 1)
+
+    def test_failed_import_is_not_retried(self):
+        self._app.reload({'ui_modules': {}, 'lazy_routes': True},
+                         [['/broken', 'tinman.missing.Handler']])
+        self.import_class.side_effect = ImportError('No module named missing')
+        with mock.patch('tinman.application.LOGGER') as logger:
+            for _ in range(0, 3):
+                self.assertEqual(self.fetch('/broken').code, 500)
+            self.assertEqual(logger.critical.call_count, 1)
+        self.import_class.assert_called_once_with('tinman.missing.Handler')
+
+    def test_failed_import_retried_after_reload(self):
+        self._app.reload({'ui_modules': {}, 'lazy_routes': True},
+                         [['/broken', 'tinman.missing.Handler']])
+        self.import_class.side_effect = ImportError('No module named missing')
+        self.fetch('/broken')
+        self.import_class.side_effect = lambda value: Handler
+        self._app.reload({'ui_modules': {}, 'lazy_routes': True},
+                         [['/broken', 'tinman.missing.Handler'],
+                          ['/', '%s.Handler' % __name__]])
+        self.assertEqual(self.fetch('/broken').code, 200)
+
+    def test_import_time_recorded(self):
+        self.fetch('/')
+        self.assertIn(__name__, self._app.import_times)
@@ -0,0 +1,420 @@
+import mock
+import signal
+import sys
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tinman import controller
+from tinman import snapshot
+from tinman import stats
+
+
+def child(port=8000, worker=0, recycle=False, alive=True, pid=1000):
+    value = mock.Mock(port=port, worker=worker, exitcode=None, pid=pid)
+    value.name = 'ServerProcess.%i.%i' % (port, worker)
+    value.recycle.is_set.return_value = recycle
+    value.is_alive.return_value = alive
+    return value
+
+
+class ControllerTestCase(unittest.TestCase):
+
+    SERVER = {'ports': [8000]}
+
+    def setUp(self):
+        self.controller = controller.Controller.__new__(controller.Controller)
+        self.controller.config = mock.Mock()
+        self.controller.config.get.side_effect = \
+            {'HTTPServer': self.SERVER, 'Routes': []}.get
+        self.controller.config.application = {}
+        self.controller._state = controller.Controller.STATE_ACTIVE
+        self.controller.children = list()
+        self.controller.crash_limited = dict()
+        self.controller.crashes = dict()
+        self.controller.exits = dict()
+        self.controller.pending_respawns = dict()
+        self.controller.respawns = dict()
+        self.controller.restart_requested = False
+        self.controller.restarting = False
+        self.controller.retiring = set()
+        self.controller.sockets = dict()
+        self.controller.unix_sockets = dict()
+        self.controller.stats = stats.Stats([], self.controller.worker_slots)
+
+
+class RecycleTests(ControllerTestCase):
+
+    def setUp(self):
+        super(RecycleTests, self).setUp()
+        self.children = [child(worker=0, recycle=True), child(worker=1)]
+        self.controller.children.extend(self.children)
+        self.replace = mock.patch.object(self.controller,
+                                         'replace_child').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_sigusr1_does_not_replace_children(self):
+        self.controller.on_sigusr1(signal.SIGUSR1, None)
+        self.assertFalse(self.replace.called)
+
+    def test_sigusr1_wakes_sleeping_controller(self):
+        self.controller._state = controller.Controller.STATE_SLEEPING
+        with mock.patch('signal.setitimer') as setitimer:
+            self.controller.on_sigusr1(signal.SIGUSR1, None)
+            setitimer.assert_called_once_with(
+                signal.ITIMER_REAL, controller.Controller.MIN_WAKE_INTERVAL,
+                0)
+
+    def test_process_replaces_recycled_children(self):
+        self.controller.process()
+        self.replace.assert_called_once_with(self.children[0])
+        self.assertFalse(self.controller.restarting)
+
+    def test_sigusr1_while_replacing_does_not_replace_again(self):
+        def on_replace(value):
+            self.controller.on_sigusr1(signal.SIGUSR1, None)
+
+        self.replace.side_effect = on_replace
+        self.controller.process()
+        self.replace.assert_called_once_with(self.children[0])
+
+    def test_process_does_not_recycle_while_restarting(self):
+        self.controller.restarting = True
+        self.controller.process()
+        self.assertFalse(self.replace.called)
+
+
+class RollingRestartTests(ControllerTestCase):
+
+    SERVER = {'ports': [{'port': 8000, 'workers': 2}]}
+
+    def setUp(self):
+        super(RollingRestartTests, self).setUp()
+        self.controller.config.reload.return_value = False
+        self.children = [child(worker=0, pid=1000), child(worker=1, pid=1001)]
+        self.controller.children.extend(self.children)
+        self.events = list()
+        self.replacements = list()
+        self.start = mock.patch.object(self.controller, 'start_child',
+                                       side_effect=self.start_child).start()
+        mock.patch('os.kill', side_effect=self.kill).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def kill(self, pid, signum):
+        self.events.append(('signal', pid, signum))
+        for value in self.controller.children:
+            if value.pid == pid:
+                value.is_alive.return_value = False
+
+    def start_child(self, port, worker=0):
+        value = child(port, worker, pid=2000 + worker)
+
+        def ready(timeout):
+            self.events.append(('ready', value.pid))
+            return True
+
+        value.ready.wait.side_effect = ready
+        self.events.append(('start', port, worker))
+        self.controller.children.append(value)
+        self.replacements.append(value)
+        return value
+
+    def test_sigusr2_does_not_restart_children(self):
+        self.controller.on_sigusr2(signal.SIGUSR2, None)
+        self.assertTrue(self.controller.restart_requested)
+        self.assertFalse(self.start.called)
+
+    def test_process_performs_requested_restart(self):
+        self.controller.on_sigusr2(signal.SIGUSR2, None)
+        self.controller.process()
+        self.assertEqual(self.start.call_count, 2)
+        self.assertFalse(self.controller.restart_requested)
+        self.assertFalse(self.controller.restarting)
+
+    def test_restart_sequence(self):
+        self.controller.rolling_restart()
+        self.assertEqual(self.events,
+                         [('start', 8000, 0), ('ready', 2000),
+                          ('signal', 1000, signal.SIGABRT),
+                          ('start', 8000, 1), ('ready', 2001),
+                          ('signal', 1001, signal.SIGABRT)])
+
+    def test_retired_children_are_removed(self):
+        self.controller.rolling_restart()
+        self.assertEqual(self.controller.children, self.replacements)
+        self.assertEqual(self.controller.retiring, set())
+        self.assertEqual(self.controller.pending_respawns, dict())
+
+    def test_replacement_not_ready_aborts_restart(self):
+        def start_child(port, worker=0):
+            value = child(port, worker, alive=False, pid=2000)
+            value.ready.wait.return_value = False
+            return value
+
+        self.start.side_effect = start_child
+        self.controller.rolling_restart()
+        self.assertEqual(self.start.call_count, 1)
+        self.assertTrue(self.children[0].is_alive())
+
+    def test_stop_while_restarting_aborts_restart(self):
+        def start_child(port, worker=0):
+            self.controller._state = \
+                controller.Controller.STATE_STOP_REQUESTED
+            return self.start_child(port, worker)
+
+        self.start.side_effect = start_child
+        self.controller.rolling_restart()
+        self.assertEqual(self.start.call_count, 1)
+        self.assertNotIn(('signal', 1000, signal.SIGABRT), self.events)
+
+    def test_stop_before_restart_does_not_start_children(self):
+        self.controller._state = controller.Controller.STATE_STOP_REQUESTED
+        self.controller.rolling_restart()
+        self.assertFalse(self.start.called)
+
+
+class ChildExitTests(ControllerTestCase):
+
+    SERVER = {'ports': [8000],
+              'respawn': {'delay': 1, 'max_delay': 8, 'max_crashes': 3,
+                          'crash_window': 60}}
+
+    def setUp(self):
+        super(ChildExitTests, self).setUp()
+        self.child = child()
+        self.child.exitcode = 1
+        self.now = 1000.0
+        mock.patch('time.time', side_effect=lambda: self.now).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def crash(self, count=1, interval=1):
+        for _ in range(0, count):
+            self.now += interval
+            self.controller.on_child_exit(self.child)
+
+    def delay(self):
+        return self.controller.pending_respawns[(8000, 0)] - self.now
+
+    def test_first_crash_respawns_after_delay(self):
+        self.crash()
+        self.assertEqual(self.delay(), 1)
+
+    def test_delay_doubles_with_each_crash(self):
+        delays = list()
+        for _ in range(0, 3):
+            self.crash()
+            delays.append(self.delay())
+        self.assertEqual(delays, [1, 2, 4])
+
+    def test_delay_is_capped(self):
+        self.controller.config.get.side_effect = \
+            {'HTTPServer': dict(self.SERVER, respawn={'delay': 5,
+                                                      'max_delay': 8})}.get
+        self.crash(2)
+        self.assertEqual(self.delay(), 8)
+
+    def test_crash_limit_throttles_respawns(self):
+        self.crash(4)
+        self.assertEqual(self.delay(), 8)
+        self.assertEqual(self.controller.crash_limited, {8000: 1})
+
+    def test_crashes_outside_window_are_forgotten(self):
+        self.crash(3)
+        self.crash(interval=61)
+        self.assertEqual(self.delay(), 1)
+        self.assertEqual(self.controller.crash_limited, dict())
+
+    def test_exits_are_counted(self):
+        self.crash(2)
+        self.assertEqual(self.controller.exits, {8000: 2})
+        self.assertEqual(self.controller.stats.as_dict()['workers'][0]['exits'],
+                         2)
+
+    def test_clean_exit_is_not_respawned(self):
+        self.child.exitcode = 0
+        self.crash()
+        self.assertEqual(self.controller.pending_respawns, dict())
+
+    def test_retired_child_is_not_respawned(self):
+        self.controller.retiring.add(self.child)
+        self.crash()
+        self.assertEqual(self.controller.pending_respawns, dict())
+        self.assertEqual(self.controller.retiring, set())
+
+    def test_not_respawned_when_shutting_down(self):
+        self.controller._state = controller.Controller.STATE_STOP_REQUESTED
+        self.crash()
+        self.assertEqual(self.controller.pending_respawns, dict())
+
+    def test_respawn_when_due(self):
+        self.crash()
+        with mock.patch.object(self.controller, 'start_child') as start:
+            self.controller.respawn_children()
+            self.assertFalse(start.called)
+            self.now += 1
+            self.controller.respawn_children()
+            start.assert_called_once_with(8000, 0)
+        self.assertEqual(self.controller.respawns, {8000: 1})
+
+
+class StatsAreaTests(ControllerTestCase):
+
+    SERVER = {'ports': [{'port': 8000, 'workers': 2}]}
+
+    def test_first_area(self):
+        self.assertEqual(self.controller.stats_area(8000, 0), 0)
+
+    def test_replacement_uses_unused_area(self):
+        self.controller.children.append(child(worker=0))
+        self.controller.children[0].stats_area = 0
+        self.assertEqual(self.controller.stats_area(8000, 0), 1)
+
+    def test_area_of_other_worker_is_not_used(self):
+        self.controller.children.append(child(worker=1))
+        self.controller.children[0].stats_area = 0
+        self.assertEqual(self.controller.stats_area(8000, 0), 0)
+
+    def test_area_of_exited_child_is_reused(self):
+        self.controller.children.append(child(worker=0, alive=False))
+        self.controller.children[0].stats_area = 0
+        self.assertEqual(self.controller.stats_area(8000, 0), 0)
+
+    def test_start_child_resets_in_flight(self):
+        self.controller.stats = stats.Stats([['/', 'tinman.example.Handler']],
+                                            self.controller.worker_slots)
+        self.controller.stats.worker(1, 1).add_in_flight('/$')
+        self.controller.stats.worker(1, 0).add_in_flight('/$')
+        value = child(worker=1)
+        value.stats_area = 1
+        with mock.patch.object(self.controller, 'spawn_process',
+                               return_value=value):
+            self.controller.start_child(8000, 1)
+        value.start.assert_called_once_with()
+        self.assertEqual(
+            self.controller.stats.as_dict()['routes']['/$']['in_flight'], 1)
+
+
+class ConfigurationReloadedTests(ControllerTestCase):
+
+    def setUp(self):
+        super(ConfigurationReloadedTests, self).setUp()
+        self.controller.args = None
+        self.controller.debug = False
+        self.controller.config.logging = {}
+        self.controller.snapshot = self.controller.new_snapshot()
+        self.controller.snapshot_path = snapshot.create_file()
+        self.addCleanup(snapshot.remove, self.controller.snapshot_path)
+
+    def test_snapshot_written_before_signal(self):
+        def signal_children(signum):
+            self.assertEqual(signum, signal.SIGHUP)
+            self.assertEqual(
+                snapshot.read(self.controller.snapshot_path).version, 2)
+
+        with mock.patch.object(self.controller, 'signal_children',
+                               side_effect=signal_children) as signal_mock:
+            self.controller.configuration_reloaded()
+            self.assertTrue(signal_mock.called)
+        self.assertEqual(self.controller.snapshot.version, 2)
+
+    def test_snapshot_path_passed_to_children(self):
+        value = self.spawn_process(8000, 0)
+        self.assertEqual(value.snapshot_path, self.controller.snapshot_path)
+
+
+class PortSettingsTests(ControllerTestCase):
+
+    SERVER = {'ioloop': 'asyncio',
+              'ports': [8000, {'port': 8001, 'ioloop': 'default'}]}
+
+    def test_ioloop_default(self):
+        self.assertEqual(self.controller.port_entries[0]['ioloop'], 'asyncio')
+
+    def test_ioloop_override(self):
+        self.assertEqual(self.controller.port_entries[1]['ioloop'], 'default')
+
+
+class WorkerTests(ControllerTestCase):
+
+    SERVER = {'workers': 2,
+              'ports': [8000, {'port': 8001, 'workers': 3},
+                        {'port': 8002, 'reuse_port': True}]}
+
+    def test_worker_slots(self):
+        self.assertEqual(self.controller.worker_slots,
+                         [(8000, 0), (8000, 1), (8001, 0), (8001, 1),
+                          (8001, 2), (8002, 0), (8002, 1)])
+
+    def test_spawn_processes_starts_workers_per_port(self):
+        with mock.patch.object(self.controller, 'start_child') as start:
+            self.controller.spawn_processes()
+            self.assertEqual([call[0] for call in start.call_args_list],
+                             self.controller.worker_slots)
+
+    def spawn_process(self, port, worker):
+        self.controller.snapshot = snapshot.create(1, None, {}, False, {}, [],
+                                                   self.SERVER)
+        self.controller.snapshot_path = None
+        return self.controller.spawn_process(port, worker)
+
+    def test_new_process_does_not_replace_socket(self):
+        self.controller.children = [child(8000, 1), child(8001, 0)]
+        value = self.spawn_process(8000, 0)
+        self.assertFalse(value.replace_socket)
+
+    def test_replacement_replaces_socket(self):
+        self.controller.children = [child(8000, 0)]
+        value = self.spawn_process(8000, 0)
+        self.assertTrue(value.replace_socket)
+
+    def test_respawn_does_not_replace_socket(self):
+        self.controller.children = [child(8000, 0, alive=False)]
+        value = self.spawn_process(8000, 0)
+        self.assertFalse(value.replace_socket)
+
+    def test_shared_sockets_bound_once_per_port(self):
+        with mock.patch('tinman.sockets.bind') as bind:
+            self.controller.bind_sockets()
+            self.assertEqual([call[0][0] for call in bind.call_args_list],
+                             [8000, 8001])
+        self.assertEqual(sorted(self.controller.sockets.keys()), [8000, 8001])
+
+
+
+class PreloadTests(ControllerTestCase):
+
+    SERVER = {'ports': [8000], 'preload': True}
+
+    def setUp(self):
+        super(PreloadTests, self).setUp()
+        self.controller.args = None
+        self.controller.debug = False
+        self.calls = mock.Mock()
+
+    def setup(self):
+        with mock.patch.multiple(self.controller, enable_debug=mock.DEFAULT,
+                                 set_base_path=mock.DEFAULT,
+                                 insert_paths=mock.DEFAULT,
+                                 bind_sockets=self.calls.bind_sockets,
+                                 spawn_processes=self.calls.spawn_processes):
+            with mock.patch('tinman.application.preload', self.calls.preload):
+                with mock.patch('tinman.snapshot.create_file'):
+                    with mock.patch('signal.signal'):
+                        self.controller.setup()
+        return [call[0] for call in self.calls.mock_calls]
+
+    def test_preloaded_before_fork(self):
+        self.assertEqual(self.setup(),
+                         ['preload', 'bind_sockets', 'spawn_processes'])
+
+    def test_preload_is_passed_the_snapshot(self):
+        self.setup()
+        self.calls.preload.assert_called_once_with(
+            self.controller.snapshot.config, self.controller.snapshot.routes)
+
+    def test_not_preloaded_by_default(self):
+        self.controller.config.get.side_effect = \
+            {'HTTPServer': {'ports': [8000]}, 'Routes': []}.get
+        self.assertEqual(self.setup(), ['bind_sockets', 'spawn_processes'])
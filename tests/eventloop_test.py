@@ -0,0 +1,35 @@
+import mock
+import sys
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+from tornado import ioloop
+
+from tinman import eventloop
+
+
+class CheckTests(unittest.TestCase):
+
+    def test_default(self):
+        eventloop.check(None)
+        eventloop.check(eventloop.DEFAULT)
+
+    def test_unsupported_backend(self):
+        self.assertRaises(ValueError, eventloop.check, 'uvloop')
+
+    def test_asyncio_not_available(self):
+        with mock.patch.dict(sys.modules, {'tornado.platform.asyncio': None}):
+            self.assertRaises(ValueError, eventloop.check, eventloop.ASYNCIO)
+
+
+class InstallTests(unittest.TestCase):
+
+    def test_default(self):
+        self.assertIs(eventloop.install(), ioloop.IOLoop.instance())
+
+    def test_asyncio_not_available_is_not_a_fallback(self):
+        with mock.patch.dict(sys.modules, {'tornado.platform.asyncio': None}):
+            self.assertRaises(ValueError, eventloop.install,
+                              eventloop.ASYNCIO)
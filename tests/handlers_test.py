@@ -0,0 +1,161 @@
+import json
+import sys
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+import socket
+import tornado
+from tornado import concurrent
+from tornado import gen
+from tornado import iostream
+from tornado import testing
+from tornado import web
+
+from tinman.handlers import base
+
+ITEMS = 5000
+JSON = base.RequestHandler.JSON
+NDJSON = base.RequestHandler.NDJSON
+
+
+class ArrayHandler(base.RequestHandler):
+
+    @gen.coroutine
+    def get(self):
+        count = int(self.get_argument('count', ITEMS))
+        yield self.write_json_stream(({'id': offset, 'name': 'item %i' % offset}
+                                      for offset in range(0, count)),
+                                     flush_size=4096)
+
+
+class NDJSONHandler(base.RequestHandler):
+
+    @gen.coroutine
+    def get(self):
+        yield self.write_json_stream(iter([{'id': 1}, {'id': 2}]), True)
+
+
+class EndlessHandler(base.RequestHandler):
+
+    closed = None
+
+    def items(self):
+        try:
+            while True:
+                yield {'value': 'x' * 1024}
+        finally:
+            self.closed.set_result(True)
+
+    @gen.coroutine
+    def get(self):
+        yield self.write_json_stream(self.items(), flush_size=65536)
+
+
+class WriteJSONStreamTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([('/array', ArrayHandler),
+                                ('/endless', EndlessHandler),
+                                ('/ndjson', NDJSONHandler)])
+
+    def test_json_array(self):
+        response = self.fetch('/array')
+        self.assertEqual(response.headers['Content-Type'],
+                         'application/json; charset=UTF-8')
+        self.assertEqual(json.loads(response.body.decode('utf-8')),
+                         [{'id': offset, 'name': 'item %i' % offset}
+                          for offset in range(0, ITEMS)])
+
+    def test_empty_array(self):
+        response = self.fetch('/array?count=0')
+        self.assertEqual(response.body, b'[]')
+
+    def test_response_is_chunked(self):
+        chunks = list()
+        self.fetch('/array', streaming_callback=chunks.append)
+        self.assertGreater(len(chunks), 2)
+
+    @unittest.skipIf(tornado.version_info < (4, 0), 'Tornado 4 only')
+    @testing.gen_test
+    def test_client_disconnect_stops_stream(self):
+        EndlessHandler.closed = concurrent.Future()
+        stream = iostream.IOStream(socket.socket())
+        yield stream.connect(('127.0.0.1', self.get_http_port()))
+        yield stream.write(b'GET /endless HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        yield stream.read_bytes(65536, partial=True)
+        stream.close()
+        self.assertTrue((yield EndlessHandler.closed))
+
+    def test_ndjson(self):
+        response = self.fetch('/ndjson')
+        self.assertEqual(response.headers['Content-Type'],
+                         'application/x-ndjson; charset=UTF-8')
+        self.assertEqual([json.loads(line) for line in
+                          response.body.decode('utf-8').splitlines()],
+                         [{'id': 1}, {'id': 2}])
+
+
+class ItemsHandler(base.StreamingRequestHandler):
+
+    MAX_ITEM_SIZE = 64
+    MAX_MEMORY = 16
+
+    @gen.coroutine
+    def prepare(self):
+        self.items = list()
+        yield super(ItemsHandler, self).prepare()
+
+    def json_item_received(self, item):
+        self.items.append(item)
+
+    def post(self):
+        if self.body_file:
+            self.write({'body': self.body_file.read().decode('utf-8'),
+                        'spooled': self.body_file._rolled})
+        else:
+            self.write({'items': self.items})
+
+
+class StreamingRequestHandlerTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([('/items', ItemsHandler)])
+
+    def post(self, body, content_type):
+        return self.fetch('/items', method='POST', body=body,
+                          headers={'Content-Type': content_type})
+
+    def test_json_array(self):
+        response = self.post(b'[{"id": 1}, {"id": 2}, 3]', JSON)
+        self.assertEqual(json.loads(response.body.decode('utf-8')),
+                         {'items': [{'id': 1}, {'id': 2}, 3]})
+
+    def test_ndjson(self):
+        response = self.post(b'{"id": 1}\n{"id": 2}', NDJSON)
+        self.assertEqual(json.loads(response.body.decode('utf-8')),
+                         {'items': [{'id': 1}, {'id': 2}]})
+
+    def test_json_object_is_spooled(self):
+        response = self.post(b'{"id": 1}', JSON)
+        self.assertEqual(json.loads(response.body.decode('utf-8')),
+                         {'body': '{"id": 1}', 'spooled': False})
+
+    def test_large_body_is_spooled_to_a_file(self):
+        response = self.post(b'x' * 1024, 'application/octet-stream')
+        self.assertEqual(json.loads(response.body.decode('utf-8')),
+                         {'body': 'x' * 1024, 'spooled': True})
+
+    def test_invalid_json(self):
+        response = self.post(b'[{"id": 1}, {"id"', JSON)
+        self.assertEqual(response.code, 400)
+
+    def test_invalid_item(self):
+        response = self.post(b'[{"id": x}, ' + b'1, ' * 64 + b'2]', JSON)
+        self.assertEqual(response.code, 400)
+
+    def test_item_too_large(self):
+        response = self.post(b'["%s"]' % (b'x' * 128), JSON)
+        self.assertEqual(response.code, 413)
@@ -0,0 +1,182 @@
+import json
+import sys
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tinman import jsoncodec
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+VALUE = {'html': '</script>', 'name': u'tinman \u2603', 'values': [1, 2.5]}
+
+
+class CodecTestsMixin(object):
+
+    BACKEND = jsoncodec.DEFAULT
+
+    def setUp(self):
+        self.codec = jsoncodec.codec(self.BACKEND)
+
+    def test_backend(self):
+        self.assertEqual(self.codec.name, self.BACKEND)
+
+    def test_dumps_returns_bytes(self):
+        self.assertIsInstance(self.codec.dumps(VALUE), bytes)
+
+    def test_dumps_round_trip(self):
+        self.assertEqual(json.loads(self.codec.dumps(VALUE).decode('utf-8')),
+                         VALUE)
+
+    def test_dumps_escapes_closing_tags(self):
+        self.assertNotIn(b'</', self.codec.dumps(VALUE))
+
+    def test_dumps_utf8(self):
+        self.assertIn(u'\u2603'.encode('utf-8'), self.codec.dumps(VALUE))
+
+    def test_pretty(self):
+        value = self.codec.dumps({'b': 1, 'a': 2}, True)
+        self.assertEqual(value.decode('utf-8'), '{\n  "a": 2,\n  "b": 1\n}')
+
+    def test_non_string_keys(self):
+        self.assertEqual(json.loads(self.codec.dumps({1: 'a'}).decode('utf-8')),
+                         {'1': 'a'})
+
+    def test_loads(self):
+        self.assertEqual(self.codec.loads(b'{"foo": ["bar", 1]}'),
+                         {'foo': ['bar', 1]})
+
+
+class DefaultCodecTests(CodecTestsMixin, unittest.TestCase):
+    pass
+
+
+@unittest.skipUnless(orjson, 'orjson is not installed')
+class ORJSONCodecTests(CodecTestsMixin, unittest.TestCase):
+
+    BACKEND = jsoncodec.ORJSON
+
+
+@unittest.skipUnless(ujson, 'ujson is not installed')
+class UJSONCodecTests(CodecTestsMixin, unittest.TestCase):
+
+    BACKEND = jsoncodec.UJSON
+
+
+class SelectionTests(unittest.TestCase):
+
+    def test_default(self):
+        self.assertEqual(jsoncodec.codec().name, jsoncodec.DEFAULT)
+
+    def test_unsupported_backend(self):
+        self.assertRaises(ValueError, jsoncodec.codec, 'simplejson')
+
+    def test_automatic(self):
+        expectation = (jsoncodec.ORJSON if orjson else
+                       jsoncodec.UJSON if ujson else jsoncodec.DEFAULT)
+        self.assertEqual(jsoncodec.codec(jsoncodec.AUTOMATIC).name,
+                         expectation)
+
+    @unittest.skipIf(ujson, 'ujson is installed')
+    def test_missing_backend(self):
+        self.assertEqual(jsoncodec.codec(jsoncodec.UJSON).name,
+                         jsoncodec.DEFAULT)
+
+
+class ArrayDecoderTests(unittest.TestCase):
+
+    def decode(self, chunks, max_item_size=jsoncodec.DEFAULT_MAX_ITEM_SIZE):
+        decoder = jsoncodec.ArrayDecoder(max_item_size)
+        items = list()
+        for chunk in chunks:
+            items += decoder.feed(chunk)
+        return items + decoder.feed(b'', True)
+
+    def test_items(self):
+        value = [VALUE, 1, 'two', None, [3, {'four': 4}], 5.5, True]
+        data = json.dumps(value).encode('utf-8')
+        self.assertEqual(self.decode([data[i:i + 3]
+                                      for i in range(0, len(data), 3)]),
+                         value)
+
+    def test_items_are_decoded_as_they_complete(self):
+        decoder = jsoncodec.ArrayDecoder()
+        self.assertEqual(decoder.feed(b' [{"a": 1}, {"b"'), [{'a': 1}])
+        self.assertEqual(decoder.feed(b': 2}, 12'), [{'b': 2}])
+        self.assertEqual(decoder.feed(b'3]'), [123])
+
+    def test_split_utf8(self):
+        data = json.dumps([u'\u2603'], ensure_ascii=False).encode('utf-8')
+        self.assertEqual(self.decode([data[:3], data[3:]]), [u'\u2603'])
+
+    def test_empty(self):
+        self.assertEqual(self.decode([b' [ ] ']), [])
+
+    def test_not_an_array(self):
+        self.assertRaises(jsoncodec.NotAnArray, self.decode, [b'{"a": 1}'])
+
+    def test_incomplete(self):
+        self.assertRaises(ValueError, self.decode, [b'[1, 2'])
+
+    def test_missing_separator(self):
+        self.assertRaises(ValueError, self.decode, [b'[1 2]'])
+
+    def test_trailing_data(self):
+        self.assertRaises(ValueError, self.decode, [b'[1] 2'])
+
+    def test_item_too_large(self):
+        self.assertRaises(jsoncodec.ItemTooLarge, self.decode,
+                          [b'["', b'x' * 32, b'"]'], 16)
+
+    def test_invalid_item_is_not_buffered(self):
+        for data in [b'[{"a": x}, ', b'[1x, ', b'[{"a": 1]', b'[, ',
+                     b'[tru e]']:
+            decoder = jsoncodec.ArrayDecoder(1024)
+            try:
+                decoder.feed(data)
+            except jsoncodec.ItemTooLarge:
+                self.fail('%r is reported as too large' % data)
+            except ValueError:
+                pass
+            else:
+                self.fail('%r is not reported as invalid' % data)
+
+    def test_partial_items_are_buffered(self):
+        decoder = jsoncodec.ArrayDecoder()
+        for data in [b'[{"a": "b, ]', b'c\\"', b'", "d": [1.', b'5, tr',
+                     b'ue]}']:
+            self.assertEqual(decoder.feed(data), [])
+        self.assertEqual(decoder.feed(b']', True),
+                         [{'a': 'b, ]c"', 'd': [1.5, True]}])
+
+
+class NDJSONDecoderTests(unittest.TestCase):
+
+    def test_items(self):
+        decoder = jsoncodec.NDJSONDecoder()
+        self.assertEqual(decoder.feed(b'{"a": 1}\n\n{"b"'), [{'a': 1}])
+        self.assertEqual(decoder.feed(b': 2}\r\n[3]'), [{'b': 2}])
+        self.assertEqual(decoder.feed(b'', True), [[3]])
+
+    def test_invalid_line(self):
+        decoder = jsoncodec.NDJSONDecoder()
+        self.assertRaises(ValueError, decoder.feed, b'{"a": \n')
+
+    def test_line_too_large(self):
+        decoder = jsoncodec.NDJSONDecoder(max_item_size=16)
+        self.assertRaises(jsoncodec.ItemTooLarge, decoder.feed, b'x' * 32)
+
+    def test_complete_line_too_large(self):
+        decoder = jsoncodec.NDJSONDecoder(max_item_size=16)
+        self.assertRaises(jsoncodec.ItemTooLarge, decoder.feed,
+                          b'"%s"\n' % (b'x' * 32))
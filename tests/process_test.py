@@ -0,0 +1,231 @@
+import mock
+import os
+import signal
+import sys
+import tempfile
+from tornado import httpserver
+from tornado import version_info
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tinman import application
+from tinman import process
+from tinman import snapshot
+
+ROUTES = [['/', 'tinman.example.Handler']]
+
+
+def create_process(server=None, port=8000, worker=0, snapshot_path=None):
+    value = snapshot.create(1, None, {}, False, {}, ROUTES, server or {})
+    return process.Process(name='ServerProcess.%i.%i' % (port, worker),
+                           kwargs={'snapshot': value, 'port': port,
+                                   'snapshot_path': snapshot_path,
+                                   'worker': worker})
+
+
+class SignalHandlerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.process = create_process()
+        with mock.patch('signal.signal') as set_handler:
+            self.process.setup_signal_handlers()
+        self.handlers = dict([(call[0][0], call[0][1])
+                              for call in set_handler.call_args_list])
+
+    def test_controller_signals_restored(self):
+        for signum in [signal.SIGALRM, signal.SIGCHLD, signal.SIGUSR1,
+                       signal.SIGUSR2]:
+            self.assertEqual(self.handlers[signum], signal.SIG_DFL)
+
+    def test_sigterm_drains(self):
+        self.assertEqual(self.handlers[signal.SIGTERM],
+                         self.process.on_sigabrt)
+
+    def test_sigabrt_drains(self):
+        self.assertEqual(self.handlers[signal.SIGABRT],
+                         self.process.on_sigabrt)
+
+    def test_sighup_reloads(self):
+        self.assertEqual(self.handlers[signal.SIGHUP],
+                         self.process.on_sighup)
+
+
+class SnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.process = create_process(snapshot_path=self.path)
+        self.process.app = mock.Mock()
+        self.process.app.reload.return_value = True
+        self.process.http_server = mock.Mock(spec=[])
+
+    def write(self, version, routes=None):
+        snapshot.write(self.path, snapshot.create(
+            version, None, {'debug': True}, False, {}, routes or ROUTES,
+            {'xheaders': True}))
+
+    def test_no_snapshot_written(self):
+        self.assertFalse(self.process.receive_snapshot())
+        self.assertEqual(self.process.snapshot.version, 1)
+
+    def test_newer_snapshot_is_received(self):
+        self.write(2)
+        self.assertTrue(self.process.receive_snapshot())
+        self.assertEqual(self.process.snapshot.version, 2)
+        self.assertEqual(self.process.settings, {'debug': True})
+
+    def test_older_snapshot_is_ignored(self):
+        self.write(3)
+        self.process.receive_snapshot()
+        self.write(2)
+        self.assertFalse(self.process.receive_snapshot())
+        self.assertEqual(self.process.snapshot.version, 3)
+
+    def test_sighup_before_ioloop_reads_snapshot(self):
+        self.write(2)
+        self.process.on_sighup(signal.SIGHUP, None)
+        self.assertEqual(self.process.snapshot.version, 2)
+
+    def test_sighup_defers_to_ioloop(self):
+        self.write(2)
+        self.process.ioloop = mock.Mock()
+        self.process.on_sighup(signal.SIGHUP, None)
+        self.process.ioloop.add_callback_from_signal.assert_called_once_with(
+            self.process.reload)
+        self.assertEqual(self.process.snapshot.version, 1)
+
+    def test_reload_applies_snapshot(self):
+        routes = ROUTES + [['/other', 'tinman.example.Handler']]
+        self.write(2, routes)
+        self.process.reload()
+        self.process.app.reload.assert_called_once_with({'debug': True},
+                                                        routes)
+
+    def test_reload_without_snapshot(self):
+        self.process.reload()
+        self.assertFalse(self.process.app.reload.called)
+
+
+
+class PreloadTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, self.path)
+        application._translations_path = None
+        self.addCleanup(setattr, application, '_translations_path', None)
+        settings = {'paths': {'translations': self.path}, 'ui_modules': {}}
+        self.process = process.Process(
+            name='ServerProcess.8000.0',
+            kwargs={'snapshot': snapshot.create(1, None, settings, False, {},
+                                                ROUTES, {'preload': True}),
+                    'port': 8000, 'snapshot_path': None, 'worker': 0})
+
+    def test_preloaded_translations_are_not_reloaded(self):
+        with mock.patch('tornado.locale.load_translations') as load:
+            application.preload(self.process.snapshot.config,
+                                self.process.snapshot.routes)
+            self.process.create_application()
+        load.assert_called_once_with(self.path)
+
+    def test_translations_loaded_without_preload(self):
+        with mock.patch('tornado.locale.load_translations') as load:
+            self.process.create_application()
+        load.assert_called_once_with(self.path)
+
+
+class HTTPConfigTests(unittest.TestCase):
+
+    def test_defaults(self):
+        self.assertEqual(create_process().http_config,
+                         {'no_keep_alive': False, 'ssl_options': None,
+                          'xheaders': False})
+
+    def test_tuning_settings(self):
+        value = create_process({'body_timeout': 30, 'max_body_size': 1024,
+                                'idle_connection_timeout': 5,
+                                'decompress_request': True})
+        self.assertEqual(value.http_config['body_timeout'], 30)
+        self.assertEqual(value.http_config['max_body_size'], 1024)
+        self.assertEqual(value.http_config['idle_connection_timeout'], 5)
+        self.assertTrue(value.http_config['decompress_request'])
+
+    def test_unconfigured_tuning_settings_are_omitted(self):
+        value = create_process({'body_timeout': None})
+        self.assertNotIn('body_timeout', value.http_config)
+        self.assertNotIn('chunk_size', value.http_config)
+
+    def test_port_settings_override(self):
+        value = create_process({'xheaders': True, 'max_body_size': 1024,
+                                'ports': [{'port': 8000,
+                                           'max_body_size': 2048}]})
+        self.assertTrue(value.http_config['xheaders'])
+        self.assertEqual(value.http_config['max_body_size'], 2048)
+
+    def test_other_port_settings_are_ignored(self):
+        value = create_process({'ports': [{'port': 8001,
+                                           'max_body_size': 2048}]})
+        self.assertNotIn('max_body_size', value.http_config)
+
+
+class UpdateHTTPServerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.process = create_process()
+
+    def conn_params(self, **kwargs):
+        self.process.http_server = mock.Mock(spec=['conn_params', 'xheaders'],
+                                             xheaders=False)
+        self.process.http_server.conn_params = mock.Mock(spec=list(kwargs),
+                                                         **kwargs)
+        return self.process.http_server.conn_params
+
+    def test_server_attribute(self):
+        self.conn_params()
+        self.process.update_http_server('xheaders', True)
+        self.assertTrue(self.process.http_server.xheaders)
+
+    def test_connection_parameters(self):
+        params = self.conn_params(body_timeout=None, max_body_size=None,
+                                  no_keep_alive=False)
+        self.process.update_http_server('body_timeout', 30)
+        self.process.update_http_server('max_body_size', 1024)
+        self.process.update_http_server('no_keep_alive', True)
+        self.assertEqual(params.body_timeout, 30)
+        self.assertEqual(params.max_body_size, 1024)
+        self.assertTrue(params.no_keep_alive)
+
+    def test_renamed_connection_parameters(self):
+        params = self.conn_params(decompress=False, header_timeout=None)
+        self.process.update_http_server('decompress_request', True)
+        self.process.update_http_server('idle_connection_timeout', 5)
+        self.assertTrue(params.decompress)
+        self.assertEqual(params.header_timeout, 5)
+
+    def test_connection_parameters_cover_tuning_settings(self):
+        for setting in process.Process.HTTP_SERVER_SETTINGS:
+            if setting not in ['max_buffer_size', 'protocol']:
+                self.assertIn(setting, process.Process.CONNECTION_PARAMETERS)
+
+    @unittest.skipIf(version_info < (4, 0), 'Tornado 4 only')
+    def test_connection_parameters_exist(self):
+        server = httpserver.HTTPServer(mock.Mock())
+        for attribute in process.Process.CONNECTION_PARAMETERS.values():
+            self.assertTrue(hasattr(server.conn_params, attribute), attribute)
+
+    def test_tornado_3_server_attribute(self):
+        self.process.http_server = mock.Mock(spec=['no_keep_alive'],
+                                             no_keep_alive=False)
+        self.process.update_http_server('no_keep_alive', True)
+        self.assertTrue(self.process.http_server.no_keep_alive)
+
+    def test_unchangeable_setting_is_logged(self):
+        self.conn_params()
+        with mock.patch('tinman.process.LOGGER') as logger:
+            self.process.update_http_server('max_buffer_size', 1024)
+            self.assertTrue(logger.warning.called)
@@ -0,0 +1,104 @@
+import collections
+import random
+import re
+import sys
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tinman import routing
+
+Spec = collections.namedtuple('Spec', ['regex'])
+
+
+def spec(pattern):
+    return Spec(re.compile(pattern if pattern.endswith('$')
+                           else pattern + '$'))
+
+
+def linear_match(specs, path):
+    for value in specs:
+        match = value.regex.match(path)
+        if match:
+            return value
+    return None
+
+
+class LiteralTests(unittest.TestCase):
+
+    def test_literal_path(self):
+        self.assertEqual(routing.literal_path('/foo/bar$'), '/foo/bar')
+
+    def test_escaped_literal_path(self):
+        self.assertEqual(routing.literal_path(r'/robots\.txt$'), '/robots.txt')
+
+    def test_regex_is_not_literal(self):
+        self.assertIsNone(routing.literal_path('/robots.txt$'))
+
+    def test_quantifier_shortens_prefix(self):
+        self.assertEqual(routing.literal_prefix('/foo+bar$')[0], '/fo')
+
+    def test_group_ends_prefix(self):
+        self.assertEqual(routing.literal_prefix('/user/([0-9]+)$')[0], '/user/')
+
+    def test_alternation_has_no_prefix(self):
+        self.assertEqual(routing.literal_prefix('/foo|/bar$')[0], '')
+
+    def test_grouped_alternation_keeps_prefix(self):
+        self.assertEqual(routing.literal_prefix('/a/(b|c)$')[0], '/a/')
+
+    def test_inline_flags_have_no_prefix(self):
+        self.assertEqual(routing.literal_prefix('(?i)/foo$')[0], '')
+
+
+class RouteIndexTests(unittest.TestCase):
+
+    PATTERNS = ['/', '/status', r'/static/(.*)', r'/robots\.txt',
+                '/api/v1/users', r'/api/v1/users/([0-9]+)',
+                r'/api/v1/(\w+)', '/api/v1/items', '/a|/b', '/x*',
+                r'/files/(?P<name>[^/]+)', '/status', '/c[]|]',
+                '(?i)/upper']
+
+    PATHS = ['/', '/status', '/static/app.js', '/robots.txt', '/robotsXtxt',
+             '/api/v1/users', '/api/v1/users/12', '/api/v1/items',
+             '/api/v1/other', '/a', '/b', '/', '/xxx', '/files/a.txt',
+             '/missing', '/status\n', '/c]', '/c|', '/UPPER', '']
+
+    def setUp(self):
+        self.specs = [spec(pattern) for pattern in self.PATTERNS]
+        self.index = routing.RouteIndex(self.specs)
+
+    def test_matches_linear_scan(self):
+        for path in self.PATHS:
+            self.assertIs(self.index.match(path)[0],
+                          linear_match(self.specs, path), path)
+
+    def test_earlier_regex_wins_over_literal(self):
+        self.assertIs(self.index.match('/api/v1/items')[0], self.specs[6])
+
+    def test_match_object_is_returned(self):
+        self.assertEqual(self.index.match('/api/v1/users/12')[1].groups(),
+                         ('12',))
+
+    def test_no_match(self):
+        self.assertEqual(self.index.match('/missing'), (None, None))
+
+    def test_random_routes_match_linear_scan(self):
+        generator = random.Random(42)
+        segments = ['a', 'b', 'api', 'v1', 'users']
+        patterns = list()
+        for _ in range(0, 200):
+            parts = [generator.choice(segments)
+                     for _ in range(0, generator.randint(1, 3))]
+            if generator.random() < 0.5:
+                parts.append(generator.choice([r'(\d+)', '([^/]+)', 'x?y']))
+            patterns.append('/' + '/'.join(parts))
+        specs = [spec(pattern) for pattern in patterns]
+        index = routing.RouteIndex(specs)
+        for _ in range(0, 500):
+            path = '/' + '/'.join([generator.choice(segments + ['1', 'y'])
+                                   for _ in range(0, generator.randint(1, 4))])
+            self.assertIs(index.match(path)[0], linear_match(specs, path),
+                          path)
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tinman import snapshot
+
+
+class Config(object):
+
+    def __init__(self, value):
+        self.value = value
+
+    def dict(self):
+        return dict(self.value)
+
+
+class CreateTests(unittest.TestCase):
+
+    def setUp(self):
+        self.config = {'paths': {'base': '/tmp'}}
+        self.routes = [['/', 'tinman.example.Handler']]
+        self.value = snapshot.create(2, None, Config(self.config), True,
+                                     {'version': 1}, self.routes, None)
+
+    def test_version(self):
+        self.assertEqual(self.value.version, 2)
+
+    def test_config_objects_are_converted(self):
+        self.assertEqual(self.value.config, self.config)
+        self.assertIsInstance(self.value.config, dict)
+
+    def test_values_are_copied(self):
+        self.config['paths']['base'] = '/var'
+        self.routes[0][0] = '/other'
+        self.assertEqual(self.value.config['paths']['base'], '/tmp')
+        self.assertEqual(self.value.routes, [['/', 'tinman.example.Handler']])
+
+    def test_default_server_config(self):
+        self.assertEqual(self.value.server, dict())
+
+
+class FileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tinman.snapshot')
+        self.addCleanup(os.rmdir, self.directory)
+        self.addCleanup(snapshot.remove, self.path)
+
+    def test_create_file(self):
+        path = snapshot.create_file()
+        self.addCleanup(snapshot.remove, path)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        self.assertIsNone(snapshot.read(path))
+
+    def test_read_missing_file(self):
+        self.assertIsNone(snapshot.read(self.path))
+
+    def test_write_and_read(self):
+        value = snapshot.create(3, None, {'debug': True}, False, {},
+                                [['/', 'tinman.example.Handler']], {})
+        snapshot.write(self.path, value)
+        self.assertEqual(snapshot.read(self.path), value)
+
+    def test_large_snapshot(self):
+        routes = [['/route/%i' % offset, 'tinman.example.Handler']
+                  for offset in range(0, 10000)]
+        value = snapshot.create(1, None, {}, False, {}, routes, {})
+        snapshot.write(self.path, value)
+        self.assertGreater(os.path.getsize(self.path), 65536)
+        self.assertEqual(snapshot.read(self.path).routes, routes)
+
+    def test_write_replaces_snapshot(self):
+        for version in range(1, 4):
+            snapshot.write(self.path, snapshot.create(version, None, {},
+                                                      False, {}, [], {}))
+        self.assertEqual(snapshot.read(self.path).version, 3)
+        self.assertEqual(os.listdir(self.directory), ['tinman.snapshot'])
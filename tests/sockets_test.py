@@ -0,0 +1,168 @@
+import os
+import shutil
+import socket
+import stat
+import sys
+import tempfile
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tinman import sockets
+
+
+class SocketTestCase(unittest.TestCase):
+
+    def bind(self, *args, **kwargs):
+        value = sockets.bind(*args, **kwargs)
+        self.addCleanup(sockets.close, value)
+        return value
+
+
+@unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'),
+                     'SO_REUSEPORT is not supported')
+class ReusePortTests(SocketTestCase):
+
+    def test_reuse_port_is_set(self):
+        sock = self.bind(0, '127.0.0.1', reuse_port=True)[0]
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET,
+                                        socket.SO_REUSEPORT))
+
+    def test_reuse_port_is_not_set_by_default(self):
+        sock = self.bind(0, '127.0.0.1')[0]
+        self.assertFalse(sock.getsockopt(socket.SOL_SOCKET,
+                                         socket.SO_REUSEPORT))
+
+    def test_workers_bind_the_same_port(self):
+        sock = self.bind(0, '127.0.0.1', reuse_port=True)[0]
+        port = sock.getsockname()[1]
+        other = self.bind(port, '127.0.0.1', reuse_port=True)[0]
+        self.assertEqual(other.getsockname()[1], port)
+
+    def test_unsupported_reuse_port_raises(self):
+        value = socket.SO_REUSEPORT
+        del socket.SO_REUSEPORT
+        self.addCleanup(setattr, socket, 'SO_REUSEPORT', value)
+        self.assertRaises(ValueError, sockets.bind, 0, '127.0.0.1',
+                          reuse_port=True)
+
+
+@unittest.skipUnless(socket.has_ipv6, 'IPv6 is not supported')
+class IPv6Tests(SocketTestCase):
+
+    def v6only(self, **kwargs):
+        sock = self.bind(0, '::', socket.AF_INET6, **kwargs)[0]
+        return sock.getsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY)
+
+    def test_ipv6_only_by_default(self):
+        self.assertTrue(self.v6only())
+
+    def test_dual_stack(self):
+        self.assertFalse(self.v6only(dual_stack=True))
+
+    def test_family(self):
+        self.assertEqual(sockets.family('ipv6'), socket.AF_INET6)
+        self.assertEqual(sockets.family('dual'), socket.AF_INET6)
+
+    def test_ipv4_sockets_are_unaffected(self):
+        sock = self.bind(0, '127.0.0.1', dual_stack=True)[0]
+        self.assertEqual(sock.family, socket.AF_INET)
+
+
+class FamilyTests(unittest.TestCase):
+
+    def test_default_family(self):
+        self.assertEqual(sockets.family(None), socket.AF_INET)
+
+    def test_unsupported_family(self):
+        self.assertRaises(ValueError, sockets.family, 'ipx')
+
+    def test_unsupported_ipv6_raises(self):
+        self.assertRaises(ValueError, sockets.bind, 0, None, None)
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'),
+                     'Unix domain sockets are not supported')
+class UnixSocketTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'tinman.sock')
+
+    def bind_unix(self, *args):
+        value = sockets.bind_unix(self.path, *args)
+        self.addCleanup(sockets.close, value)
+        return value
+
+    def mode(self):
+        return stat.S_IMODE(os.stat(self.path).st_mode)
+
+    def test_default_mode(self):
+        self.bind_unix()
+        self.assertEqual(self.mode(), 0o600)
+
+    def test_mode(self):
+        self.bind_unix(0o660)
+        self.assertEqual(self.mode(), 0o660)
+
+    def test_octal_string_mode(self):
+        self.bind_unix('0666')
+        self.assertEqual(self.mode(), 0o666)
+
+    def test_stale_socket_is_replaced(self):
+        sockets.close(sockets.bind_unix(self.path))
+        self.bind_unix()
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(client.close)
+        client.connect(self.path)
+
+    def test_file_that_is_not_a_socket_raises(self):
+        with open(self.path, 'w') as handle:
+            handle.write('data')
+        self.assertRaises(ValueError, sockets.bind_unix, self.path)
+        self.assertTrue(os.path.isfile(self.path))
+
+    def test_socket_in_use_raises(self):
+        self.bind_unix()
+        inode = sockets.inode(self.path)
+        self.assertRaises(ValueError, sockets.bind_unix, self.path)
+        self.assertEqual(sockets.inode(self.path), inode)
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(client.close)
+        client.connect(self.path)
+
+    def test_socket_in_use_is_replaced(self):
+        self.bind_unix()
+        inode = sockets.inode(self.path)
+        self.addCleanup(sockets.close,
+                        sockets.bind_unix(self.path, replace=True))
+        self.assertNotEqual(sockets.inode(self.path), inode)
+
+    def test_in_use(self):
+        self.bind_unix()
+        self.assertTrue(sockets.in_use(self.path))
+
+    def test_closed_socket_is_not_in_use(self):
+        sockets.close(sockets.bind_unix(self.path))
+        self.assertFalse(sockets.in_use(self.path))
+
+    def test_remove_unix(self):
+        self.bind_unix()
+        sockets.remove_unix(self.path, sockets.inode(self.path))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_remove_unix_leaves_replaced_socket(self):
+        self.bind_unix()
+        sockets.remove_unix(self.path, sockets.inode(self.path) + 1)
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_unix_path(self):
+        self.assertEqual(sockets.unix_path('/tmp/{port}.{worker}.sock',
+                                           8000, 2), '/tmp/8000.2.sock')
+
+    def test_is_per_worker(self):
+        self.assertTrue(sockets.is_per_worker('/tmp/{worker}.sock'))
+        self.assertFalse(sockets.is_per_worker('/tmp/{port}.sock'))
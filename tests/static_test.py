@@ -0,0 +1,194 @@
+import gzip
+import io
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+import tornado
+from tornado import concurrent
+from tornado import gen
+from tornado import iostream
+from tornado import testing
+from tornado import web
+
+from tinman.handlers import static
+
+SCRIPT = b'var tinman = true;\n' * 100
+
+
+def write(path, value, mtime=None):
+    with open(path, 'wb') as handle:
+        handle.write(value)
+    if mtime:
+        os.utime(path, (mtime, mtime))
+
+
+class StaticIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'js'))
+        self.path = os.path.join(self.root, 'js', 'app.js')
+        write(self.path, SCRIPT, time.time() - 10)
+        write(self.path + '.gz', b'gzipped')
+        self.index = static.StaticIndex(self.root, max_cache_size=4096,
+                                        max_file_size=len(SCRIPT),
+                                        refresh_interval=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_files_are_indexed(self):
+        self.assertEqual(self.index.get(self.path).size, len(SCRIPT))
+
+    def test_variant_is_indexed(self):
+        self.assertEqual(self.index.get(self.path).variants['gzip'].path,
+                         self.path + '.gz')
+
+    def test_stale_variant_is_ignored(self):
+        write(self.path, SCRIPT + b'\n', time.time() + 10)
+        self.assertEqual(self.index.get(self.path).variants, {})
+
+    def test_changed_file_is_refreshed(self):
+        etag = self.index.get(self.path).etag
+        write(self.path, b'var tinman = false;\n', time.time() - 5)
+        self.assertNotEqual(self.index.get(self.path).etag, etag)
+
+    def test_expired_file_is_checked(self):
+        self.index.refresh_interval = 60
+        etag = self.index.get(self.path).etag
+        write(self.path, b'var tinman = false;\n', time.time() - 5)
+        self.assertEqual(self.index.get(self.path).etag, etag)
+        self.index.expire()
+        self.assertNotEqual(self.index.get(self.path).etag, etag)
+
+    def test_removed_file(self):
+        os.unlink(self.path)
+        self.assertIsNone(self.index.get(self.path))
+
+    def test_content_is_cached(self):
+        static_file = self.index.get(self.path)
+        self.index.content(static_file)
+        os.unlink(self.path)
+        self.assertEqual(self.index.content(static_file), SCRIPT)
+
+    def test_changed_content_is_not_served_from_cache(self):
+        self.index.content(self.index.get(self.path))
+        write(self.path, b'var tinman = false;\n', time.time() - 5)
+        self.assertEqual(self.index.content(self.index.get(self.path)),
+                         b'var tinman = false;\n')
+
+    def test_cache_is_bounded(self):
+        for offset in range(0, 5):
+            path = os.path.join(self.root, '%i.js' % offset)
+            write(path, SCRIPT)
+            self.index.content(self.index.get(path))
+        self.assertLessEqual(self.index.cache_size, 4096)
+        self.assertEqual(self.index.cache_size, len(SCRIPT) * 2)
+
+
+class TrackedHandler(static.StaticFileHandler):
+
+    finished = None
+
+    @gen.coroutine
+    def get(self, path, include_body=True):
+        try:
+            yield super(TrackedHandler, self).get(path, include_body)
+        finally:
+            if not self.finished.done():
+                self.finished.set_result(True)
+
+
+class StaticFileHandlerTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'app.js')
+        write(self.path, SCRIPT, time.time() - 10)
+        value = io.BytesIO()
+        with gzip.GzipFile(fileobj=value, mode='wb') as handle:
+            handle.write(SCRIPT)
+        write(self.path + '.gz', value.getvalue())
+        write(os.path.join(self.root, 'large.txt'), b'x' * 200000)
+        static.StaticFileHandler._indexes.clear()
+        return web.Application(static_path=self.root,
+                               static_handler_class=TrackedHandler,
+                               static_handler_args={'max_file_size': 4096})
+
+    def tearDown(self):
+        super(StaticFileHandlerTests, self).tearDown()
+        shutil.rmtree(self.root)
+
+    def setUp(self):
+        TrackedHandler.finished = concurrent.Future()
+        super(StaticFileHandlerTests, self).setUp()
+
+    def test_file(self):
+        response = self.fetch('/static/app.js')
+        self.assertEqual(response.body, SCRIPT)
+        self.assertTrue(response.headers['Content-Type'].endswith('javascript'))
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+    def test_precompressed_variant(self):
+        response = self.fetch('/static/app.js', use_gzip=False,
+                              headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(response.body)).read(),
+                         SCRIPT)
+
+    def test_not_modified(self):
+        etag = self.fetch('/static/app.js').headers['Etag']
+        response = self.fetch('/static/app.js',
+                              headers={'If-None-Match': etag})
+        self.assertEqual(response.code, 304)
+
+    def test_range(self):
+        response = self.fetch('/static/app.js',
+                              headers={'Range': 'bytes=0-2'})
+        self.assertEqual(response.code, 206)
+        self.assertEqual(response.body, b'var')
+
+    def test_large_file_is_chunked(self):
+        response = self.fetch('/static/large.txt')
+        self.assertEqual(response.body, b'x' * 200000)
+
+    @unittest.skipIf(tornado.version_info < (4, 0), 'Tornado 4 only')
+    @testing.gen_test
+    def test_client_disconnect_stops_large_file(self):
+        write(os.path.join(self.root, 'huge.bin'), b'x' * 16777216)
+        stream = iostream.IOStream(socket.socket())
+        yield stream.connect(('127.0.0.1', self.get_http_port()))
+        yield stream.write(b'GET /static/huge.bin HTTP/1.1\r\n'
+                           b'Host: localhost\r\n\r\n')
+        yield stream.read_bytes(65536, partial=True)
+        stream.close()
+        self.assertTrue((yield TrackedHandler.finished))
+
+    def test_reset_keeps_index(self):
+        self.fetch('/static/app.js')
+        index = static.StaticFileHandler._indexes[self.root]
+        TrackedHandler.reset()
+        self.fetch('/static/app.js')
+        self.assertIs(static.StaticFileHandler._indexes[self.root], index)
+
+    def test_changed_file_is_served_after_reset(self):
+        self.fetch('/static/app.js')
+        write(self.path, b'var tinman = false;\n', time.time() - 5)
+        TrackedHandler.reset()
+        self.assertEqual(self.fetch('/static/app.js', use_gzip=False).body,
+                         b'var tinman = false;\n')
+
+    def test_missing_file(self):
+        self.assertEqual(self.fetch('/static/missing.js').code, 404)
+
+    def test_outside_of_root(self):
+        self.assertEqual(self.fetch('/static/../etc/passwd').code, 403)
@@ -0,0 +1,160 @@
+import sys
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tinman import stats
+
+
+class StatsTests(unittest.TestCase):
+
+    ROUTES = [['/', 'tinman.example.Handler'],
+              ['re', '/(c[a-f0-9]{8}).gif', 'tinman.example.Handler']]
+    SLOTS = [(8000, 0), (8000, 1), (8001, 0)]
+
+    def setUp(self):
+        self.stats = stats.Stats(self.ROUTES, self.SLOTS)
+
+    def test_route_patterns(self):
+        self.assertEqual(self.stats.routes,
+                         ['/$', '/(c[a-f0-9]{8}).gif$', stats.OTHER])
+
+    def test_slot(self):
+        self.assertEqual(self.stats.slot(8000, 1), 1)
+
+    def test_requests_aggregated_across_slots(self):
+        self.stats.worker(0).record('/$', 200, 0.001)
+        self.stats.worker(2).record('/$', 200, 0.001)
+        self.assertEqual(self.stats.as_dict()['routes']['/$']['requests'], 2)
+
+    def test_status_class(self):
+        self.stats.worker(1).record('/$', 404, 0.001)
+        value = self.stats.as_dict()['routes']['/$']['status']
+        self.assertEqual(value['4xx'], 1)
+        self.assertEqual(value['2xx'], 0)
+
+    def test_unknown_route_recorded_as_other(self):
+        self.stats.worker(0).record('/unknown$', 200, 0.001)
+        self.stats.worker(0).record(None, 404, 0.001)
+        value = self.stats.as_dict()['routes'][stats.OTHER]
+        self.assertEqual(value['requests'], 2)
+
+    def test_latency_buckets_are_cumulative(self):
+        self.stats.worker(0).record('/$', 200, 0.02)
+        self.stats.worker(0).record('/$', 200, 30)
+        buckets = dict(self.stats.as_dict()['routes']['/$']['latency']['buckets'])
+        self.assertEqual(buckets[0.01], 0)
+        self.assertEqual(buckets[0.025], 1)
+        self.assertEqual(buckets[10.0], 1)
+        self.assertEqual(buckets['+Inf'], 2)
+
+    def test_latency_sum(self):
+        self.stats.worker(0).record('/$', 200, 0.25)
+        self.stats.worker(1).record('/$', 200, 0.5)
+        value = self.stats.as_dict()['routes']['/$']['latency']['sum']
+        self.assertAlmostEqual(value, 0.75)
+
+    def test_worker_counters(self):
+        self.stats.add_exit(2)
+        self.stats.add_respawn(2)
+        self.stats.worker(2).add_shed()
+        self.stats.worker(2).record('/$', 200, 0.001)
+        worker = self.stats.as_dict()['workers'][2]
+        self.assertEqual(worker, {'port': 8001, 'worker': 0, 'exits': 1,
+                                  'respawns': 1, 'shed': 1, 'requests': 1})
+
+
+class AreaTests(unittest.TestCase):
+
+    ROUTES = [['/', 'tinman.example.Handler']]
+    SLOTS = [(8000, 0), (8000, 1)]
+
+    def setUp(self):
+        self.stats = stats.Stats(self.ROUTES, self.SLOTS)
+
+    def test_areas_are_separate(self):
+        self.stats.worker(0, 0).add_in_flight('/$')
+        self.stats.worker(0, 1).add_in_flight('/$')
+        self.stats.worker(0, 1).remove_in_flight('/$')
+        self.stats.worker(0, 1).remove_in_flight('/$')
+        self.assertEqual(self.stats.as_dict()['routes']['/$']['in_flight'], 1)
+
+    def test_areas_do_not_overlap_other_slots(self):
+        self.stats.worker(0, 1).record('/$', 200, 0.001)
+        workers = self.stats.as_dict()['workers']
+        self.assertEqual(workers[0]['requests'], 1)
+        self.assertEqual(workers[1]['requests'], 0)
+
+    def test_worker_totals_include_every_area(self):
+        for area in range(0, stats.AREAS):
+            self.stats.worker(1, area).record('/$', 200, 0.001)
+            self.stats.worker(1, area).add_shed()
+        worker = self.stats.as_dict()['workers'][1]
+        self.assertEqual(worker['requests'], stats.AREAS)
+        self.assertEqual(worker['shed'], stats.AREAS)
+
+    def test_reset_in_flight(self):
+        self.stats.worker(0, 1).add_in_flight('/$')
+        self.stats.worker(0, 1).add_in_flight(None)
+        self.stats.worker(0, 0).add_in_flight('/$')
+        self.stats.worker(1, 1).add_in_flight('/$')
+        self.stats.reset_in_flight(0, 1)
+        routes = self.stats.as_dict()['routes']
+        self.assertEqual(routes['/$']['in_flight'], 2)
+        self.assertEqual(routes[stats.OTHER]['in_flight'], 0)
+
+    def test_reset_in_flight_keeps_counters(self):
+        self.stats.worker(0, 1).record('/$', 200, 0.001)
+        self.stats.reset_in_flight(0, 1)
+        self.assertEqual(self.stats.as_dict()['routes']['/$']['requests'], 1)
+
+    def test_routes_include_every_area(self):
+        self.stats.worker(0, 0).record('/$', 200, 0.001)
+        self.stats.worker(0, 1).record('/$', 500, 0.001)
+        value = self.stats.as_dict()['routes']['/$']
+        self.assertEqual(value['requests'], 2)
+        self.assertEqual(value['status']['5xx'], 1)
+
+
+class PrometheusTests(unittest.TestCase):
+
+    ROUTES = [['/', 'tinman.example.Handler']]
+    SLOTS = [(8000, 0), (8001, 0)]
+
+    def setUp(self):
+        self.stats = stats.Stats(self.ROUTES, self.SLOTS)
+        self.stats.worker(0).record('/$', 200, 0.001)
+        self.stats.worker(1).record('/$', 500, 0.001)
+        self.stats.worker(0).add_in_flight('/$')
+
+    def test_as_dict_for_port(self):
+        value = self.stats.as_dict(8000)
+        self.assertEqual(value['routes']['/$']['requests'], 1)
+        self.assertEqual(len(value['workers']), 1)
+
+    def test_in_flight(self):
+        self.assertEqual(self.stats.as_dict()['routes']['/$']['in_flight'], 1)
+        self.stats.worker(0).remove_in_flight('/$')
+        self.stats.worker(0).remove_in_flight('/$')
+        self.assertEqual(self.stats.as_dict()['routes']['/$']['in_flight'], 0)
+
+    def test_prometheus_counters(self):
+        lines = stats.prometheus(self.stats.as_dict(8000)).splitlines()
+        self.assertIn('tinman_requests_total{route="/$",code="2xx"} 1', lines)
+        self.assertIn('tinman_requests_in_flight{route="/$"} 1', lines)
+
+    def test_prometheus_histogram(self):
+        lines = stats.prometheus(self.stats.as_dict()).splitlines()
+        self.assertIn('tinman_request_duration_seconds_bucket'
+                      '{route="/$",le="+Inf"} 2', lines)
+        self.assertIn('tinman_request_duration_seconds_count'
+                      '{route="/$"} 2', lines)
+        self.assertIn('# TYPE tinman_request_duration_seconds histogram',
+                      lines)
+
+    def test_prometheus_escapes_labels(self):
+        value = stats.prometheus({'routes': {'/"a"\\$': self.stats.as_dict(
+            8000)['routes']['/$']}, 'workers': []})
+        self.assertIn('route="/\\"a\\"\\\\$"', value)
@@ -0,0 +1,146 @@
+import gzip
+import io
+import random
+import sys
+import zlib
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tornado import httputil
+
+from tinman import transforms
+
+BODY = b'\n\n<html>\n\n  <body>\n\n\n\n<p>tinman</p>\n  \n</body>\n</html>\n\n'
+
+
+class Request(object):
+
+    def __init__(self, accept_encoding=None):
+        self.headers = httputil.HTTPHeaders()
+        if accept_encoding:
+            self.headers['Accept-Encoding'] = accept_encoding
+
+
+def headers(content_type='text/html; charset=UTF-8', length=None):
+    value = httputil.HTTPHeaders({'Content-Type': content_type})
+    if length is not None:
+        value['Content-Length'] = str(length)
+    return value
+
+
+def stream(transform, chunks, response_headers=None):
+    response_headers = response_headers or headers()
+    output = list()
+    for offset, chunk in enumerate(chunks):
+        finishing = offset == len(chunks) - 1
+        if not offset:
+            _status, response_headers, chunk = \
+                transform.transform_first_chunk(200, response_headers, chunk,
+                                                finishing)
+        else:
+            chunk = transform.transform_chunk(chunk, finishing)
+        output.append(chunk)
+    return response_headers, b''.join(output)
+
+
+def split(value, generator):
+    offsets = sorted(set([generator.randint(0, len(value))
+                          for _ in range(0, generator.randint(1, 8))]))
+    offsets = [0] + offsets + [len(value)]
+    return [value[start:end] for start, end in zip(offsets, offsets[1:])]
+
+
+class StripBlankLinesTests(unittest.TestCase):
+
+    EXPECTATION = b'\n'.join([line for line in BODY.split(b'\n') if line])
+
+    def test_whole_body(self):
+        transform = transforms.StripBlankLines(Request())
+        response_headers, body = stream(transform, [BODY],
+                                        headers(length=len(BODY)))
+        self.assertEqual(body, self.EXPECTATION)
+        self.assertEqual(response_headers['Content-Length'], str(len(body)))
+
+    def test_chunk_boundaries(self):
+        generator = random.Random(7)
+        for _ in range(0, 200):
+            transform = transforms.StripBlankLines(Request())
+            self.assertEqual(stream(transform, split(BODY, generator))[1],
+                             self.EXPECTATION)
+
+    def test_non_text_is_unchanged(self):
+        transform = transforms.StripBlankLines(Request())
+        self.assertEqual(stream(transform, [BODY],
+                                headers('application/json'))[1], BODY)
+
+
+class ContentEncodingTests(unittest.TestCase):
+
+    PAYLOAD = b'{"value": "tinman"}\n' * 200
+
+    def test_gzip_preferred(self):
+        request = Request('deflate, gzip;q=0.5')
+        self.assertEqual(transforms.ContentEncoding(request).encoding,
+                         transforms.GZIP)
+
+    def test_zero_quality_is_not_accepted(self):
+        request = Request('gzip;q=0, deflate')
+        self.assertEqual(transforms.ContentEncoding(request).encoding,
+                         transforms.DEFLATE)
+
+    def test_gzip_whole_body(self):
+        transform = transforms.ContentEncoding(Request('gzip'))
+        response_headers, body = stream(transform, [self.PAYLOAD],
+                                        headers('application/json',
+                                                len(self.PAYLOAD)))
+        self.assertEqual(response_headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response_headers['Content-Length'], str(len(body)))
+        self.assertEqual(response_headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(body)).read(),
+                         self.PAYLOAD)
+
+    def test_deflate_streamed(self):
+        transform = transforms.ContentEncoding(Request('deflate'))
+        chunks = split(self.PAYLOAD, random.Random(3))
+        response_headers, body = stream(transform, chunks,
+                                        headers('application/json'))
+        self.assertEqual(response_headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(body), self.PAYLOAD)
+
+    def test_streamed_chunks_are_flushed(self):
+        transform = transforms.ContentEncoding(Request('gzip'))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunk = transform.transform_first_chunk(200, headers(), b'<html>',
+                                                False)[2]
+        self.assertEqual(decompressor.decompress(chunk), b'<html>')
+        chunk = transform.transform_chunk(b'<body>', False)
+        self.assertEqual(decompressor.decompress(chunk), b'<body>')
+
+    def test_small_body_is_not_compressed(self):
+        transform = transforms.ContentEncoding(Request('gzip'), min_size=1024)
+        response_headers, body = stream(transform, [b'small'])
+        self.assertNotIn('Content-Encoding', response_headers)
+        self.assertEqual(body, b'small')
+
+    def test_content_type_allowlist(self):
+        transform = transforms.ContentEncoding(Request('gzip'),
+                                               content_types=['text/*'])
+        response_headers, body = stream(transform, [self.PAYLOAD],
+                                        headers('application/json'))
+        self.assertNotIn('Content-Encoding', response_headers)
+        self.assertEqual(body, self.PAYLOAD)
+
+    def test_wildcard_content_type(self):
+        transform = transforms.ContentEncoding(Request('gzip'), min_size=0,
+                                               content_types=['text/*'])
+        response_headers, _body = stream(transform, [self.PAYLOAD])
+        self.assertEqual(response_headers['Content-Encoding'], 'gzip')
+
+    def test_not_accepted(self):
+        transform = transforms.ContentEncoding(Request())
+        response_headers, body = stream(transform, [self.PAYLOAD])
+        self.assertNotIn('Content-Encoding', response_headers)
+        self.assertEqual(body, self.PAYLOAD)
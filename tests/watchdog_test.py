@@ -0,0 +1,48 @@
+import sys
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+sys.path.insert(0, '..')
+
+from tinman import watchdog
+
+
+class WatchdogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.watchdog = watchdog.Watchdog(None, max_stacks=1)
+
+    def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(watchdog.percentile(values, 50), 50.0)
+        self.assertEqual(watchdog.percentile(values, 99), 99.0)
+
+    def test_percentile_without_values(self):
+        self.assertEqual(watchdog.percentile([], 99), 0.0)
+
+    def test_lag_percentiles(self):
+        for value in range(0, 10):
+            self.watchdog.record(value / 10.0)
+        lag = self.watchdog.as_dict()['lag']
+        self.assertEqual(lag['samples'], 10)
+        self.assertEqual(lag['p50'], 0.4)
+        self.assertEqual(lag['max'], 0.9)
+
+    def test_samples_are_bounded(self):
+        for value in range(0, watchdog.SAMPLES + 10):
+            self.watchdog.record(0.0)
+        self.assertEqual(len(self.watchdog.samples), watchdog.SAMPLES)
+
+    def blocking_call(self):
+        self.watchdog.on_blocked(None, sys._getframe())
+
+    def test_blocking_stacks_are_counted(self):
+        for _ in range(0, 2):
+            self.blocking_call()
+        self.watchdog.on_blocked(None, sys._getframe())
+        value = self.watchdog.as_dict()
+        self.assertEqual(value['blocked'], 3)
+        self.assertEqual(len(value['stacks']), 1)
+        self.assertEqual(value['stacks'][0]['count'], 2)
+        self.assertIn('blocking_call', value['stacks'][0]['stack'][-1])
@@ -0,0 +1,167 @@
+"""
+Asynchronous access log that keeps logging I/O off of the IOLoop. Completed
+requests are added to a queue as compact tuples and a background thread
+formats them as JSON lines and writes them to the tinman.access logger in
+batches. Successful responses may be sampled, while slow and failed requests
+are always logged.
+
+"""
+import json
+import logging
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import random
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+#: The logger the access log batches are written to
+ACCESS_LOGGER = logging.getLogger('tinman.access')
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_QUEUE = 10000
+DEFAULT_SAMPLE_RATE = 1.0
+DEFAULT_SLOW_THRESHOLD = 1.0
+
+FIELDS = ('time', 'status', 'method', 'uri', 'remote_ip', 'duration',
+          'route')
+
+
+class AccessLog(object):
+    """Queues access log records on the IOLoop and writes them in batches
+    from a background thread.
+
+    """
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_queue=DEFAULT_MAX_QUEUE,
+                 sample_rate=DEFAULT_SAMPLE_RATE,
+                 slow_threshold=DEFAULT_SLOW_THRESHOLD):
+        """Create the access log, starting the writer thread.
+
+        :param int batch_size: The maximum number of records per write
+        :param float flush_interval: Maximum seconds a record waits to be
+            written
+        :param int max_queue: Records queued before new ones are dropped
+        :param float sample_rate: The fraction of 2xx responses to log
+        :param float slow_threshold: Seconds after which a request is always
+            logged
+
+        """
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.sampled_out = 0
+        self.slow_threshold = slow_threshold
+        self._queue = queue.Queue(max_queue)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='tinman.accesslog')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, handler, route=None):
+        """Queue the access log record for a finished request unless it is a
+        2xx response that is sampled out. Records are dropped and counted if
+        the queue is full instead of blocking the IOLoop.
+
+        :param tornado.web.RequestHandler handler: The request handler
+        :param str route: The route pattern the request matched
+
+        """
+        status = handler.get_status()
+        duration = handler.request.request_time()
+        if (200 <= status < 300 and duration < self.slow_threshold and
+                self.sample_rate < 1.0 and
+                random.random() >= self.sample_rate):
+            self.sampled_out += 1
+            return
+        try:
+            self._queue.put_nowait((time.time(), status,
+                                    handler.request.method,
+                                    handler.request.uri,
+                                    handler.request.remote_ip,
+                                    round(duration * 1000.0, 3), route))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout=None):
+        """Stop the writer thread once it has written the queued records.
+
+        :param float timeout: Seconds to wait for the writer thread
+
+        """
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def _batch(self):
+        """Return the next batch of records, waiting up to the flush interval
+        for the first one.
+
+        :rtype: list
+
+        """
+        try:
+            records = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(records) < self.batch_size:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return records
+
+    @staticmethod
+    def _format(record):
+        """Return the JSON line for a record, replacing any bytes in its
+        fields that are not valid UTF-8, such as in a request URI.
+
+        :param tuple record: The access log record
+        :rtype: str
+
+        """
+        return json.dumps(dict([(field, value.decode('utf-8', 'replace')
+                                 if isinstance(value, bytes) else value)
+                                for field, value in zip(FIELDS, record)]),
+                          sort_keys=True)
+
+    def _lines(self, records):
+        """Return the JSON lines for the records, leaving out any record that
+        can not be formatted so it does not cost the rest of the batch.
+
+        :param list records: The access log records
+        :rtype: list
+
+        """
+        lines = list()
+        for record in records:
+            try:
+                lines.append(self._format(record))
+            except Exception as error:
+                LOGGER.error('Error formatting access log record %r: %s',
+                             record, error)
+        return lines
+
+    def _run(self):
+        """Write the queued records in batches until stopped and the queue is
+        empty.
+
+        """
+        while not self._stopping.is_set() or not self._queue.empty():
+            records = self._batch()
+            if not records:
+                continue
+            lines = self._lines(records)
+            if not lines:
+                continue
+            try:
+                ACCESS_LOGGER.info('\n'.join(lines))
+            except Exception as error:
+                LOGGER.exception('Error writing %i access log records: %s',
+                                 len(lines), error)
@@ -2,43 +2,293 @@
 Main Tinman Application Class
 
 """
+import collections
+import copy
+import fnmatch
+import functools
+import gc
 import logging
+import os
+import re
 import sys
+import time
 
+from tornado import concurrent
+from tornado import escape
+from tornado import httputil
+from tornado import template
 from tornado import web
 
+from tinman import accesslog
 from tinman import config
 from tinman import exceptions
+from tinman import jsoncodec
+from tinman import routing
 from tinman import utils
 from tinman import __version__
+from tinman.handlers import static
 
 LOGGER = logging.getLogger(__name__)
 
+ACCESS_LOG_TIMEOUT = 5
+DEFAULT_RETRY_AFTER = 1
+IN_FLIGHT_ROUTE = '_in_flight_route'
+ROUTE_PATTERN = 'route_pattern'
+STATIC_HANDLER_ARGS = 'static_handler_args'
+STATIC_HANDLER_CLASS = 'static_handler_class'
 STATIC_PATH = 'static_path'
+TEMPLATE_LOADER = 'template_loader'
 TEMPLATE_PATH = 'template_path'
 
+# Template files compiled when precompile_templates is true
+TEMPLATE_PATTERNS = ['*.htm', '*.html', '*.js', '*.json', '*.txt', '*.xml']
+
+# The host pattern configured routes are added for
+HOST_PATTERN = '.*$'
+
+# Tornado 4.0 and later dispatch requests from the HTTPServer with a message
+# delegate created by Application.start_request instead of calling the
+# Application
+REQUEST_DISPATCHER = hasattr(httputil, 'HTTPMessageDelegate')
+
+# Tornado 4.5 and later keep the handlers in routers instead of in the
+# Application's handlers list
+ROUTERS = not hasattr(web.Application, '_get_host_handlers')
+
+# The handler class a request is dispatched to, the arguments to create and
+# execute it with and the pattern of the route it matched
+Route = collections.namedtuple('Route', ['handler_class', 'handler_kwargs',
+                                         'path_args', 'path_kwargs',
+                                         'pattern'])
+
+# Settings that are only applied when the application is created
+RESTART_SETTINGS = [config.ACCESS_LOG, config.DEFAULT_LOCALE,
+                    config.LAZY_ROUTES, config.PATHS, config.TRANSFORMS,
+                    config.UI_MODULES, 'gzip', STATIC_HANDLER_ARGS,
+                    STATIC_HANDLER_CLASS, 'static_url_prefix']
+
+# The path translations were last loaded from in this process
+_translations_path = None
+
+
+def load_translations(path):
+    """Load the translations from the path unless they have already been
+    loaded in this process, such as when they were preloaded by the
+    controller before forking.
+
+    :param str path: The path to the translation files
+
+    """
+    global _translations_path
+    if path == _translations_path:
+        LOGGER.debug('Translations already loaded from %s', path)
+        return
+    LOGGER.info('Loading translations from %s', path)
+    from tornado import locale
+    locale.load_translations(path)
+    _translations_path = path
+
+
+def preload(settings, routes):
+    """Import the route handlers, UI modules and transforms and load the
+    translations once in the controller, before the workers are forked, so
+    the workers share them copy-on-write instead of each importing and parsing
+    them. Objects that survive a full collection are then frozen, where
+    supported, so the garbage collector does not touch their pages in the
+    workers.
+
+    :param dict settings: The Application configuration
+    :param list routes: The Routes configuration
+
+    """
+    start = time.time()
+    paths = dict(settings.get(config.PATHS) or {})
+    class_paths = [route_class_path(route) for route in routes or []
+                   if isinstance(route, (list, tuple))]
+    class_paths += [transform_class_path(transform)
+                    for transform in settings.get(config.TRANSFORMS) or []]
+    class_paths += list((settings.get(config.UI_MODULES) or {}).values())
+    for class_path in class_paths:
+        LOGGER.debug('Preloading %s', class_path)
+        try:
+            utils.import_namespaced_class(class_path)
+        except (AttributeError, ImportError) as error:
+            LOGGER.error('Could not preload %s: %s', class_path, error)
+    if config.TRANSLATIONS in paths:
+        load_translations(paths[config.TRANSLATIONS].replace(
+            config.BASE_VARIABLE, paths.get(config.BASE, '')))
+    if (settings.get(config.PRECOMPILE_TEMPLATES) and
+            config.TEMPLATES in paths):
+        precompile_templates(paths[config.TEMPLATES].replace(
+            config.BASE_VARIABLE, paths.get(config.BASE, '')), settings)
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    LOGGER.info('Preloaded %i classes in %.2f seconds',
+                len(class_paths), time.time() - start)
+
+
+def precompile_templates(path, settings):
+    """Compile the templates in the template path with the loader tornado's
+    request handlers use for the path, so the first request for a page in
+    each worker does not have to compile it. Templates are compiled with the
+    templates they extend or include. The precompile_templates setting is
+    either true, to compile the files matching TEMPLATE_PATTERNS, or a list
+    of file name patterns. Returns the errors for the templates that could not
+    be compiled by template name.
+
+    :param str path: The template path
+    :param dict settings: The Application settings
+    :rtype: dict
+
+    """
+    if not settings.get('compiled_template_cache', True):
+        LOGGER.warning('Not precompiling templates, the template cache is off')
+        return dict()
+    patterns = settings.get(config.PRECOMPILE_TEMPLATES)
+    if not isinstance(patterns, (list, tuple)):
+        patterns = TEMPLATE_PATTERNS
+    with web.RequestHandler._template_loader_lock:
+        if path not in web.RequestHandler._template_loaders:
+            web.RequestHandler._template_loaders[path] = \
+                template_loader(path, settings)
+        loader = web.RequestHandler._template_loaders[path]
+    start, count, errors = time.time(), 0, dict()
+    for directory, directories, names in os.walk(path):
+        directories[:] = sorted([name for name in directories
+                                 if not name.startswith('.')])
+        for name in sorted(names):
+            if (name.startswith('.') or
+                    not any([fnmatch.fnmatch(name, pattern)
+                             for pattern in patterns])):
+                continue
+            template_name = os.path.relpath(os.path.join(directory, name),
+                                            path).replace(os.path.sep, '/')
+            try:
+                loader.load(template_name)
+            except Exception as error:
+                LOGGER.error('Could not compile template %s: %s',
+                             template_name, error)
+                errors[template_name] = error
+            else:
+                count += 1
+    LOGGER.info('Compiled %i templates in %s in %.2f seconds',
+                count, path, time.time() - start)
+    if errors:
+        LOGGER.error('%i templates could not be compiled', len(errors))
+    return errors
+
+
+def request_host(request):
+    """Return the host name the request was made to without the port, the
+    same way Tornado matches it against the host patterns.
+
+    :param tornado.httpserver.HTTPRequest request: The request
+    :rtype: str
+
+    """
+    host = request.host.lower()
+    if hasattr(httputil, 'split_host_and_port'):
+        return httputil.split_host_and_port(host)[0]
+    return host.split(':')[0]
+
+
+def route_class_path(route):
+    """Return the handler class path for a route from the Routes
+    configuration.
+
+    :param list route: The route configuration
+    :rtype: str
+
+    """
+    return route[2] if route[0] == 're' else route[1]
+
+
+def template_loader(path, settings):
+    """Return the template loader for the template path, the same way
+    tornado's RequestHandler.create_template_loader does.
+
+    :param str path: The template path
+    :param dict settings: The Application settings
+    :rtype: tornado.template.BaseLoader
+
+    """
+    if TEMPLATE_LOADER in settings:
+        return settings[TEMPLATE_LOADER]
+    kwargs = dict()
+    for key in ['autoescape', 'template_whitespace']:
+        if key in settings:
+            kwargs[key.replace('template_', '')] = settings[key]
+    return template.Loader(path, **kwargs)
+
+
+def transform_class_path(transform):
+    """Return the class path for a transform from the transforms
+    configuration, which is either the class path or a mapping with the class
+    path as its name and the keyword arguments for the transform.
+
+    :param str|dict transform: The transform configuration
+    :rtype: str
+
+    """
+    return transform[config.NAME] if isinstance(transform, dict) else transform
+
+
+def url_spec(rule):
+    """Return the URL spec for a routing rule of a Tornado 4.5 and later
+    Application.
+
+    :param tornado.routing.Rule rule: The routing rule
+    :rtype: tornado.web.URLSpec
+
+    """
+    if isinstance(rule, web.URLSpec):
+        return rule
+    return web.URLSpec(rule.matcher.regex.pattern, rule.target,
+                       rule.target_kwargs, rule.name)
+
 
 class Application(web.Application):
     """Application extends web.Application and handles all sorts of things
     for you that you'd have to handle yourself.
 
     """
-    def __init__(self, settings, routes, port):
+    def __init__(self, settings, routes, port, stats=None, watchdog=None):
         """Create a new Application instance with the specified Routes and
         settings.
 
         :param dict settings: Application settings
         :param list routes: A list of route tuples
         :param int port: The port number for the HTTP server
+        :param tinman.stats.WorkerStats stats: Shared request statistics
+        :param tinman.watchdog.Watchdog watchdog: The IOLoop watchdog
 
         """
+        self.access_log = None
         self.attributes = Attributes()
         self.host = utils.gethostname()
+        self.import_times = dict()
+        self.pending_tasks = 0
         self.port = port
+        self.request_count = 0
+        self.requests_in_flight = 0
+        self.shed_count = 0
+        self.stats = stats
+        self.template_errors = dict()
+        self.watchdog = watchdog
         self._config = settings or dict()
+        self.json_codec = jsoncodec.codec(self._config.get(config.JSON_BACKEND))
+        self._admission = self._config.get(config.ADMISSION) or dict()
+        self._handler_classes = dict()
+        self._lazy_routes = self._config.get(config.LAZY_ROUTES, False)
+        self._loaded_config = copy.deepcopy(self._config)
+        self._route_in_flight = dict()
+        self._route_indexes = dict()
+        self._route_limits = dict()
+        self._route_specs = list()
         self._insert_base_path()
         self._prepare_paths()
-        self._prepare_routes(routes)
+        prepared_routes = self._prepare_routes(routes)
         self._prepare_static_path()
         self._prepare_template_path()
         self._prepare_transforms()
@@ -50,10 +300,55 @@ class Application(web.Application):
             raise exceptions.NoRoutesException()
 
         # Get the routes and initialize the tornado.web.Application instance
-        super(Application, self).__init__(routes, **self._config)
+        super(Application, self).__init__(prepared_routes, **self._config)
+        if ROUTERS:
+            self.handlers, self.named_handlers = list(), dict()
+            self._add_specs(HOST_PATTERN,
+                            [url_spec(rule)
+                             for rule in self.wildcard_router.rules])
+        specs = self._host_specs(HOST_PATTERN)
+        self._route_specs = specs[len(specs) - len(prepared_routes):]
+        self._routes = self._route_keys(routes)
+        self._prepare_route_limits()
+        self._log_import_times()
+        self._prepare_access_log()
+        self._precompile_templates()
+
+    def __call__(self, request):
+        """Called by the HTTPServer to execute the request with versions of
+        Tornado before 4.0. With later versions this is only used by the
+        legacy HTTPServer interface and the request is dispatched the same
+        way as the requests from start_request.
+
+        :param tornado.httpserver.HTTPRequest request: The request
+        :rtype: tornado.web.RequestHandler
+
+        """
+        if REQUEST_DISPATCHER:
+            dispatcher = RequestDispatcher(self, None)
+            dispatcher.set_request(request)
+            return dispatcher.execute()
+        transforms = [t(request) for t in self.transforms]
+        route = self._find_handler(request)
+        self._reset_caches()
+        handler = self._create_handler(request, route)
+        handler._execute(transforms, *route.path_args, **route.path_kwargs)
+        return handler
+
+    @property
+    def idle(self):
+        """Returns True if there are no requests in flight and no pending
+        tasks, such as session saves or buffered messages to publish, that
+        were started by requests.
+
+        :rtype: bool
+
+        """
+        return not self.requests_in_flight and not self.pending_tasks
 
     def log_request(self, handler):
-        """Writes a completed HTTP request to the logs.
+        """Writes a completed HTTP request to the logs, no longer counting it
+        as in flight.
 
         By default writes to the tinman.application LOGGER.  To change
         this behavior either subclass Application and override this method,
@@ -63,9 +358,21 @@ class Application(web.Application):
         :param tornado.web.RequestHandler handler: The request handler
 
         """
+        self.request_count += 1
+        route = getattr(handler, IN_FLIGHT_ROUTE, None)
+        if route:
+            setattr(handler, IN_FLIGHT_ROUTE, None)
+            self._release(route)
+        if self.stats:
+            self.stats.record(getattr(handler, ROUTE_PATTERN, None),
+                              handler.get_status(),
+                              handler.request.request_time())
         if config.LOG_FUNCTION in self.settings:
             self.settings[config.LOG_FUNCTION](handler)
             return
+        if self.access_log:
+            self.access_log.add(handler, getattr(handler, ROUTE_PATTERN, None))
+            return
         if handler.get_status() < 400:
             log_method = LOGGER.info
         elif handler.get_status() < 500:
@@ -76,6 +383,49 @@ class Application(web.Application):
         log_method("%d %s %.2fms", handler.get_status(),
                    handler._request_summary(), request_time)
 
+    def start_request(self, server_conn, request_conn):
+        """Called by the HTTPServer with Tornado 4.0 and later to create the
+        delegate that dispatches the request.
+
+        :param object server_conn: The server connection
+        :param tornado.httputil.HTTPConnection request_conn: The connection
+        :rtype: RequestDispatcher
+
+        """
+        return RequestDispatcher(self, request_conn)
+
+    def close(self):
+        """Close the shared resources created for the application and write
+        any access log records that are still queued. Invoked by the worker
+        process once its IOLoop has stopped.
+
+        """
+        if self.access_log:
+            self.access_log.stop(ACCESS_LOG_TIMEOUT)
+        self.attributes.close()
+
+    def reload(self, settings, routes):
+        """Apply a new configuration to the running application. Only the
+        handler classes for new routes are imported and the URL specs for
+        unchanged routes are reused. The new routing table replaces the old
+        one in a single assignment, so this must be invoked on the IOLoop,
+        between requests, and requests that are in flight finish on the
+        handlers they were routed to. If a handler class can not be imported
+        the current routes are kept.
+
+        :param dict settings: The new Application configuration
+        :param list routes: The new Routes configuration
+        :rtype: bool
+
+        """
+        self._reload_settings(settings)
+        if self._route_keys(routes) == self._routes:
+            LOGGER.debug('Routes are unchanged')
+        elif not self._reload_routes(routes):
+            return False
+        self._prepare_route_limits()
+        return True
+
     @property
     def paths(self):
         """Return the path configuration
@@ -85,6 +435,164 @@ class Application(web.Application):
         """
         return self._config.get(config.PATHS, dict())
 
+    def add_handlers(self, host_pattern, host_handlers):
+        """Append the handlers for the host pattern, discarding the dispatch
+        indexes so they are rebuilt with the new handlers.
+
+        :param str host_pattern: The host pattern
+        :param list host_handlers: The URL specs or route tuples to add
+
+        """
+        super(Application, self).add_handlers(host_pattern, host_handlers)
+        if ROUTERS:
+            self._add_specs(host_pattern, host_handlers)
+        self._route_indexes = dict()
+
+    def reverse_url(self, name, *args):
+        """Returns a URL path for the route with the name, from the named
+        routes the Application dispatches requests to.
+
+        :param str name: The route name
+        :param list args: The values for the capturing groups in the route
+        :rtype: str
+        :raises: KeyError
+
+        """
+        if name in self.named_handlers:
+            return self.named_handlers[name].reverse(*args)
+        raise KeyError('%s not found in named urls' % name)
+
+    def _add_specs(self, host_pattern, host_handlers):
+        """Add the handlers for the host pattern to the handlers list the
+        requests are dispatched from, the way add_handlers does before
+        Tornado 4.5.
+
+        :param str host_pattern: The host pattern
+        :param list host_handlers: The URL specs or route tuples to add
+
+        """
+        if not host_pattern.endswith('$'):
+            host_pattern += '$'
+        specs = list()
+        if self.handlers and self.handlers[-1][0].pattern == HOST_PATTERN:
+            self.handlers.insert(-1, (re.compile(host_pattern), specs))
+        else:
+            self.handlers.append((re.compile(host_pattern), specs))
+        for spec in host_handlers:
+            if isinstance(spec, (tuple, list)):
+                spec = web.URLSpec(*spec)
+            specs.append(spec)
+            if spec.name:
+                self.named_handlers[spec.name] = spec
+
+    def _create_handler(self, request, route):
+        """Create the handler for the route, assigning the matched route
+        pattern to its route_pattern attribute and the route the request was
+        counted as in flight for, so it is released by log_request.
+
+        :param tornado.httpserver.HTTPRequest request: The request
+        :param Route route: The route the request was dispatched to
+        :rtype: tornado.web.RequestHandler
+
+        """
+        handler = route.handler_class(self, request, **route.handler_kwargs)
+        setattr(handler, IN_FLIGHT_ROUTE, route)
+        setattr(handler, ROUTE_PATTERN, route.pattern)
+        return handler
+
+    def _find_handler(self, request):
+        """Find the route for the request and count the request as in flight
+        for it. The request is counted when it is admitted, as soon as its
+        headers are received, so requests whose bodies are still being read
+        count against the max_in_flight limit and the limit for their route.
+        The request is no longer counted once it is logged by log_request, or
+        when the connection is closed before its handler is created.
+
+        :param tornado.httpserver.HTTPRequest request: The request
+        :rtype: Route
+
+        """
+        route = self._match_route(request)
+        self.requests_in_flight += 1
+        if route.handler_class in self._route_in_flight:
+            self._route_in_flight[route.handler_class] += 1
+        if self.stats and route.pattern:
+            self.stats.add_in_flight(route.pattern)
+        return route
+
+    def _match_route(self, request):
+        """Find the route matching the request using the dispatch index for
+        the host, returning the handler class to dispatch the request to and
+        the arguments to create and execute it with. Requests over the
+        worker's max_in_flight limit or the limit for their route are
+        dispatched to the handler that sheds them.
+
+        :param tornado.httpserver.HTTPRequest request: The request
+        :rtype: Route
+
+        """
+        max_in_flight = self._admission.get(config.MAX_IN_FLIGHT)
+        if max_in_flight and self.requests_in_flight >= max_in_flight:
+            return self._shed(request)
+        index = self._route_index(request)
+        if not index:
+            return Route(web.RedirectHandler,
+                         {'url': '%s://%s/' % (request.protocol,
+                                               self.default_host)},
+                         [], {}, None)
+        spec, match = index.match(request.path)
+        if spec:
+            handler_class = spec.handler_class
+            if not handler_class:
+                return Route(web.ErrorHandler, {'status_code': 500}, [], {},
+                             spec.regex.pattern)
+            if handler_class in self._route_limits:
+                if (self._route_in_flight[handler_class] >=
+                        self._route_limits[handler_class]):
+                    return self._shed(request)
+            args, kwargs = self._path_arguments(spec, match)
+            return Route(handler_class, spec.kwargs or {}, args, kwargs,
+                         spec.regex.pattern)
+        if self.settings.get('default_handler_class'):
+            return Route(self.settings['default_handler_class'],
+                         self.settings.get('default_handler_args', {}),
+                         [], {}, None)
+        return Route(web.ErrorHandler, {'status_code': 404}, [], {}, None)
+
+    def _handler_class(self, class_path):
+        """Return the handler class for the class path, only importing it the
+        first time it is used by a route. Returns None if it could not be
+        imported, which is also remembered so the import is not tried again
+        until the routes are reloaded.
+
+        :param str class_path: The full path to the class (foo.bar.Baz)
+        :rtype: class|None
+
+        """
+        if class_path not in self._handler_classes:
+            start = time.time()
+            handler = self._import_class(class_path)
+            if not handler:
+                self._handler_classes[class_path] = None
+                return None
+            module = class_path.rsplit('.', 1)[0]
+            self.import_times[module] = (self.import_times.get(module, 0) +
+                                         time.time() - start)
+            self._handler_classes[class_path] = handler
+        return self._handler_classes[class_path]
+
+    def _host_specs(self, host_pattern):
+        """Return the URL specs for the host pattern.
+
+        :param str host_pattern: The host pattern
+        :rtype: list
+
+        """
+        for regex, specs in self.handlers:
+            if regex.pattern == host_pattern:
+                return specs
+        return list()
+
     def _import_class(self, class_path):
         """Try and import the specified namespaced class.
 
@@ -113,6 +621,22 @@ class Application(web.Application):
             LOGGER.critical('Could not import %s: %s', module_path, error)
             return None
 
+    def _log_import_times(self):
+        """Log how long the route handler modules took to import, slowest
+        first.
+
+        """
+        if self._lazy_routes:
+            LOGGER.info('Route handlers will be imported on first use')
+        if not self.import_times:
+            return
+        LOGGER.info('Imported %i route handler module(s) in %.3f seconds',
+                    len(self.import_times), sum(self.import_times.values()))
+        for module, duration in sorted(self.import_times.items(),
+                                       key=lambda item: item[1],
+                                       reverse=True):
+            LOGGER.info('  %.3fs %s', duration, module)
+
     def _insert_base_path(self):
         """If the "base" path is set in the paths section of the config, insert
         it into the python path.
@@ -121,6 +645,228 @@ class Application(web.Application):
         if config.BASE in self.paths:
             sys.path.insert(0, self.paths[config.BASE])
 
+    @staticmethod
+    def _route_keys(routes):
+        """Return the keys used to compare the routes in a Routes
+        configuration with the routes that are currently loaded.
+
+        :param list routes: The Routes configuration
+        :rtype: list
+
+        """
+        return [repr(route) for route in routes or []
+                if isinstance(route, (list, tuple))]
+
+    def _route_index(self, request):
+        """Return the dispatch index for the URL specs of the hosts the
+        request host matches, the same specs _get_host_handlers would return.
+        An index is built the first time a set of hosts is matched and kept
+        until the routes are changed by add_handlers or reload.
+
+        :param tornado.httpserver.HTTPRequest request: The request
+        :rtype: tinman.routing.RouteIndex|None
+
+        """
+        hosts = self._host_positions(request_host(request))
+        if not hosts and 'X-Real-Ip' not in request.headers:
+            hosts = self._host_positions(self.default_host)
+        if not hosts:
+            return None
+        index = self._route_indexes.get(hosts)
+        if not index:
+            index = routing.RouteIndex([spec for position in hosts
+                                        for spec in self.handlers[position][1]])
+            self._route_indexes[hosts] = index
+        return index
+
+    def _host_positions(self, host):
+        """Return the positions of the host patterns in handlers that match
+        the host.
+
+        :param str host: The host name
+        :rtype: tuple
+
+        """
+        return tuple([position for position, (pattern, specs_unused)
+                      in enumerate(self.handlers) if pattern.match(host)])
+
+    def _release(self, route):
+        """Stop counting a request that was dispatched to the route as in
+        flight.
+
+        :param Route route: The route the request was dispatched to
+
+        """
+        self.requests_in_flight -= 1
+        if self._route_in_flight.get(route.handler_class):
+            self._route_in_flight[route.handler_class] -= 1
+        if self.stats and route.pattern:
+            self.stats.remove_in_flight(route.pattern)
+
+    def _reset_caches(self):
+        """If the template cache is disabled (usually in the debug mode),
+        re-compile templates and reload static files on every request so you
+        don't need to restart to see changes.
+
+        """
+        if not self.settings.get('compiled_template_cache', True):
+            with web.RequestHandler._template_loader_lock:
+                for loader in web.RequestHandler._template_loaders.values():
+                    loader.reset()
+        if not self.settings.get('static_hash_cache', True):
+            web.StaticFileHandler.reset()
+
+    def _shed(self, request):
+        """Return the route that sheds the request with a 503 response,
+        counting the shed request.
+
+        :param tornado.httpserver.HTTPRequest request: The request
+        :rtype: Route
+
+        """
+        self.shed_count += 1
+        if self.stats:
+            self.stats.add_shed()
+        return Route(ServiceUnavailableHandler,
+                     {'retry_after': self._admission.get(config.RETRY_AFTER,
+                                                         DEFAULT_RETRY_AFTER)},
+                     [], {}, None)
+
+    @staticmethod
+    def _path_arguments(spec, match):
+        """Return the positional and keyword arguments to pass to the handler
+        from the groups matched in the request path. Since match.groups()
+        includes both named and unnamed groups, either the groups or the
+        groupdict are used but not both. Arguments are passed as bytes so the
+        handler can decide what encoding to use.
+
+        :param tornado.web.URLSpec spec: The matched route
+        :param re.MatchObject match: The request path match
+        :rtype: tuple(list, dict)
+
+        """
+        if not spec.regex.groups:
+            return [], {}
+
+        def unquote(value):
+            if value is None:
+                return value
+            return escape.url_unescape(value, encoding=None, plus=False)
+
+        if spec.regex.groupindex:
+            return [], dict([(str(key), unquote(value))
+                             for key, value in match.groupdict().items()])
+        return [unquote(value) for value in match.groups()], {}
+
+    def _reload_routes(self, routes):
+        """Prepare the new routes, reusing the URL specs of routes that have
+        not changed, and swap them in for the current routes.
+
+        :param list routes: The new Routes configuration
+        :rtype: bool
+
+        """
+        self._handler_classes = dict([(class_path, handler) for class_path,
+                                      handler in self._handler_classes.items()
+                                      if handler])
+        current = dict([(key, spec) for key, spec
+                        in zip(self._routes, self._route_specs)
+                        if not getattr(spec, 'failed', False)])
+        route_keys, route_specs = list(), list()
+        for route in routes:
+            spec = current.get(repr(route))
+            if not spec:
+                spec = self._prepare_route(route)
+                if not spec:
+                    continue
+                if (not isinstance(spec, LazyURLSpec) and
+                        not spec.handler_class):
+                    LOGGER.error('Keeping the current routes, could not '
+                                 'import the handler for %r', route)
+                    return False
+            route_keys.append(repr(route))
+            route_specs.append(spec)
+
+        # Replace the configured routes, leaving any other specs in place
+        specs = [spec for spec in self._host_specs(HOST_PATTERN)
+                 if spec not in self._route_specs] + route_specs
+        named_handlers = dict([(name, spec) for name, spec
+                               in self.named_handlers.items()
+                               if spec not in self._route_specs])
+        for spec in route_specs:
+            if spec.name:
+                named_handlers[spec.name] = spec
+        handlers = [(regex, specs if regex.pattern == HOST_PATTERN else value)
+                    for regex, value in self.handlers]
+        self.handlers, self.named_handlers = handlers, named_handlers
+        self._route_indexes = dict()
+        LOGGER.info('Reloaded routes, %i added and %i removed',
+                    len([spec for spec in route_specs
+                         if spec not in self._route_specs]),
+                    len([spec for spec in self._route_specs
+                         if spec not in route_specs]))
+        self._route_specs = route_specs
+        self._routes = route_keys
+        return True
+
+    def _reload_settings(self, settings):
+        """Apply the Application settings that have changed since they were
+        last loaded. Settings that are only used when the application is
+        created are logged and applied by the next restart.
+
+        :param dict settings: The new Application configuration
+
+        """
+        for key in set(settings) | set(self._loaded_config):
+            value = settings.get(key)
+            if value == self._loaded_config.get(key):
+                continue
+            if key in RESTART_SETTINGS:
+                LOGGER.warning('Application %s setting change requires a '
+                               'restart', key)
+                continue
+            LOGGER.debug('Changing Application %s setting', key)
+            if key == config.ADMISSION:
+                self._admission = value or dict()
+            elif key == config.JSON_BACKEND:
+                try:
+                    self.json_codec = jsoncodec.codec(value)
+                except ValueError as error:
+                    LOGGER.error('Not changing the JSON backend: %s', error)
+                    continue
+            if key in settings:
+                self.settings[key] = copy.deepcopy(value)
+            else:
+                self.settings.pop(key, None)
+        self._loaded_config = copy.deepcopy(settings)
+
+    def _prepare_access_log(self):
+        """Start the asynchronous access log if it is configured."""
+        settings = self._config.get(config.ACCESS_LOG)
+        if not settings:
+            return
+        if not isinstance(settings, dict):
+            settings = dict()
+        self.access_log = accesslog.AccessLog(
+            settings.get(config.BATCH_SIZE, accesslog.DEFAULT_BATCH_SIZE),
+            settings.get(config.FLUSH_INTERVAL,
+                         accesslog.DEFAULT_FLUSH_INTERVAL),
+            settings.get(config.MAX_QUEUE, accesslog.DEFAULT_MAX_QUEUE),
+            settings.get(config.SAMPLE_RATE, accesslog.DEFAULT_SAMPLE_RATE),
+            settings.get(config.SLOW_THRESHOLD,
+                         accesslog.DEFAULT_SLOW_THRESHOLD))
+
+    def _precompile_templates(self):
+        """Compile the templates when the worker starts if precompile_templates
+        is enabled, keeping any errors in template_errors.
+
+        """
+        if (self.settings.get(config.PRECOMPILE_TEMPLATES) and
+                TEMPLATE_PATH in self.settings):
+            self.template_errors = \
+                precompile_templates(self.settings[TEMPLATE_PATH],
+                                     self.settings)
+
     def _prepare_paths(self):
         """Set the value of {{base}} in paths if the base path is set in the
         configuration.
@@ -138,10 +884,12 @@ class Application(web.Application):
 
     def _prepare_route(self, attrs):
         """Take a given inbound list for a route and parse it creating the
-        route and importing the class it belongs to.
+        URL spec for the route and importing the class it belongs to. When
+        lazy_routes is enabled, the class is imported when the route is first
+        requested instead.
 
         :param list attrs: Route attributes
-        :rtype: list
+        :rtype: tornado.web.URLSpec
 
         """
         if type(attrs) not in (list, tuple):
@@ -164,23 +912,19 @@ class Application(web.Application):
                 kwargs = attrs[2]
 
         LOGGER.debug('Initializing route: %s with %s', route, classpath)
+        if self._lazy_routes:
+            return LazyURLSpec(route, classpath, kwargs,
+                               resolver=self._handler_class)
         try:
-            handler = self._import_class(classpath)
+            handler = self._handler_class(classpath)
         except ImportError as error:
             LOGGER.error('Class import error for %s: %r', classpath, error)
             return None
-
-        # Setup the prepared route, adding kwargs if there are any
-        prepared_route = [route, handler]
-        if kwargs:
-            prepared_route.append(kwargs)
-
-        # Return the prepared route as a tuple
-        return tuple(prepared_route)
+        return web.URLSpec(route, handler, kwargs)
 
     def _prepare_routes(self, routes):
         """Prepare the routes by iterating through the list of tuples & calling
-        prepare route on them.
+        prepare route on them, returning the list of URL specs.
 
         :param routes: Routes to prepare
         :type routes: list
@@ -198,12 +942,42 @@ class Application(web.Application):
                 prepared_routes.append(route)
         return prepared_routes
 
+    def _prepare_route_limits(self):
+        """Map the per-route class concurrency limits in the admission
+        configuration to the handler classes of the prepared routes.
+
+        """
+        limits = self._admission.get(config.ROUTE_LIMITS) or dict()
+        route_limits = dict()
+        for host_unused, specs in self.handlers:
+            for spec in specs:
+                if isinstance(spec, LazyURLSpec):
+                    class_path = spec.class_path
+                elif spec.handler_class:
+                    class_path = '%s.%s' % (spec.handler_class.__module__,
+                                            spec.handler_class.__name__)
+                else:
+                    continue
+                if class_path in limits and spec.handler_class:
+                    LOGGER.debug('Limiting %s to %i requests in flight',
+                                 class_path, limits[class_path])
+                    route_limits[spec.handler_class] = limits[class_path]
+                    self._route_in_flight.setdefault(spec.handler_class, 0)
+        self._route_limits = route_limits
+
     def _prepare_static_path(self):
         LOGGER.info('%s in %r: %s', config.STATIC, self.paths,
                     config.STATIC in self.paths)
         if config.STATIC in self.paths:
             LOGGER.info('Setting static path to %s', self.paths[config.STATIC])
             self._config[STATIC_PATH] = self.paths[config.STATIC]
+            handler_class = self._config.setdefault(STATIC_HANDLER_CLASS,
+                                                    static.StaticFileHandler)
+            if issubclass(handler_class, static.StaticFileHandler):
+                kwargs = dict(self._config.get(STATIC_HANDLER_ARGS) or {})
+                for key in ['default_filename', 'path']:
+                    kwargs.pop(key, None)
+                handler_class.index(self._config[STATIC_PATH], **kwargs)
 
     def _prepare_template_path(self):
         LOGGER.info('%s in %r: %s', config.TEMPLATES, self.paths,
@@ -214,9 +988,24 @@ class Application(web.Application):
             self._config[TEMPLATE_PATH] = self.paths[config.TEMPLATES]
 
     def _prepare_transforms(self):
-        """Prepare the list of transforming objects"""
-        for offset, value in enumerate(self._config.get(config.TRANSFORMS, [])):
-            self._config[config.TRANSFORMS][offset] = self._import_class(value)
+        """Prepare the list of transforming objects. Transforms configured
+        with keyword arguments are bound to them and since the configured
+        transforms replace tornado's defaults, chunked transfer encoding is
+        added after them when tornado provides it as a transform.
+
+        """
+        if not self._config.get(config.TRANSFORMS):
+            return
+        for offset, value in enumerate(self._config[config.TRANSFORMS]):
+            transform = self._import_class(transform_class_path(value))
+            if isinstance(value, dict) and transform:
+                kwargs = dict([(key, option) for key, option in value.items()
+                               if key != config.NAME])
+                transform = functools.partial(transform, **kwargs)
+            self._config[config.TRANSFORMS][offset] = transform
+        chunked = getattr(web, 'ChunkedTransferEncoding', None)
+        if chunked and chunked not in self._config[config.TRANSFORMS]:
+            self._config[config.TRANSFORMS].append(chunked)
 
     def _prepare_translations(self):
         """Load in translations if they are set, and add the default locale as
@@ -224,11 +1013,9 @@ class Application(web.Application):
 
         """
         if config.TRANSLATIONS in self.paths:
-            LOGGER.info('Loading translations from %s',
-                        self.paths[config.TRANSLATIONS])
-            from tornado import locale
-            locale.load_translations(self.paths[config.TRANSLATIONS])
+            load_translations(self.paths[config.TRANSLATIONS])
             if config.DEFAULT_LOCALE in self._config:
+                from tornado import locale
                 LOGGER.info('Setting default locale to %s',
                             self._config[config.DEFAULT_LOCALE])
                 locale.set_default_locale(self._config[config.DEFAULT_LOCALE])
@@ -245,25 +1032,218 @@ class Application(web.Application):
             self._config[config.VERSION] = __version__
 
 
+class LazyURLSpec(web.URLSpec):
+    """A URLSpec that imports its handler class the first time the route is
+    requested instead of when the application is created, caching it for
+    the requests that follow.
+
+    """
+    def __init__(self, pattern, class_path, kwargs=None, name=None,
+                 resolver=utils.import_namespaced_class):
+        """Create the URL spec for the route.
+
+        :param str pattern: The URL pattern
+        :param str class_path: The full path to the handler class
+        :param dict kwargs: The handler initialize keyword arguments
+        :param str name: The optional route name
+        :param method resolver: Returns the class for a class path
+
+        """
+        self.class_path = class_path
+        self.failed = False
+        self._class = None
+        self._resolved = False
+        self._resolver = resolver
+        super(LazyURLSpec, self).__init__(pattern, None, kwargs, name)
+
+    def __repr__(self):
+        return '%s(%r, %s, kwargs=%r, name=%r)' % \
+            (self.__class__.__name__, self.regex.pattern, self.class_path,
+             self.kwargs, self.name)
+
+    @property
+    def handler_class(self):
+        """Return the handler class, importing it the first time it is used.
+        Returns None if the class could not be imported, without trying to
+        import it again, so requests for the route get a 500 response.
+
+        :rtype: class|None
+
+        """
+        if not self._resolved:
+            self._class = self._resolver(self.class_path)
+            self._resolved = True
+            self.failed = self._class is None
+        return self._class
+
+    @handler_class.setter
+    def handler_class(self, value):
+        """Set the handler class, ignoring the None assigned by URLSpec.
+
+        :param class value: The handler class
+
+        """
+        if value is not None:
+            self._class = value
+            self._resolved = True
+
+
+class RequestDispatcher(getattr(httputil, 'HTTPMessageDelegate', object)):
+    """Receives the requests the HTTPServer reads with Tornado 4.0 and later,
+    which does not call the Application, and dispatches them to the handler
+    for their route the same way Application.__call__ does with earlier
+    versions. The route is found once the request headers are received.
+
+    """
+    def __init__(self, application, connection):
+        """Create the delegate for a request read from the connection.
+
+        :param tinman.application.Application application: The application
+        :param tornado.httputil.HTTPConnection connection: The connection
+
+        """
+        self.application = application
+        self.connection = connection
+        self.chunks = list()
+        self.handler = None
+        self.request = None
+        self.route = None
+        self.stream_request_body = False
+
+    def headers_received(self, start_line, headers):
+        """Find the route for the request once its headers are received,
+        executing the handler right away if it streams the request body.
+
+        :param tornado.httputil.RequestStartLine start_line: The request line
+        :param tornado.httputil.HTTPHeaders headers: The request headers
+        :rtype: tornado.concurrent.Future|None
+
+        """
+        self.set_request(httputil.HTTPServerRequest(
+            connection=self.connection, start_line=start_line,
+            headers=headers))
+        if self.stream_request_body:
+            self.request.body = concurrent.Future()
+            return self.execute()
+
+    def set_request(self, request):
+        """Set the request and find the route to dispatch it to.
+
+        :param tornado.httputil.HTTPServerRequest request: The request
+
+        """
+        self.request = request
+        self.route = self.application._find_handler(request)
+        self.stream_request_body = getattr(self.route.handler_class,
+                                           '_stream_request_body', False)
+
+    def data_received(self, chunk):
+        """Pass a chunk of the request body to the handler if it streams the
+        request body, otherwise buffer it.
+
+        :param bytes chunk: The chunk of the request body
+        :rtype: tornado.concurrent.Future|None
+
+        """
+        if self.stream_request_body:
+            return self.handler.data_received(chunk)
+        self.chunks.append(chunk)
+
+    def finish(self):
+        """Execute the handler once the request body has been received."""
+        if self.stream_request_body:
+            self.request.body.set_result(None)
+        else:
+            self.request.body = b''.join(self.chunks)
+            self.request._parse_body()
+            self.execute()
+
+    def on_connection_close(self):
+        """Let a handler that streams the request body know the connection
+        was closed before the request was received, or stop counting the
+        request as in flight if its handler was not created.
+
+        """
+        if self.stream_request_body:
+            self.handler.on_connection_close()
+        else:
+            self.chunks = None
+        if not self.handler and self.route:
+            self.application._release(self.route)
+            self.route = None
+
+    def execute(self):
+        """Create and execute the handler for the request. When the request
+        body is streamed, returns the Future that is resolved once the
+        handler is prepared to receive it.
+
+        :rtype: tornado.concurrent.Future|None
+
+        """
+        self.application._reset_caches()
+        self.handler = self.application._create_handler(self.request,
+                                                        self.route)
+        transforms = [t(self.request) for t in self.application.transforms]
+        if self.stream_request_body:
+            self.handler._prepared_future = concurrent.Future()
+        self.handler._execute(transforms, *self.route.path_args,
+                              **self.route.path_kwargs)
+        return self.handler._prepared_future
+
+
+class ServiceUnavailableHandler(web.RequestHandler):
+    """Sheds requests that were not admitted, responding with a 503 and a
+    Retry-After header without invoking the handler for the route.
+
+    """
+    def initialize(self, retry_after=DEFAULT_RETRY_AFTER):
+        self.retry_after = retry_after
+
+    def check_xsrf_cookie(self):
+        """Shed requests are never processed so the XSRF cookie is not
+        checked.
+
+        """
+        pass
+
+    def prepare(self):
+        self.set_status(503)
+        self.set_header('Retry-After', str(self.retry_after))
+        self.finish()
+
+
 class Attributes(object):
     """A base object to hang attributes off of for application level scope that
     can be used across connections.
 
+    Shared resources such as clients and connection pools may be registered
+    with a factory that creates them the first time they are used, once per
+    worker process. Resources that were created are closed in the reverse
+    order they were created in when the application is closed.
+
     """
     ATTRIBUTES = '_attributes'
+    CLOSED = '_closed'
+    CREATED = '_created'
+    FACTORIES = '_factories'
 
     def __init__(self):
         """Create a new instance of the Attributes class"""
+        self.__dict__[self.CLOSED] = False
+        self.__dict__[self.CREATED] = list()
+        self.__dict__[self.FACTORIES] = dict()
         self._attributes = dict()
 
     def __contains__(self, item):
-        """Check to see if an attribute is set on the object.
+        """Check to see if an attribute is set on the object or a factory is
+        registered for it.
 
         :param str item: The attribute name
         :rtype: bool
 
         """
-        return item in self.__dict__[self.ATTRIBUTES].keys()
+        return (item in self.__dict__[self.ATTRIBUTES] or
+                item in self.__dict__[self.FACTORIES])
 
     def __delattr__(self, item):
         """Delete an attribute from the object.
@@ -274,12 +1254,17 @@ class Attributes(object):
         """
         if item == self.ATTRIBUTES:
             raise AttributeError('Can not delete %s', item)
-        if item not in self.__dict__[self.ATTRIBUTES]:
+        if item not in self:
             raise AttributeError('%s is not set' % item)
-        del self.__dict__[self.ATTRIBUTES][item]
+        self.__dict__[self.ATTRIBUTES].pop(item, None)
+        self.__dict__[self.FACTORIES].pop(item, None)
+        if item in self.__dict__[self.CREATED]:
+            self.__dict__[self.CREATED].remove(item)
 
     def __getattr__(self, item):
-        """Get an attribute from the class.
+        """Get an attribute from the class, creating it with its registered
+        factory if it has not been created yet. Resources are not created once
+        the attributes are closed.
 
         :param str item: The attribute name
         :rtype: any
@@ -287,7 +1272,13 @@ class Attributes(object):
         """
         if item == self.ATTRIBUTES:
             return self.__dict__[item]
-        return self.__dict__[self.ATTRIBUTES].get(item)
+        attributes = self.__dict__[self.ATTRIBUTES]
+        if (item not in attributes and not self.__dict__[self.CLOSED] and
+                item in self.__dict__[self.FACTORIES]):
+            LOGGER.debug('Creating %s', item)
+            attributes[item] = self.__dict__[self.FACTORIES][item][0]()
+            self.__dict__[self.CREATED].append(item)
+        return attributes.get(item)
 
     def __iter__(self):
         """Iterate through the keys in the data dictionary.
@@ -334,10 +1325,55 @@ class Attributes(object):
         :raises: AttributeError
 
         """
-        if item in self.__dict__[self.ATTRIBUTES].keys():
+        if item in self:
             raise AttributeError('%s already exists' % item)
         setattr(self, item, value)
 
+    def close(self):
+        """Close the resources that were created by their registered
+        factories, in the reverse order they were created in, so resources
+        are closed before the resources they were created from. Errors are
+        logged and do not stop the remaining resources from being closed.
+
+        """
+        self.__dict__[self.CLOSED] = True
+        created = self.__dict__[self.CREATED]
+        while created:
+            item = created.pop()
+            value = self.__dict__[self.ATTRIBUTES].pop(item, None)
+            close = self.__dict__[self.FACTORIES][item][1]
+            if value is None or not close:
+                continue
+            LOGGER.debug('Closing %s', item)
+            try:
+                close(value)
+            except Exception as error:
+                LOGGER.exception('Error closing %s: %s', item, error)
+
+    def created(self, item):
+        """Returns True if the resource registered for the attribute has been
+        created.
+
+        :param str item: Application attribute name
+        :rtype: bool
+
+        """
+        return item in self.__dict__[self.CREATED]
+
+    def register(self, item, factory, close=None):
+        """Register a factory that creates the value of the attribute the
+        first time it is used.
+
+        :param str item: Application attribute name
+        :param method factory: Returns the value of the attribute
+        :param method close: Invoked with the value to close it
+        :raises: AttributeError
+
+        """
+        if item in self:
+            raise AttributeError('%s already exists' % item)
+        self.__dict__[self.FACTORIES][item] = factory, close
+
     def remove(self, item):
         """Remove an attribute value to our object instance.
 
@@ -345,10 +1381,21 @@ class Attributes(object):
         :raises: AttributeError
 
         """
-        if item not in self.__dict__[self.ATTRIBUTES].keys():
+        if item not in self:
             raise AttributeError('%s does not exist' % item)
         delattr(self, item)
 
+    def reset(self, item):
+        """Discard the resource created for the attribute without closing it,
+        so its registered factory creates a new one the next time it is used.
+
+        :param str item: Application attribute name
+
+        """
+        if item in self.__dict__[self.CREATED]:
+            self.__dict__[self.CREATED].remove(item)
+            self.__dict__[self.ATTRIBUTES].pop(item, None)
+
     def set(self, item, value):
         """Set an attribute value to our object instance.
 
@@ -8,36 +8,80 @@ HTTP_SERVER = 'HTTPServer'
 LOGGING = 'Logging'
 ROUTES = 'Routes'
 
+ACCESS_LOG = 'access_log'
 ADAPTER = 'adapter'
+ADDRESS = 'address'
+ADMISSION = 'admission'
 AUTOMATIC = 'automatic'
+BACKLOG = 'backlog'
 BASE = 'base'
 BASE_VARIABLE = '{{base}}'
+BATCH_SIZE = 'batch_size'
+BODY_TIMEOUT = 'body_timeout'
 CERT_REQS = 'cert_reqs'
+CHUNK_SIZE = 'chunk_size'
+CRASH_WINDOW = 'crash_window'
+DB = 'db'
 DEBUG = 'debug'
+DECOMPRESS_REQUEST = 'decompress_request'
 DEFAULT_LOCALE = 'default_locale'
-DB = 'db'
+DELAY = 'delay'
 DIRECTORY = 'directory'
+DRAIN_TIMEOUT = 'drain_timeout'
 DURATION = 'duration'
+FAMILY = 'family'
 FILE = 'file'
+FLUSH_INTERVAL = 'flush_interval'
 HOST = 'host'
+IDLE_CONNECTION_TIMEOUT = 'idle_connection_timeout'
+INTERVAL = 'interval'
+IOLOOP = 'ioloop'
+JSON_BACKEND = 'json_backend'
+LAZY_ROUTES = 'lazy_routes'
 LOG_FUNCTION = 'log_function'
+MAX_BODY_SIZE = 'max_body_size'
+MAX_BUFFER_SIZE = 'max_buffer_size'
+MAX_CRASHES = 'max_crashes'
+MAX_DELAY = 'max_delay'
+MAX_HEADER_SIZE = 'max_header_size'
+MAX_IN_FLIGHT = 'max_in_flight'
+MAX_QUEUE = 'max_queue'
+MAX_REQUESTS = 'max_requests'
+MAX_RSS_MB = 'max_rss_mb'
+MODE = 'mode'
 NAME = 'name'
 NEWRELIC = 'newrelic_ini'
-NO_KEEP_ALIVE = 'no_keep_alive'
 NONE = 'none'
+NO_KEEP_ALIVE = 'no_keep_alive'
 OPTIONAL = 'optional'
-PROCESSES = 'processes'
+PATH = 'path'
 PATHS = 'paths'
 PORT = 'port'
 PORTS = 'ports'
+PRECOMPILE_TEMPLATES = 'precompile_templates'
+PRELOAD = 'preload'
+PROCESSES = 'processes'
+PROTOCOL = 'protocol'
 RABBITMQ = 'rabbitmq'
+READY_TIMEOUT = 'ready_timeout'
 REDIS = 'redis'
 REQUIRED = 'required'
+RESPAWN = 'respawn'
+RETRY_AFTER = 'retry_after'
+REUSE_PORT = 'reuse_port'
+ROUTE_LIMITS = 'route_limits'
+SAMPLE_RATE = 'sample_rate'
+SLOW_THRESHOLD = 'slow_threshold'
 SSL_OPTIONS = 'ssl_options'
+STACKS = 'stacks'
 STATIC = 'static'
 TEMPLATES = 'templates'
+THRESHOLD = 'threshold'
 TRANSFORMS = 'transforms'
 TRANSLATIONS = 'translations'
 UI_MODULES = 'ui_modules'
+UNIX_SOCKET = 'unix_socket'
 VERSION = 'version'
+WATCHDOG = 'watchdog'
+WORKERS = 'workers'
 XHEADERS = 'xheaders'
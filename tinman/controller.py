@@ -1,12 +1,12 @@
 """The Tinman Controller class, uses clihelper for most of the main
-functionality with regard to configuration, logging and daemoniaztion. Spawns a
-tornado.HTTPServer and Application per port using multiprocessing.
+functionality with regard to configuration, logging and daemoniaztion. Binds
+the listening socket for each port once and spawns a pool of worker processes,
+each with a tornado.HTTPServer and Application, that accept on it.
 
 """
 import helper
 import logging
 from helper import parser
-import multiprocessing
 import os
 import signal
 import sys
@@ -16,8 +16,13 @@ from tornado import version as tornado_version
 # Tinman Imports
 from tinman import __desc__
 from tinman import __version__
+from tinman import application
 from tinman import config
+from tinman import eventloop
 from tinman import process
+from tinman import snapshot
+from tinman import sockets
+from tinman import stats
 
 LOGGER = logging.getLogger(__name__)
 
@@ -28,10 +33,30 @@ class Controller(helper.Controller):
 
     """
     APPNAME = 'Tinman'
+    CRASH_WINDOW = 60
     DEFAULT_PORTS = [8900]
-    MAX_SHUTDOWN_WAIT = 4
+    DEFAULT_WORKERS = 1
+    DRAIN_TIMEOUT = 10
+    KILL_GRACE = 2
+    MAX_CRASHES = 10
+    MAX_RESPAWN_DELAY = 60
+    MIN_WAKE_INTERVAL = 0.1
+    READY_TIMEOUT = 30
+    RESPAWN_DELAY = 1
     VERSION = __version__
 
+    def check_children(self):
+        """Remove any children that have exited, scheduling the respawn of
+        crashed workers and starting any whose backoff delay has passed.
+
+        """
+        for child in [child for child in self.children
+                      if not child.is_alive()]:
+            if child in self.children:
+                self.children.remove(child)
+                self.on_child_exit(child)
+        self.respawn_children()
+
     def enable_debug(self):
         """If the cli arg for foreground is set, set the configuration option
         for debug.
@@ -52,6 +77,15 @@ class Controller(helper.Controller):
             if hasattr(self.config.application.paths, config.BASE):
                 sys.path.insert(0, self.config.application.paths.base)
 
+    @property
+    def is_shutting_down(self):
+        """Returns True once the controller has been asked to stop.
+
+        :rtype: bool
+
+        """
+        return self.is_waiting_to_stop or self.is_stopping or self.is_stopped
+
     @property
     def living_children(self):
         """Returns a list of all child processes that are still alive.
@@ -62,18 +96,172 @@ class Controller(helper.Controller):
         return [child for child in self.children if child.is_alive()]
 
     def configuration_reloaded(self):
-        """Send a SIGHUP to child processes"""
-        LOGGER.info('Notifying children of new configuration updates')
+        """Write the new configuration snapshot to the snapshot file and
+        then send the child processes a SIGHUP so they read and apply it.
+
+        """
+        self.snapshot = self.new_snapshot(self.snapshot.version + 1)
+        LOGGER.info('Notifying children of new configuration updates (v%i)',
+                    self.snapshot.version)
+        snapshot.write(self.snapshot_path, self.snapshot)
         self.signal_children(signal.SIGHUP)
 
+    def new_snapshot(self, version=1):
+        """Return a new snapshot of the current configuration to pass to child
+        processes.
+
+        :param int version: The snapshot version
+        :rtype: tinman.snapshot.Snapshot
+
+        """
+        return snapshot.create(version, self.args, self.config.application,
+                               self.debug, self.config.logging,
+                               self.config.get(config.ROUTES),
+                               self.config.get(config.HTTP_SERVER))
+
+    def on_child_exit(self, child):
+        """Invoked when a child process has exited. Unless the controller is
+        shutting down or the child exited cleanly, a respawn is scheduled for
+        the same port and worker number. The respawn delay doubles with each
+        crash in the crash window and once the crash limit is exceeded,
+        respawns are throttled to the maximum delay.
+
+        :param tinman.process.Process child: The child that exited
+
+        """
+        self.exits[child.port] = self.exits.get(child.port, 0) + 1
+        self.stats.add_exit(self.stats.slot(child.port, child.worker))
+        if child in self.retiring:
+            self.retiring.remove(child)
+            LOGGER.info('%s (%s) retired', child.name, child.pid)
+            return
+        if self.is_shutting_down:
+            return
+        if not child.exitcode:
+            LOGGER.info('%s (%s) exited cleanly, not respawning',
+                        child.name, child.pid)
+            return
+        LOGGER.warning('%s (%s) exited with code %s',
+                       child.name, child.pid, child.exitcode)
+
+        now = time.time()
+        slot = (child.port, child.worker)
+        window = self.respawn_config.get(config.CRASH_WINDOW,
+                                         self.CRASH_WINDOW)
+        crashes = [value for value in self.crashes.get(slot, [])
+                   if value > now - window]
+        crashes.append(now)
+        self.crashes[slot] = crashes
+
+        max_delay = self.respawn_config.get(config.MAX_DELAY,
+                                            self.MAX_RESPAWN_DELAY)
+        if len(crashes) > self.respawn_config.get(config.MAX_CRASHES,
+                                                  self.MAX_CRASHES):
+            LOGGER.critical('%s crashed %i times in %i seconds, throttling '
+                            'respawns to every %i seconds', child.name,
+                            len(crashes), window, max_delay)
+            self.crash_limited[child.port] = \
+                self.crash_limited.get(child.port, 0) + 1
+            delay = max_delay
+        else:
+            delay = min(self.respawn_config.get(config.DELAY,
+                                                self.RESPAWN_DELAY) *
+                        2 ** (len(crashes) - 1), max_delay)
+        LOGGER.info('Respawning %s in %.2f seconds', child.name, delay)
+        self.pending_respawns[slot] = now + delay
+
+    def on_sigchld(self, signum_unused, frame_unused):
+        """Called when a child process exits, respawning it or scheduling the
+        next wake up for when its respawn delay has passed.
+
+        :param int signum_unused: Unused signal number
+        :param frame frame_unused: Unused frame the signal was caught in
+
+        """
+        if self.is_shutting_down:
+            return
+        self.check_children()
+        if self.pending_respawns and self.is_sleeping:
+            signal.setitimer(signal.ITIMER_REAL, self.wake_interval, 0)
+
+    def on_sigusr1(self, signum_unused, frame_unused):
+        """Called when SIGUSR1 is received from a child that has asked to be
+        recycled, waking the controller so the child is replaced by process
+        instead of in the signal handler.
+
+        :param int signum_unused: Unused signal number
+        :param frame frame_unused: Unused frame the signal was caught in
+
+        """
+        LOGGER.debug('Received SIGUSR1')
+        self.wake()
+
+    def on_sigusr2(self, signum_unused, frame_unused):
+        """Called when SIGUSR2 is received, requesting a rolling restart of
+        the child processes and waking the controller so process performs it
+        instead of the signal handler.
+
+        :param int signum_unused: Unused signal number
+        :param frame frame_unused: Unused frame the signal was caught in
+
+        """
+        LOGGER.info('Received SIGUSR2')
+        if self.restarting:
+            LOGGER.warning('Rolling restart or recycle in progress, the '
+                           'rolling restart will start when it is done')
+        self.restart_requested = True
+        self.wake()
+
     def process(self):
         """Check up on child processes and make sure everything is running as
-        it should be.
+        it should be, respawning any that have died, performing a requested
+        rolling restart and replacing the children that asked to be recycled.
 
         """
+        self.check_children()
+        if not self.restarting:
+            self.restarting = True
+            try:
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self.rolling_restart()
+                self.recycle_children()
+            finally:
+                self.restarting = False
         children = len(self.living_children)
         LOGGER.debug('%i active child%s',
                      children, '' if children == 1 else 'ren')
+        if self.exits:
+            LOGGER.info('Worker stats: %r', self.worker_stats)
+        LOGGER.debug('Fleet request stats: %r', self.stats.as_dict()['workers'])
+
+    @property
+    def ready_timeout(self):
+        """Return how long to wait for a new child to report it is ready.
+
+        :rtype: int
+
+        """
+        return self.server_config.get(config.READY_TIMEOUT, self.READY_TIMEOUT)
+
+    def respawn_children(self):
+        """Start the children whose respawn delay has passed."""
+        now = time.time()
+        for slot, due in list(self.pending_respawns.items()):
+            if due <= now:
+                del self.pending_respawns[slot]
+                self.start_child(*slot)
+                self.respawns[slot[0]] = self.respawns.get(slot[0], 0) + 1
+                self.stats.add_respawn(self.stats.slot(*slot))
+
+    @property
+    def respawn_config(self):
+        """Return the respawn section of the HTTPServer configuration.
+
+        :rtype: dict
+
+        """
+        return self.server_config.get(config.RESPAWN) or dict()
 
     @property
     def ports_to_spawn(self):
@@ -82,8 +270,123 @@ class Controller(helper.Controller):
         :rtype: list
 
         """
-        return (self.config.get(config.HTTP_SERVER, dict()).get(config.PORTS)
-                or self.DEFAULT_PORTS)
+        return [settings[config.PORT] for settings in self.port_entries]
+
+    def port_settings(self, value):
+        """Return the settings for a port entry in the HTTPServer ports list.
+        An entry may either be a port number or a mapping that includes the
+        port and any per-port overrides such as the number of workers.
+
+        :param int|dict value: The port entry
+        :rtype: dict
+
+        """
+        if isinstance(value, int):
+            value = {config.PORT: value}
+        settings = dict(value)
+        settings.setdefault(config.WORKERS,
+                            self.server_config.get(config.WORKERS) or
+                            self.DEFAULT_WORKERS)
+        settings.setdefault(config.REUSE_PORT,
+                            self.server_config.get(config.REUSE_PORT, False))
+        settings.setdefault(config.BACKLOG,
+                            self.server_config.get(config.BACKLOG,
+                                                   sockets.DEFAULT_BACKLOG))
+        for key in [config.ADDRESS, config.FAMILY, config.IOLOOP,
+                    config.UNIX_SOCKET]:
+            settings.setdefault(key, self.server_config.get(key))
+        return settings
+
+    @property
+    def port_entries(self):
+        """Return the normalized settings for each port to spawn workers for.
+
+        :rtype: list
+
+        """
+        return [self.port_settings(value)
+                for value in self.server_config.get(config.PORTS) or
+                self.DEFAULT_PORTS]
+
+    @property
+    def server_config(self):
+        """Return the HTTPServer section of the configuration.
+
+        :rtype: dict
+
+        """
+        return self.config.get(config.HTTP_SERVER) or dict()
+
+    def retire_child(self, child):
+        """Stop the child process, waiting for it to exit before returning and
+        killing it if it does not exit in time.
+
+        :param tinman.process.Process child: The child to retire
+
+        """
+        LOGGER.info('Retiring %s (%s)', child.name, child.pid)
+        self.retiring.add(child)
+        if child.is_alive():
+            os.kill(child.pid, signal.SIGABRT)
+        self.wait_for_exit([child])
+        self.check_children()
+
+    def rolling_restart(self):
+        """Replace each child process with a new one, one at a time. The new
+        child is started on the same listening sockets and once it reports
+        that it is ready, the child it replaces is retired so capacity never
+        drops to zero. The configuration is reloaded first so the new
+        children start with the current configuration. The restart is
+        aborted if the controller is asked to stop while it is in progress.
+
+        """
+        if self.config.reload():
+            LOGGER.info('Configuration reloaded for rolling restart')
+            self.snapshot = self.new_snapshot(self.snapshot.version + 1)
+        children = self.living_children
+        LOGGER.info('Starting rolling restart of %i children', len(children))
+        for child in children:
+            if self.is_shutting_down:
+                LOGGER.warning('Shutting down, aborting rolling restart')
+                return
+            if not self.replace_child(child):
+                LOGGER.error('Aborting rolling restart')
+                return
+        LOGGER.info('Rolling restart complete')
+
+    def recycle_children(self):
+        """Replace any children that have asked to be recycled after crossing
+        their request count or memory limits. Invoked by process, which
+        blocks while each replacement starts.
+
+        """
+        for child in self.living_children:
+            if self.is_shutting_down:
+                return
+            if child.recycle.is_set() and child not in self.retiring:
+                LOGGER.info('Recycling %s (%s)', child.name, child.pid)
+                self.replace_child(child)
+
+    def replace_child(self, child):
+        """Start a replacement for the child on the same listening sockets and
+        once it reports that it is ready, retire the child. Returns False if
+        the replacement did not become ready or the controller was asked to
+        stop while it was starting, leaving the child running.
+
+        :param tinman.process.Process child: The child to replace
+        :rtype: bool
+
+        """
+        replacement = self.start_child(child.port, child.worker)
+        if not self.wait_until_ready(replacement):
+            if not self.is_shutting_down:
+                LOGGER.error('%s did not report ready in %i seconds',
+                             replacement.name, self.ready_timeout)
+            return False
+        if self.is_shutting_down:
+            return False
+        self.retire_child(child)
+        return True
 
     def set_base_path(self, value):
         """Munge in the base path into the configuration values
@@ -106,30 +409,74 @@ class Controller(helper.Controller):
         self.set_base_path(os.getcwd())
         self.insert_paths()
 
+        # Make sure the event loop backend is available before spawning
+        for settings in self.port_entries:
+            eventloop.check(settings[config.IOLOOP])
+
         # Setup child processes
         self.children = list()
-        self.manager = multiprocessing.Manager()
-        self.namespace = self.manager.Namespace()
-        self.namespace.args = self.args
-        self.namespace.config = dict(self.config.application)
-        self.namespace.logging = self.config.logging
-        self.namespace.debug = self.debug
-        self.namespace.routes = self.config.get(config.ROUTES)
-        self.namespace.server = self.config.get(config.HTTP_SERVER)
+        self.crash_limited = dict()
+        self.crashes = dict()
+        self.exits = dict()
+        self.pending_respawns = dict()
+        self.respawns = dict()
+        self.restart_requested = False
+        self.restarting = False
+        self.retiring = set()
+        self.sockets = dict()
+        self.unix_sockets = dict()
+        self.snapshot = self.new_snapshot()
+        self.snapshot_path = snapshot.create_file()
+        self.stats = stats.Stats(self.snapshot.routes, self.worker_slots)
+        if self.server_config.get(config.PRELOAD):
+            application.preload(self.snapshot.config, self.snapshot.routes)
+        self.bind_sockets()
+        signal.signal(signal.SIGCHLD, self.on_sigchld)
         self.spawn_processes()
 
+    def bind_sockets(self):
+        """Bind the listening sockets for each port in the parent so they are
+        inherited by and shared across all of the workers for the port. Ports
+        that are configured to use SO_REUSEPORT or a Unix socket per worker
+        are bound by each worker.
+
+        """
+        for settings in self.port_entries:
+            port = settings[config.PORT]
+            unix_socket = settings[config.UNIX_SOCKET]
+            if unix_socket:
+                if sockets.is_per_worker(unix_socket[config.PATH]):
+                    continue
+                path = sockets.unix_path(unix_socket[config.PATH], port)
+                LOGGER.info('Binding listening socket for port %i to %s',
+                            port, path)
+                self.sockets[port] = sockets.bind_unix(
+                    path, unix_socket.get(config.MODE, sockets.DEFAULT_MODE),
+                    settings[config.BACKLOG])
+                self.unix_sockets[port] = path, sockets.inode(path)
+            elif not settings[config.REUSE_PORT]:
+                LOGGER.info('Binding listening socket for port %i', port)
+                self.sockets[port] = sockets.bind(
+                    port, settings[config.ADDRESS],
+                    sockets.family(settings[config.FAMILY]),
+                    settings[config.BACKLOG],
+                    dual_stack=settings[config.FAMILY] == sockets.DUAL_STACK)
+
     def shutdown(self):
-        """Send SIGABRT to child processes to instruct them to stop"""
+        """Send SIGABRT to child processes to instruct them to drain their
+        connections and stop, killing any that have not stopped once the
+        drain timeout has passed.
+
+        """
         self.signal_children(signal.SIGABRT)
+        self.wait_for_exit(self.living_children)
 
-        # Wait a few iterations when trying to stop children before terminating
-        waiting = 0
-        while self.living_children:
-            time.sleep(0.5)
-            waiting += 1
-            if waiting == self.MAX_SHUTDOWN_WAIT:
-                self.signal_children(signal.SIGKILL)
-                break
+        # Close the listening sockets held by the parent
+        for port in list(self.sockets.keys()):
+            sockets.close(self.sockets.pop(port))
+        for port in list(self.unix_sockets.keys()):
+            sockets.remove_unix(*self.unix_sockets.pop(port))
+        snapshot.remove(self.snapshot_path)
 
     def signal_children(self, signum):
         """Send a signal to all children
@@ -142,23 +489,155 @@ class Controller(helper.Controller):
             if child.pid != os.getpid():
                 os.kill(child.pid, signum)
 
-    def spawn_process(self, port):
-        """Create an Application and HTTPServer for the given port.
+    def spawn_process(self, port, worker=0):
+        """Create an Application and HTTPServer for the given port. A process
+        that replaces a living child may take over the child's Unix socket.
 
         :param int port: The port to listen on
+        :param int worker: The worker number for the port
         :rtype: multiprocessing.Process
 
         """
-        return process.Process(name="ServerProcess.%i" % port,
-                               kwargs={'namespace': self.namespace,
-                                       'port': port})
+        replacing = any(child.port == port and child.worker == worker
+                        for child in self.living_children)
+        return process.Process(name="ServerProcess.%i.%i" % (port, worker),
+                               kwargs={'snapshot': self.snapshot,
+                                       'snapshot_path': self.snapshot_path,
+                                       'port': port,
+                                       'replace_socket': replacing,
+                                       'sockets': self.sockets.get(port),
+                                       'stats': self.stats,
+                                       'stats_area': self.stats_area(port,
+                                                                     worker),
+                                       'worker': worker})
 
     def spawn_processes(self):
         """Spawn of the appropriate number of application processes"""
-        for port in self.ports_to_spawn:
-            process = self.spawn_process(port)
-            process.start()
-            self.children.append(process)
+        for settings in self.port_entries:
+            for worker in range(0, int(settings[config.WORKERS])):
+                self.start_child(settings[config.PORT], worker)
+
+    def stats_area(self, port, worker):
+        """Return the area of the worker's slot in the shared request
+        statistics that is not being used by a living child, so a
+        replacement does not record in the same area as the child it is
+        replacing.
+
+        :param int port: The port the worker listens on
+        :param int worker: The worker number for the port
+        :rtype: int
+
+        """
+        used = [child.stats_area for child in self.living_children
+                if child.port == port and child.worker == worker]
+        for area in range(0, stats.AREAS):
+            if area not in used:
+                return area
+        LOGGER.warning('No unused stats area for worker %i on port %i',
+                       worker, port)
+        return 0
+
+    def start_child(self, port, worker=0):
+        """Spawn and start the child process for the port and worker number,
+        zeroing the in flight gauges of the stats area it is assigned.
+
+        :param int port: The port to listen on
+        :param int worker: The worker number for the port
+        :rtype: tinman.process.Process
+
+        """
+        child = self.spawn_process(port, worker)
+        self.stats.reset_in_flight(self.stats.slot(port, worker),
+                                   child.stats_area)
+        child.start()
+        self.children.append(child)
+        return child
+
+    def wait_for_exit(self, children):
+        """Wait for the children to exit after being told to drain and stop,
+        killing any that are still alive once the drain timeout and kill grace
+        period have passed.
+
+        :param list children: The children to wait on
+
+        """
+        deadline = time.time() + self.server_config.get(
+            config.DRAIN_TIMEOUT, self.DRAIN_TIMEOUT) + self.KILL_GRACE
+        while [child for child in children if child.is_alive()]:
+            if time.time() >= deadline:
+                for child in [child for child in children
+                              if child.is_alive()]:
+                    LOGGER.warning('Killing %s (%s)', child.name, child.pid)
+                    os.kill(child.pid, signal.SIGKILL)
+                break
+            time.sleep(0.5)
+
+    def wait_until_ready(self, child):
+        """Wait for the child process to report that it is ready, returning
+        False if it exits, does not report ready before the ready timeout or
+        the controller is asked to stop while waiting.
+
+        :param tinman.process.Process child: The child to wait on
+        :rtype: bool
+
+        """
+        deadline = time.time() + self.ready_timeout
+        while time.time() < deadline:
+            if child.ready.wait(0.5):
+                return True
+            if not child.is_alive() or self.is_shutting_down:
+                return False
+        return False
+
+    def wake(self):
+        """Wake the controller so process is invoked as soon as possible if it
+        is sleeping.
+
+        """
+        if self.is_sleeping:
+            signal.setitimer(signal.ITIMER_REAL, self.MIN_WAKE_INTERVAL, 0)
+
+    @property
+    def wake_interval(self):
+        """Return the wake interval in seconds, shortened so the controller
+        wakes up in time for the next pending respawn.
+
+        :rtype: float
+
+        """
+        interval = super(Controller, self).wake_interval
+        if self.pending_respawns:
+            due = min(self.pending_respawns.values()) - time.time()
+            interval = max(min(interval, due), self.MIN_WAKE_INTERVAL)
+        return interval
+
+    @property
+    def worker_slots(self):
+        """Return the list of (port, worker) tuples for every worker that is
+        configured to be spawned.
+
+        :rtype: list
+
+        """
+        return [(settings[config.PORT], worker)
+                for settings in self.port_entries
+                for worker in range(0, int(settings[config.WORKERS]))]
+
+    @property
+    def worker_stats(self):
+        """Return the per-port counts of worker exits, respawns and respawns
+        that were throttled by the crash limit.
+
+        :rtype: dict
+
+        """
+        return dict([(port, {'exits': self.exits.get(port, 0),
+                             'respawns': self.respawns.get(port, 0),
+                             'crash_limited': self.crash_limited.get(port, 0),
+                             'workers': len([child for child
+                                             in self.living_children
+                                             if child.port == port])})
+                     for port in self.ports_to_spawn])
 
 
 def main():
@@ -0,0 +1,58 @@
+"""
+Event loop backends the worker processes may run their IOLoop on. The default
+backend is tornado's own IOLoop, the asyncio backend runs the IOLoop on an
+asyncio event loop through tornado's asyncio bridge so asyncio libraries can
+be used in request handlers. On Python 2 the asyncio backend requires the
+trollius backport.
+
+"""
+import logging
+from tornado import ioloop
+
+LOGGER = logging.getLogger(__name__)
+
+ASYNCIO = 'asyncio'
+DEFAULT = 'default'
+BACKENDS = [ASYNCIO, DEFAULT]
+
+
+def check(backend=None):
+    """Check that the event loop backend is supported and the packages it
+    requires are installed, so a misconfigured backend is reported when the
+    controller starts instead of by every worker it spawns.
+
+    :param str backend: One of asyncio or default
+    :raises: ValueError
+
+    """
+    backend = backend or DEFAULT
+    if backend not in BACKENDS:
+        raise ValueError('Unsupported event loop backend: %s' % backend)
+    if backend == ASYNCIO:
+        try:
+            from tornado.platform import asyncio as tornado_asyncio
+        except ImportError as error:
+            raise ValueError('The asyncio event loop backend requires '
+                             'asyncio, or trollius on Python 2: %s' % error)
+
+
+def install(backend=None):
+    """Install the IOLoop for the event loop backend in the current process
+    and return it. Must be invoked in the worker process, after it has been
+    forked, and before anything else uses the IOLoop.
+
+    :param str backend: One of asyncio or default
+    :rtype: tornado.ioloop.IOLoop
+    :raises: ValueError
+
+    """
+    check(backend)
+    if (backend or DEFAULT) == DEFAULT:
+        return ioloop.IOLoop.instance()
+    from tornado.platform import asyncio as tornado_asyncio
+    tornado_asyncio.asyncio.set_event_loop(
+        tornado_asyncio.asyncio.new_event_loop())
+    tornado_asyncio.AsyncIOMainLoop().install()
+    io_loop = ioloop.IOLoop.instance()
+    LOGGER.info('Using the %s event loop backend: %r', backend, io_loop)
+    return io_loop
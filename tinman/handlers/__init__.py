@@ -5,3 +5,4 @@ application development.
 from tinman.handlers.base import HEAD, GET, POST, DELETE, PATCH, PUT, OPTIONS
 from tinman.handlers.base import RequestHandler
 from tinman.handlers.base import SessionRequestHandler
+from tinman.handlers.base import StreamingRequestHandler
@@ -4,13 +4,15 @@ Base Tinman RequestHandlers
 """
 import datetime
 from tornado import gen
-import json
+from tornado import iostream
 import logging
-from tornado import escape
+import tempfile
 from tornado import web
 
 from tinman import config
+from tinman import jsoncodec
 from tinman import session
+from tinman import utils
 
 LOGGER = logging.getLogger(__name__)
 
@@ -22,6 +24,29 @@ PATCH = 'PATCH'
 PUT = 'PUT'
 OPTIONS = 'OPTIONS'
 
+#: Raised when an asynchronous iterator is exhausted, Python 2 does not have
+#: asynchronous iterators
+try:
+    STOP_ASYNC_ITERATION = StopAsyncIteration
+except NameError:
+    STOP_ASYNC_ITERATION = StopIteration
+
+#: Tornado 4.0 and later can stream request bodies to the request handler
+STREAM_REQUEST_BODY = hasattr(web, 'stream_request_body')
+
+
+def stream_request_body(cls):
+    """Apply tornado.web.stream_request_body to the RequestHandler class when
+    the installed version of Tornado supports it.
+
+    :param type cls: The RequestHandler class
+    :rtype: type
+
+    """
+    if STREAM_REQUEST_BODY:
+        return web.stream_request_body(cls)
+    return cls
+
 
 class RequestHandler(web.RequestHandler):
     """A base RequestHandler that adds the following functionality:
@@ -29,6 +54,7 @@ class RequestHandler(web.RequestHandler):
     - If sending a dict, checks the user-agent string for curl and sends an
       indented, sorted human-readable JSON snippet
     - Toggles the ensure_ascii flag in json.dumps
+    - Encodes and decodes JSON with the Application's json_backend
     - Overrides the default behavior for unimplemented methods to instead set
     the status and look to the allow object attribute for methods that can be
     allowed. This is useful for when using NewRelic since the newrelic agent
@@ -51,6 +77,8 @@ class RequestHandler(web.RequestHandler):
     """
     ALLOW = []
     JSON = 'application/json'
+    JSON_STREAM_FLUSH_SIZE = 65536
+    NDJSON = 'application/x-ndjson'
 
     def __init__(self, application, request, **kwargs):
         super(RequestHandler, self).__init__(application, request, **kwargs)
@@ -140,7 +168,7 @@ class RequestHandler(web.RequestHandler):
         """
         super(RequestHandler, self).prepare()
         if self.request.headers.get('content-type', '').startswith(self.JSON):
-            self.request.body = escape.json_decode(self.request.body)
+            self.request.body = self.json_codec.loads(self.request.body)
 
     def write(self, chunk):
         """Writes the given chunk to the output buffer. Checks for curl in the
@@ -161,14 +189,274 @@ class RequestHandler(web.RequestHandler):
                                "by using async operations without the "
                                "@asynchronous decorator.")
         if isinstance(chunk, dict):
-            options = {'ensure_ascii': False}
-            if 'curl' in self.request.headers.get('user-agent'):
-                options['indent'] = 2
-                options['sort_keys'] = True
-            chunk = json.dumps(chunk, **options).replace("</", "<\\/") + '\n'
+            pretty = 'curl' in self.request.headers.get('user-agent', '')
+            self._write_buffer.append(self.json_codec.dumps(chunk, pretty))
+            self._write_buffer.append(b'\n')
             self.set_header("Content-Type", "application/json; charset=UTF-8")
+            return
         self._write_buffer.append(web.utf8(chunk))
 
+    @gen.coroutine
+    def write_json_stream(self, items, ndjson=False, flush_size=None):
+        """Write the items from an iterator or asynchronous iterable as a JSON
+        array, or as newline delimited JSON, flushing the output after the
+        first item and whenever flush_size bytes are buffered. Each flush is
+        waited on before more items are encoded, so the memory used does not
+        grow with the number of items. If the client closes the connection,
+        writing stops and the iterator is closed if it is a generator. Yield
+        it from a coroutine; the response is finished when the coroutine
+        returns. Asynchronous iterables, such as async generators, require
+        Tornado 4.3 or later.
+
+        :param iterable items: The items to write
+        :param bool ndjson: Write newline delimited JSON
+        :param int flush_size: Bytes buffered before the output is flushed
+
+        """
+        flush_size = flush_size or self.JSON_STREAM_FLUSH_SIZE
+        if ndjson:
+            self.set_header('Content-Type', '%s; charset=UTF-8' % self.NDJSON)
+            opening, separator, closing = b'', b'', b''
+        else:
+            self.set_header('Content-Type', '%s; charset=UTF-8' % self.JSON)
+            opening, separator, closing = b'[', b',', b']'
+        asynchronous = hasattr(items, '__aiter__')
+        iterator = items.__aiter__() if asynchronous else iter(items)
+        buffered, count = 0, 0
+        self._write_buffer.append(opening)
+        while True:
+            if asynchronous:
+                try:
+                    item = yield iterator.__anext__()
+                except STOP_ASYNC_ITERATION:
+                    break
+            else:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+            chunk = self.json_codec.dumps(item)
+            if count:
+                self._write_buffer.append(separator)
+            self._write_buffer.append(chunk)
+            if ndjson:
+                self._write_buffer.append(b'\n')
+            buffered += len(chunk) + 1
+            count += 1
+            if count == 1 or buffered >= flush_size:
+                try:
+                    yield utils.flush(self)
+                except iostream.StreamClosedError:
+                    LOGGER.debug('Client closed the connection after %i '
+                                 'items of the JSON stream', count)
+                    if hasattr(iterator, 'close'):
+                        iterator.close()
+                    return
+                buffered = 0
+        self._write_buffer.append(closing)
+        LOGGER.debug('Wrote %i items as a JSON stream', count)
+
+    @property
+    def json_codec(self):
+        """Return the JSON codec for the Application's json_backend setting.
+
+        :rtype: tinman.jsoncodec.Codec
+
+        """
+        return getattr(self.application, 'json_codec',
+                       jsoncodec.DEFAULT_CODEC)
+
+
+@stream_request_body
+class StreamingRequestHandler(RequestHandler):
+    """A RequestHandler that processes the request body as it arrives
+    instead of buffering all of it in memory:
+
+    - JSON arrays and newline delimited JSON are decoded incrementally and
+      each item is passed to json_item_received
+    - Any other body, including JSON that is not an array, is spooled to the
+      body_file attribute, which is kept in memory until it is larger than
+      MAX_MEMORY bytes and is then moved to a temporary file
+
+    The body has been completely received and processed when the HTTP method
+    is called. An item larger than MAX_ITEM_SIZE responds with a 413 status
+    and invalid JSON with a 400 status. MAX_BODY_SIZE, when set, replaces the
+    HTTP server's max_body_size for the request.
+
+    To use, do something like::
+
+        from tinman import handlers
+
+        class Handler(handlers.StreamingRequestHandler):
+
+            ALLOW = [handlers.POST]
+
+            @gen.coroutine
+            def prepare(self):
+                self.saved = 0
+                yield super(Handler, self).prepare()
+
+            @gen.coroutine
+            def json_item_received(self, item):
+                yield self.save(item)
+                self.saved += 1
+
+            def post(self, *args, **kwargs):
+                self.write({'saved': self.saved})
+
+    With versions of Tornado before 4.0 the request body is buffered by the
+    HTTP server and processed in prepare, so memory use is not limited.
+
+    """
+    MAX_BODY_SIZE = None
+    MAX_ITEM_SIZE = jsoncodec.DEFAULT_MAX_ITEM_SIZE
+    MAX_MEMORY = 1048576
+
+    @gen.coroutine
+    def data_received(self, chunk):
+        """Called by Tornado with each chunk of the request body. Errors are
+        raised when the HTTP method would be called, since they can not be
+        sent as a response while the body is being received.
+
+        :param bytes chunk: The chunk of the request body
+
+        """
+        if self._body_error:
+            return
+        if self.body_file:
+            self.body_file.write(chunk)
+            return
+        try:
+            items = self._body_decoder.feed(chunk)
+        except jsoncodec.NotAnArray:
+            LOGGER.debug('JSON request body is not an array, spooling it')
+            self._body_decoder = None
+            self.body_file = self._spool_body()
+            self.body_file.write(chunk)
+            return
+        except ValueError as error:
+            self._body_error = self._decode_error(error)
+            return
+        for item in items:
+            yield self._json_item(item)
+
+    def json_item_received(self, item):
+        """Extend to process each item of a JSON array or newline delimited
+        JSON request body. Return a Future to wait on before more of the body
+        is processed.
+
+        :param mixed item: The decoded item
+
+        """
+        raise web.HTTPError(400, 'Unexpected JSON request body')
+
+    def on_finish(self):
+        """Close the spooled request body when the request is done."""
+        super(StreamingRequestHandler, self).on_finish()
+        if self.body_file:
+            self.body_file.close()
+
+    @gen.coroutine
+    def prepare(self):
+        """Choose how the request body is processed by its content type. The
+        request body is not decoded as it is by RequestHandler.prepare.
+
+        """
+        super(RequestHandler, self).prepare()
+        self.body_file = None
+        self.json_item_count = 0
+        self._body_decoder = None
+        self._body_error = None
+        content_type = self.request.headers.get('content-type', '')
+        content_type = content_type.split(';')[0].strip().lower()
+        if content_type == self.JSON:
+            self._body_decoder = jsoncodec.ArrayDecoder(self.MAX_ITEM_SIZE)
+        elif content_type == self.NDJSON:
+            self._body_decoder = jsoncodec.NDJSONDecoder(self.json_codec,
+                                                         self.MAX_ITEM_SIZE)
+        else:
+            self.body_file = self._spool_body()
+        if not STREAM_REQUEST_BODY:
+            yield self.data_received(self.request.body)
+            yield self._body_received()
+            return
+        if self.MAX_BODY_SIZE:
+            self.request.connection.set_max_body_size(self.MAX_BODY_SIZE)
+        self._receive_body_before(self.request.method.lower())
+
+    @gen.coroutine
+    def _body_received(self):
+        """Process the end of the request body, raising any error from while
+        it was received.
+
+        """
+        if self._body_error:
+            raise self._body_error
+        if self._body_decoder:
+            try:
+                items = self._body_decoder.feed(b'', True)
+            except ValueError as error:
+                raise self._decode_error(error)
+            for item in items:
+                yield self._json_item(item)
+        if self.body_file:
+            self.body_file.seek(0)
+        LOGGER.debug('Request body received with %i JSON items',
+                     self.json_item_count)
+
+    def _decode_error(self, error):
+        """Return the HTTPError to respond with for a decoding error.
+
+        :param ValueError error: The decoding error
+        :rtype: tornado.web.HTTPError
+
+        """
+        if isinstance(error, jsoncodec.ItemTooLarge):
+            return web.HTTPError(413, str(error))
+        return web.HTTPError(400, 'Invalid JSON request body: %s' % error)
+
+    @gen.coroutine
+    def _json_item(self, item):
+        """Pass the item to json_item_received, waiting on the Future it
+        returns.
+
+        :param mixed item: The decoded item
+
+        """
+        self.json_item_count += 1
+        result = self.json_item_received(item)
+        if result is not None:
+            yield result
+
+    def _receive_body_before(self, name):
+        """Wrap the HTTP method so the end of the request body is processed
+        before it is called, since Tornado calls the method directly once the
+        body is received.
+
+        :param str name: The name of the HTTP method
+
+        """
+        method = getattr(self, name)
+
+        @gen.coroutine
+        def wrapper(*args, **kwargs):
+            yield self._body_received()
+            result = method(*args, **kwargs)
+            if result is not None:
+                result = yield result
+            raise gen.Return(result)
+
+        setattr(self, name, wrapper)
+
+    def _spool_body(self):
+        """Return the file the request body is spooled to.
+
+        :rtype: tempfile.SpooledTemporaryFile
+
+        """
+        return tempfile.SpooledTemporaryFile(self.MAX_MEMORY)
+
+
 
 
 class SessionRequestHandler(RequestHandler):
@@ -191,7 +479,11 @@ class SessionRequestHandler(RequestHandler):
         self.session.last_request_at = self.current_epoch()
         self.session.last_request_uri = self.request.uri
         if self.session.dirty:
-            result = yield self.session.save()
+            self.application.pending_tasks += 1
+            try:
+                result = yield self.session.save()
+            finally:
+                self.application.pending_tasks -= 1
             LOGGER.debug('on_finish yield save: %r', result)
         self.session = None
         LOGGER.debug('Exiting SessionRequestHandler.on_finish: %r',
@@ -301,7 +593,8 @@ class SessionRequestHandler(RequestHandler):
         """
         return self._session_class(self._session_id,
                                    self._session_duration,
-                                   self._session_settings)
+                                   self._session_settings,
+                                   self.application.attributes)
     def _set_session_cookie(self):
         """Set the session data cookie."""
         LOGGER.debug('Setting session cookie for %s', self.session.id)
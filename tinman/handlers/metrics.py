@@ -0,0 +1,37 @@
+"""The metrics handler exposes the request statistics for the workers on the
+port it is requested on in the Prometheus text exposition format. Requests
+are recorded for every route by the Application, so no handler mixins are
+needed. Since every worker on a port shares the statistics, each port can be
+scraped directly and any of its workers responds with the same values.
+
+To use the metrics handler, add the route to your configuration:
+
+      - [/metrics, tinman.handlers.metrics.MetricsRequestHandler]
+
+"""
+import logging
+
+from tinman.handlers import base
+from tinman import stats
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MetricsRequestHandler(base.RequestHandler):
+    """Returns the request statistics in the Prometheus text format."""
+    ALLOW = [base.GET]
+
+    def get(self, *args, **kwargs):
+        """Respond with the request statistics for the port
+
+        :param list args: Positional arguments
+        :param dict kwargs: Keyword arguments
+
+        """
+        if not getattr(self.application, 'stats', None):
+            LOGGER.warning('Request statistics are not enabled')
+            self.set_status(404)
+            return self.finish()
+        self.set_header('Content-Type', stats.PROMETHEUS_CONTENT_TYPE)
+        self.finish(stats.prometheus(
+            self.application.stats.fleet.as_dict(self.application.port)))
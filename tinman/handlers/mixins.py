@@ -2,6 +2,7 @@
 Mixin handlers adding various different types of functionality
 
 """
+import functools
 import socket
 from tornado import escape
 from tornado import gen
@@ -119,8 +120,12 @@ class RedisMixin(base.RequestHandler):
         def get(self, *args, **kwargs):
             value = self.redis.get('foo')
 
+    The client is kept in the application attributes, so it is shared by the
+    handlers in a worker process and disconnected when the application is
+    closed.
+
     """
-    _redis_client = None
+    REDIS_CLIENT = 'redis_client'
     _REDIS_HOST = 'localhost'
     _REDIS_PORT = 6379
     _REDIS_DB = 0
@@ -142,23 +147,40 @@ class RedisMixin(base.RequestHandler):
 
         """
         self._ensure_redis_client()
-        return RedisMixin._redis_client
+        return getattr(self.application.attributes, self.REDIS_CLIENT)
 
     def _ensure_redis_client(self):
-        """Ensure the redis client has been created."""
-        if not RedisMixin._redis_client:
-            RedisMixin._redis_client = self._new_redis_client()
+        """Ensure the factory for the redis client has been registered with
+        the application attributes.
+
+        """
+        attributes = self.application.attributes
+        if self.REDIS_CLIENT not in attributes:
+            kwargs = self._redis_connection_settings()
+            attributes.register(self.REDIS_CLIENT,
+                                functools.partial(
+                                    self._new_redis_client, kwargs),
+                                self._close_redis_client)
+
+    @staticmethod
+    def _close_redis_client(client):
+        """Disconnect the redis client when the application is closed.
+
+        :param tornadoredis.Client client: The redis client
+
+        """
+        client.disconnect()
 
-    def _new_redis_client(self):
-        """Create a new redis client and assign it the class _redis_client
-        attribute for reuse across requests.
+    @staticmethod
+    def _new_redis_client(kwargs):
+        """Create a new redis client that is reused across requests.
 
+        :param dict kwargs: The redis connection settings
         :rtype: tornadoredis.Client()
 
         """
         if 'tornadoredis' not in globals():
             import tornadoredis
-        kwargs = self._redis_connection_settings()
         LOGGER.info('Connecting to %(host)s:%(port)s DB %(selected_db)s',
                     kwargs)
         return tornadoredis.Client(**kwargs)
@@ -435,5 +457,5 @@ class ModelAPIMixin(base.RequestHandler):
 class RedisModelAPIMixin(ModelAPIMixin, RedisMixin):
     """Use for Model API support with Redis"""
     def get_model(self, *args, **kwargs):
-        kwargs['redis_client'] = RedisMixin._redis_client
+        kwargs['redis_client'] = self.redis
         return self.MODEL(*args, **kwargs)
@@ -21,17 +21,16 @@ LOGGER = logging.getLogger(__name__)
 
 from tinman import exceptions
 
-message_stack = list()
-pending_rabbitmq_connection = None
-rabbitmq_connection = None
-
 
 class RabbitMQRequestHandler(web.RequestHandler):
     """The request handler will connect to RabbitMQ on the first request,
     buffering any messages that need to be published until the Channel to
     RabbitMQ is opened, sending the stack of previously buffered messages at
     that time. If RabbitMQ closes it's connection to the app at any point, a
-    connection attempt will be made on the next request.
+    connection attempt will be made on the next request. The connection and
+    the stack of buffered messages are kept in the application attributes, so
+    there is one of each per worker process, and the connection is closed when
+    the application is.
 
     Expects configuration in the YAML file under a "rabbitmq" node. All of the
     configuration values are optional but username and password:
@@ -55,6 +54,7 @@ class RabbitMQRequestHandler(web.RequestHandler):
     """
     CHANNEL = 'rabbitmq_channel'
     CONNECTION = 'rabbitmq_connection'
+    MESSAGE_STACK = 'rabbitmq_message_stack'
 
     def _add_to_publish_stack(self, exchange, routing_key, message, properties):
         """Temporarily add the message to the stack to publish to RabbitMQ
@@ -65,15 +65,34 @@ class RabbitMQRequestHandler(web.RequestHandler):
         :param pika.BasicProperties: The message properties
 
         """
-        global message_stack
-        message_stack.append((exchange, routing_key, message, properties))
+        self._rabbitmq_message_stack.append((exchange, routing_key,
+                                             message, properties))
+        self.application.pending_tasks += 1
 
     def _connect_to_rabbitmq(self):
-        """Connect to RabbitMQ and assign a local attribute"""
-        global pending_rabbitmq_connection, rabbitmq_connection
-        if not rabbitmq_connection:
+        """Connect to RabbitMQ, creating the connection attribute with the
+        factory registered for it.
+
+        """
+        attributes = self.application.attributes
+        if self.CONNECTION not in attributes:
+            attributes.register(self.CONNECTION,
+                                self._new_rabbitmq_connection,
+                                self._close_rabbitmq_connection)
+        if not attributes.created(self.CONNECTION):
             LOGGER.info('Creating a new RabbitMQ connection')
-            pending_rabbitmq_connection = self._new_rabbitmq_connection()
+            getattr(attributes, self.CONNECTION)
+
+    @staticmethod
+    def _close_rabbitmq_connection(connection):
+        """Close the connection to RabbitMQ when the application is closed.
+
+        :param pika.adapters.tornado_connection.TornadoConnection connection:
+            The connection to close
+
+        """
+        if connection.is_open:
+            connection.close()
 
     def _new_message_properties(self, content_type=None, content_encoding=None,
                                 headers=None, delivery_mode=None, priority=None,
@@ -119,10 +138,11 @@ class RabbitMQRequestHandler(web.RequestHandler):
         any requests buffered.
 
         """
-        global message_stack
+        message_stack = self._rabbitmq_message_stack
         if not self._rabbitmq_is_closed and message_stack:
             LOGGER.info('Publishing %i deferred message(s)', len(message_stack))
             while message_stack:
+                self.application.pending_tasks -= 1
                 self._publish_message(*message_stack.pop())
 
     def _publish_message(self, exchange, routing_key, message, properties):
@@ -170,8 +190,19 @@ class RabbitMQRequestHandler(web.RequestHandler):
         :rtype: bool
 
         """
-        global rabbitmq_connection
-        return not rabbitmq_connection and not pending_rabbitmq_connection
+        return not self.application.attributes.created(self.CONNECTION)
+
+    @property
+    def _rabbitmq_message_stack(self):
+        """Return the stack of messages buffered until the channel is open.
+
+        :rtype: list
+
+        """
+        attributes = self.application.attributes
+        if self.MESSAGE_STACK not in attributes:
+            attributes.register(self.MESSAGE_STACK, list)
+        return getattr(attributes, self.MESSAGE_STACK)
 
     @property
     def _rabbitmq_parameters(self):
@@ -205,10 +236,9 @@ class RabbitMQRequestHandler(web.RequestHandler):
         :param str reply_text: The disconnect reason
 
         """
-        global rabbitmq_connection
         LOGGER.warning('RabbitMQ has disconnected (%s): %s',
                        reply_code, reply_text)
-        rabbitmq_connection = None
+        self.application.attributes.reset(self.CONNECTION)
         self._set_rabbitmq_channel(None)
         self._connect_to_rabbitmq()
 
@@ -218,12 +248,9 @@ class RabbitMQRequestHandler(web.RequestHandler):
         :param pika.connection.Connection connection: The pika connection
 
         """
-        global pending_rabbitmq_connection, rabbitmq_connection
         LOGGER.info('RabbitMQ has connected')
-        rabbitmq_connection = connection
-        rabbitmq_connection.add_on_close_callback(self.on_rabbitmq_close)
-        rabbitmq_connection.channel(self.on_rabbitmq_channel_open)
-        pending_rabbitmq_connection = None
+        connection.add_on_close_callback(self.on_rabbitmq_close)
+        connection.channel(self.on_rabbitmq_channel_open)
 
     def on_rabbitmq_channel_open(self, channel):
         """Called when the RabbitMQ accepts the channel open request.
@@ -0,0 +1,352 @@
+"""The static file handler serves the files in the static path from an index
+of their size, modification time and precompressed variants that is built
+when the application starts, so requests are answered without stat calls or
+hashing the file for its ETag. The index entry for a file is checked against
+the filesystem at most once per refresh interval, so changed files are picked
+up without restarting.
+
+Small files are served from a memory cache that is bounded in size and evicts
+the least recently used files. Larger files are read and written in chunks,
+waiting for each chunk to be sent before reading the next one. When the
+client accepts it, a precompressed .br or .gz sibling of the file is sent
+instead of the file itself.
+
+The Application uses the handler for its static path unless another
+static_handler_class is configured. Its options are set in the
+static_handler_args application setting:
+
+    Application:
+      static_handler_args:
+        max_cache_size: 33554432
+        max_file_size: 262144
+        refresh_interval: 2
+
+"""
+import collections
+import datetime
+import logging
+import mimetypes
+import os
+import time
+
+from tornado import gen
+from tornado import httputil
+from tornado import iostream
+from tornado import web
+
+from tinman import transforms
+from tinman import utils
+
+LOGGER = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_CACHE_SIZE = 32 * 1024 * 1024
+DEFAULT_MAX_FILE_SIZE = 256 * 1024
+DEFAULT_REFRESH_INTERVAL = 2.0
+
+# Precompressed sibling file extensions, in order of preference
+VARIANTS = [(transforms.BROTLI, '.br'), (transforms.GZIP, '.gz')]
+
+
+class StaticFile(object):
+    """The index entry for a static file or one of its precompressed
+    variants.
+
+    """
+    __slots__ = ['checked', 'content_type', 'encoding', 'etag', 'modified',
+                 'mtime', 'path', 'size', 'variants']
+
+    def __init__(self, path, stat_result, encoding=None):
+        """Create the entry from the file's stat result.
+
+        :param str path: The absolute path to the file
+        :param os.stat_result stat_result: The file's stat result
+        :param str encoding: The content encoding of a variant
+
+        """
+        self.checked = time.time()
+        self.content_type = mimetypes.guess_type(path)[0]
+        self.encoding = encoding
+        self.mtime = stat_result.st_mtime
+        self.modified = datetime.datetime.utcfromtimestamp(int(self.mtime))
+        self.path = path
+        self.size = stat_result.st_size
+        self.etag = '"%x-%x%s"' % (int(self.mtime * 1000000), self.size,
+                                   '-%s' % encoding if encoding else '')
+        self.variants = dict()
+
+
+class StaticIndex(object):
+    """Index of the files in a static path and cache of the contents of the
+    small ones.
+
+    """
+    def __init__(self, root, max_cache_size=DEFAULT_MAX_CACHE_SIZE,
+                 max_file_size=DEFAULT_MAX_FILE_SIZE,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        """Build the index for the files in the root directory.
+
+        :param str root: The static path
+        :param int max_cache_size: The maximum bytes of cached file contents
+        :param int max_file_size: The largest file that is cached
+        :param float refresh_interval: Seconds between checks of a file
+            against the filesystem
+
+        """
+        self.cache_size = 0
+        self.expired = 0
+        self.max_cache_size = max_cache_size
+        self.max_file_size = max_file_size
+        self.refresh_interval = refresh_interval
+        self.root = os.path.abspath(root)
+        self._cache = collections.OrderedDict()
+        self._files = dict()
+        start = time.time()
+        for path, _dirs, names in os.walk(self.root):
+            for name in names:
+                self.get(os.path.join(path, name))
+        LOGGER.info('Indexed %i static files in %s in %.3f seconds',
+                    len(self._files), self.root, time.time() - start)
+
+    def content(self, static_file):
+        """Return the contents of a file from the cache, reading and caching
+        them if they are not cached.
+
+        :param StaticFile static_file: The file to return the contents of
+        :rtype: bytes
+
+        """
+        cached = self._cache.pop(static_file.path, None)
+        if cached and cached[0] == static_file.etag:
+            self._cache[static_file.path] = cached
+            return cached[1]
+        if cached:
+            self.cache_size -= len(cached[1])
+        with open(static_file.path, 'rb') as handle:
+            value = handle.read()
+        if len(value) <= self.max_file_size:
+            self._cache[static_file.path] = static_file.etag, value
+            self.cache_size += len(value)
+            while self.cache_size > self.max_cache_size:
+                _path, evicted = self._cache.popitem(last=False)
+                self.cache_size -= len(evicted[1])
+        return value
+
+    def expire(self):
+        """Expire the index entries, so each file is checked against the
+        filesystem the next time it is requested.
+
+        """
+        self.expired = time.time()
+
+    def get(self, path):
+        """Return the index entry for the file at the absolute path, adding or
+        refreshing it as needed, or None if it is not a file.
+
+        :param str path: The absolute path to the file
+        :rtype: StaticFile|None
+
+        """
+        static_file = self._files.get(path)
+        if (static_file and static_file.checked > self.expired and
+                time.time() - static_file.checked < self.refresh_interval):
+            return static_file
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            self._files.pop(path, None)
+            return None
+        if not os.path.isfile(path):
+            return None
+        if (static_file and static_file.mtime == stat_result.st_mtime and
+                static_file.size == stat_result.st_size):
+            static_file.checked = time.time()
+        else:
+            static_file = StaticFile(path, stat_result)
+        static_file.variants = self._variants(static_file)
+        self._files[path] = static_file
+        return static_file
+
+    @staticmethod
+    def _variants(static_file):
+        """Return the precompressed variants of the file that are at least as
+        new as the file itself.
+
+        :param StaticFile static_file: The file
+        :rtype: dict
+
+        """
+        variants = dict()
+        for encoding, extension in VARIANTS:
+            path = static_file.path + extension
+            existing = static_file.variants.get(encoding)
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            if stat_result.st_mtime < static_file.mtime:
+                continue
+            if (existing and existing.mtime == stat_result.st_mtime and
+                    existing.size == stat_result.st_size):
+                variants[encoding] = existing
+                continue
+            variant = StaticFile(path, stat_result, encoding)
+            variant.content_type = static_file.content_type
+            variants[encoding] = variant
+        return variants
+
+
+class StaticFileHandler(web.StaticFileHandler):
+    """Serves static files from the index for the static path."""
+    _indexes = dict()
+
+    def initialize(self, path, default_filename=None, **kwargs):
+        """Initialize the handler, building the index for the path if it has
+        not been built.
+
+        :param str path: The static path
+        :param str default_filename: The file served for a directory
+        :param dict kwargs: The StaticIndex options
+
+        """
+        super(StaticFileHandler, self).initialize(path, default_filename)
+        self.content = None
+        self.static_file = None
+        self._index = self.index(path, **kwargs)
+
+    @classmethod
+    def index(cls, root, **kwargs):
+        """Return the index for the static path, building it the first time
+        it is used.
+
+        :param str root: The static path
+        :param dict kwargs: The StaticIndex options
+        :rtype: StaticIndex
+
+        """
+        if root not in cls._indexes:
+            cls._indexes[root] = StaticIndex(root, **kwargs)
+        return cls._indexes[root]
+
+    @classmethod
+    def reset(cls):
+        """Called for every request when static_hash_cache is disabled, as it
+        is in debug mode, expiring the indexes so the requested file is
+        checked against the filesystem instead of rebuilding them.
+
+        """
+        super(StaticFileHandler, cls).reset()
+        for index in cls._indexes.values():
+            index.expire()
+
+    def compute_etag(self):
+        return self.content.etag
+
+    def get_content_size(self):
+        return self.content.size
+
+    def get_content_type(self):
+        return self.static_file.content_type
+
+    def get_modified_time(self):
+        return self.static_file.modified
+
+    @gen.coroutine
+    def get(self, path, include_body=True):
+        """Send the file or the requested range of it.
+
+        :param str path: The requested path in the static path
+        :param bool include_body: Send the file contents
+
+        """
+        self.path = self.parse_url_path(path)
+        absolute_path = self.get_absolute_path(self.root, self.path)
+        self.absolute_path = self.validate_absolute_path(self.root,
+                                                         absolute_path)
+        if self.absolute_path is None:
+            return
+        self.static_file = self._index.get(self.absolute_path)
+        if self.static_file is None:
+            raise web.HTTPError(404)
+
+        request_range = None
+        range_header = self.request.headers.get('Range')
+        if range_header:
+            request_range = httputil._parse_request_range(range_header)
+        self.content = (self.static_file if request_range
+                        else self._variant(self.static_file))
+
+        self.modified = self.get_modified_time()
+        self.set_headers()
+        if self.static_file.variants:
+            self.set_header('Vary', 'Accept-Encoding')
+        if self.content.encoding:
+            self.set_header('Content-Encoding', self.content.encoding)
+        if self.should_return_304():
+            self.set_status(304)
+            return
+
+        start = end = None
+        size = self.content.size
+        if request_range:
+            start, end = request_range
+            if (start is not None and start >= size) or end == 0:
+                self.set_status(416)
+                self.set_header('Content-Type', 'text/plain')
+                self.set_header('Content-Range', 'bytes */%s' % size)
+                return
+            if start is not None and start < 0:
+                start += size
+            if end is not None and end > size:
+                end = size
+            if size != (end or size) - (start or 0):
+                self.set_status(206)
+                self.set_header('Content-Range',
+                                httputil._get_content_range(start, end, size))
+            else:
+                start = end = None
+
+        if not include_body:
+            self.set_header('Content-Length', (end or size) - (start or 0))
+        elif start is None and size <= self._index.max_file_size:
+            self.write(self._index.content(self.content))
+        else:
+            for chunk in self.get_content(self.content.path, start, end):
+                try:
+                    self.write(chunk)
+                    yield utils.flush(self)
+                except iostream.StreamClosedError:
+                    return
+
+    def validate_absolute_path(self, root, absolute_path):
+        """Return the absolute path if it is an indexed file in the static
+        path, leaving directories, missing files and paths outside of the
+        static path to the default validation.
+
+        :param str root: The static path
+        :param str absolute_path: The absolute path of the requested file
+        :rtype: str|None
+
+        """
+        if (absolute_path.startswith(self._index.root + os.path.sep) and
+                self._index.get(absolute_path)):
+            return absolute_path
+        return super(StaticFileHandler, self).validate_absolute_path(
+            root, absolute_path)
+
+    def _variant(self, static_file):
+        """Return the precompressed variant of the file to send, or the file
+        itself if the client does not accept any of its variants.
+
+        :param StaticFile static_file: The requested file
+        :rtype: StaticFile
+
+        """
+        if not static_file.variants:
+            return static_file
+        accepted = transforms.accepted_encodings(self.request)
+        for encoding, _extension in VARIANTS:
+            if (encoding in static_file.variants and
+                    accepted.get(encoding, 0.0) > 0.0):
+                return static_file.variants[encoding]
+        return static_file
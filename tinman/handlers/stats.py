@@ -0,0 +1,40 @@
+"""The stats handler returns the request statistics for every worker process
+on the host, aggregated from the shared memory statistics area allocated by
+the controller. Since the statistics are shared, any worker on any port may
+respond with the view of the whole fleet. When the IOLoop watchdog is enabled,
+the IOLoop lag and blocking stacks of the worker that responded are included.
+
+To use the stats handler, add the route to your configuration:
+
+      - [/stats, tinman.handlers.stats.StatsRequestHandler]
+
+"""
+import logging
+
+from tinman.handlers import base
+
+LOGGER = logging.getLogger(__name__)
+
+
+class StatsRequestHandler(base.RequestHandler):
+    """Returns the aggregated request statistics as a JSON document."""
+    ALLOW = [base.GET]
+
+    def get(self, *args, **kwargs):
+        """Respond with the aggregated request statistics
+
+        :param list args: Positional arguments
+        :param dict kwargs: Keyword arguments
+
+        """
+        if not getattr(self.application, 'stats', None):
+            LOGGER.warning('Request statistics are not enabled')
+            self.set_status(404)
+            return self.finish()
+        stats = self.application.stats
+        value = stats.fleet.as_dict()
+        if getattr(self.application, 'watchdog', None):
+            value['watchdog'] = self.application.watchdog.as_dict()
+            value['watchdog']['port'], value['watchdog']['worker'] = \
+                stats.fleet.slots[stats.slot]
+        self.finish(value)
@@ -0,0 +1,327 @@
+"""
+JSON codecs the request handlers encode responses and decode request bodies
+with. The default codec uses the json module in the standard library, the
+orjson and ujson codecs use those libraries when they are installed and the
+automatic codec uses the fastest one that is installed. Values the faster
+libraries can not encode are encoded with the json module instead.
+
+Encoded values are UTF-8 bytes with "</" escaped as "<\\/", so they are safe
+to embed in a script tag, ready to be appended to the output buffer.
+
+The ArrayDecoder and NDJSONDecoder decode the items in a JSON array or in
+newline delimited JSON incrementally, as the chunks of a request body arrive,
+holding no more than one partially received item at a time.
+
+"""
+import codecs
+import json
+import logging
+import re
+
+from tornado import escape
+
+LOGGER = logging.getLogger(__name__)
+
+AUTOMATIC = 'automatic'
+DEFAULT = 'json'
+ORJSON = 'orjson'
+UJSON = 'ujson'
+BACKENDS = [AUTOMATIC, DEFAULT, ORJSON, UJSON]
+
+DEFAULT_MAX_ITEM_SIZE = 1048576
+
+DELIMITERS = ' \t\n\r,]'
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# The strings, brackets, commas and other text in a partially received item
+TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|"|[\[\]{},]|[^"\[\]{},]+')
+BRACKETS = {']': '[', '}': '{'}
+
+
+class ItemTooLarge(ValueError):
+    """Raised when an item being decoded is larger than the maximum item
+    size.
+
+    """
+    pass
+
+
+class NotAnArray(ValueError):
+    """Raised when the JSON being decoded by an ArrayDecoder is not an
+    array.
+
+    """
+    pass
+
+
+class Codec(object):
+    """Encodes and decodes JSON with the json module in the standard
+    library.
+
+    """
+    name = DEFAULT
+
+    def __init__(self):
+        self._compact = json.JSONEncoder(ensure_ascii=False)
+        self._pretty = json.JSONEncoder(ensure_ascii=False, indent=2,
+                                        separators=(',', ': '),
+                                        sort_keys=True)
+
+    def dumps(self, value, pretty=False):
+        """Return the value encoded as JSON.
+
+        :param mixed value: The value to encode
+        :param bool pretty: Indent the JSON and sort the keys
+        :rtype: bytes
+
+        """
+        encoder = self._pretty if pretty else self._compact
+        return escape.utf8(encoder.encode(value).replace('</', '<\\/'))
+
+    def loads(self, value):
+        """Return the value decoded from JSON.
+
+        :param bytes value: The JSON to decode
+        :rtype: mixed
+
+        """
+        return json.loads(escape.to_basestring(value))
+
+
+class ORJSONCodec(Codec):
+    """Encodes and decodes JSON with orjson, which encodes directly to UTF-8
+    bytes.
+
+    """
+    name = ORJSON
+
+    def __init__(self):
+        super(ORJSONCodec, self).__init__()
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+
+    def dumps(self, value, pretty=False):
+        try:
+            data = self._orjson.dumps(value,
+                                      option=self._options if pretty else 0)
+        except TypeError:
+            return super(ORJSONCodec, self).dumps(value, pretty)
+        if b'</' in data:
+            data = data.replace(b'</', b'<\\/')
+        return data
+
+    def loads(self, value):
+        return self._orjson.loads(value)
+
+
+class UJSONCodec(Codec):
+    """Encodes and decodes JSON with ujson, which escapes forward slashes as
+    it encodes.
+
+    """
+    name = UJSON
+
+    def __init__(self):
+        super(UJSONCodec, self).__init__()
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, value, pretty=False):
+        options = {'ensure_ascii': False, 'escape_forward_slashes': True}
+        if pretty:
+            options.update({'indent': 2, 'sort_keys': True})
+        try:
+            return escape.utf8(self._ujson.dumps(value, **options))
+        except (OverflowError, TypeError):
+            return super(UJSONCodec, self).dumps(value, pretty)
+
+    def loads(self, value):
+        return self._ujson.loads(value)
+
+
+class ArrayDecoder(object):
+    """Decodes the items of a JSON array as its chunks are fed to it."""
+    CLOSED, FIRST, OPENING, SEPARATOR, VALUE = range(0, 5)
+
+    def __init__(self, max_item_size=DEFAULT_MAX_ITEM_SIZE):
+        """Create the decoder.
+
+        :param int max_item_size: The largest item in characters
+
+        """
+        self.max_item_size = max_item_size
+        self._buffer = ''
+        self._decoder = json.JSONDecoder()
+        self._state = self.OPENING
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def feed(self, data, final=False):
+        """Return the items that were completed by the chunk. An item is not
+        decoded until the whitespace, comma or bracket after it is fed, since
+        a number may continue in the next chunk.
+
+        :param bytes data: The chunk of the JSON array
+        :param bool final: The chunk is the end of the JSON array
+        :rtype: list
+        :raises: ItemTooLarge, NotAnArray, ValueError
+
+        """
+        buffer = self._buffer + self._utf8.decode(data, final)
+        items, position = list(), 0
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            if self._state == self.CLOSED:
+                raise ValueError('Unexpected data after the JSON array')
+            elif self._state == self.OPENING:
+                if char != '[':
+                    raise NotAnArray('The JSON value is not an array')
+                self._state, position = self.FIRST, position + 1
+            elif self._state == self.SEPARATOR:
+                if char not in ',]':
+                    raise ValueError('Expected "," or "]" at %i' % position)
+                self._state = self.VALUE if char == ',' else self.CLOSED
+                position += 1
+            elif char == ']' and self._state == self.FIRST:
+                self._state, position = self.CLOSED, position + 1
+            else:
+                try:
+                    item, end = self._decoder.raw_decode(buffer, position)
+                except ValueError:
+                    if final or self._complete(buffer, position):
+                        raise
+                    break
+                if not final and (end == len(buffer) or
+                                  buffer[end] not in DELIMITERS):
+                    if (end < len(buffer) and
+                            self._complete(buffer, position)):
+                        raise ValueError('Invalid JSON array item at %i' %
+                                         position)
+                    break
+                if end - position > self.max_item_size:
+                    raise self._too_large()
+                items.append(item)
+                self._state, position = self.SEPARATOR, end
+        self._buffer = buffer[position:]
+        if len(self._buffer) > self.max_item_size:
+            raise self._too_large()
+        if final and self._state != self.CLOSED:
+            raise ValueError('The JSON array is not complete')
+        return items
+
+    @staticmethod
+    def _complete(buffer, position):
+        """Return True if the item starting at the position ends in the
+        buffer, so an item that could not be decoded is invalid rather than
+        waiting for the rest of it to be received.
+
+        :param str buffer: The buffered part of the JSON array
+        :param int position: The position the item starts at
+        :rtype: bool
+
+        """
+        opened = list()
+        for match in TOKENS.finditer(buffer, position):
+            token = match.group()
+            if token == '"':
+                return False
+            elif token in '[{':
+                opened.append(token)
+            elif token in ']}':
+                if not opened or opened.pop() != BRACKETS[token]:
+                    return True
+                if not opened:
+                    return True
+            elif token == ',':
+                if not opened:
+                    return True
+            elif not opened and match.end() < len(buffer):
+                return True
+        return False
+
+    def _too_large(self):
+        return ItemTooLarge('An item is larger than %i characters' %
+                            self.max_item_size)
+
+
+class NDJSONDecoder(object):
+    """Decodes the lines of newline delimited JSON as its chunks are fed to
+    it.
+
+    """
+    def __init__(self, codec=None, max_item_size=DEFAULT_MAX_ITEM_SIZE):
+        """Create the decoder.
+
+        :param Codec codec: The codec to decode each line with
+        :param int max_item_size: The largest line in bytes
+
+        """
+        self.codec = codec or DEFAULT_CODEC
+        self.max_item_size = max_item_size
+        self._buffer = bytearray()
+
+    def feed(self, data, final=False):
+        """Return the items for the lines that were completed by the chunk.
+
+        :param bytes data: The chunk of newline delimited JSON
+        :param bool final: The chunk is the end of the body
+        :rtype: list
+        :raises: ItemTooLarge, ValueError
+
+        """
+        self._buffer.extend(data)
+        items, start = list(), 0
+        end = self._buffer.find(b'\n')
+        while end >= 0 or (final and start < len(self._buffer)):
+            if end < 0:
+                end = len(self._buffer)
+            if end - start > self.max_item_size:
+                raise self._too_large()
+            line = bytes(self._buffer[start:end]).strip()
+            if line:
+                items.append(self.codec.loads(line))
+            start = end + 1
+            end = self._buffer.find(b'\n', start)
+        del self._buffer[:start]
+        if len(self._buffer) > self.max_item_size:
+            raise self._too_large()
+        return items
+
+    def _too_large(self):
+        return ItemTooLarge('A line is larger than %i bytes' %
+                            self.max_item_size)
+
+
+CODECS = [(ORJSON, ORJSONCodec), (UJSON, UJSONCodec), (DEFAULT, Codec)]
+
+
+def codec(backend=None):
+    """Return the codec for the JSON backend. If the library for the backend
+    is not installed, the json module in the standard library is used.
+
+    :param str backend: One of automatic, json, orjson or ujson
+    :rtype: Codec
+    :raises: ValueError
+
+    """
+    backend = backend or DEFAULT
+    if backend not in BACKENDS:
+        raise ValueError('Unsupported JSON backend: %s' % backend)
+    for name, codec_class in CODECS:
+        if backend not in (name, AUTOMATIC) and name != DEFAULT:
+            continue
+        try:
+            value = codec_class()
+        except ImportError:
+            if backend == name:
+                LOGGER.warning('%s is not installed, using json', name)
+            continue
+        LOGGER.debug('Using the %s JSON backend', value.name)
+        return value
+
+
+#: The codec used by request handlers outside of a Tinman Application
+DEFAULT_CODEC = Codec()
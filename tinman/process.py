@@ -2,28 +2,66 @@
 process.py
 
 """
+import copy
 from helper import config as helper_config
 from tornado import httpserver
 from tornado import ioloop
 import logging
 import multiprocessing
+import os
 import signal
-import socket
 import ssl
 from tornado import version as tornado_version
 
 from tinman import application
 from tinman import config
+from tinman import eventloop
 from tinman import exceptions
+from tinman import snapshot
+from tinman import sockets
+from tinman import utils
+from tinman import watchdog
 
 LOGGER = logging.getLogger(__name__)
 
 
 class Process(multiprocessing.Process):
-    """The process holding the HTTPServer and Application"""
+    """The process holding the HTTPServer and Application. The configuration
+    is passed in as a snapshot when the process is created and updated
+    snapshots are read from the controller's snapshot file when SIGHUP is
+    received.
+
+    """
     CERT_REQUIREMENTS = {config.NONE: ssl.CERT_NONE,
                          config.OPTIONAL: ssl.CERT_OPTIONAL,
                          config.REQUIRED: ssl.CERT_REQUIRED}
+    # HTTPServer arguments that are only passed when they are configured,
+    # some of which require newer versions of Tornado
+    HTTP_SERVER_SETTINGS = [config.BODY_TIMEOUT, config.CHUNK_SIZE,
+                            config.DECOMPRESS_REQUEST,
+                            config.IDLE_CONNECTION_TIMEOUT,
+                            config.MAX_BODY_SIZE, config.MAX_BUFFER_SIZE,
+                            config.MAX_HEADER_SIZE, config.PROTOCOL]
+
+    # HTTPServer arguments that are held in the connection parameters object
+    # in Tornado 4 and the attribute they are held in
+    CONNECTION_PARAMETERS = {config.BODY_TIMEOUT: 'body_timeout',
+                             config.CHUNK_SIZE: 'chunk_size',
+                             config.DECOMPRESS_REQUEST: 'decompress',
+                             config.IDLE_CONNECTION_TIMEOUT: 'header_timeout',
+                             config.MAX_BODY_SIZE: 'max_body_size',
+                             config.MAX_HEADER_SIZE: 'max_header_size',
+                             config.NO_KEEP_ALIVE: 'no_keep_alive'}
+
+    # Signals handled by the controller that are restored to their default
+    # handlers in the child process
+    DEFAULT_SIGNALS = [signal.SIGALRM, signal.SIGCHLD, signal.SIGUSR1,
+                       signal.SIGUSR2]
+
+    DRAIN_CHECK_INTERVAL = 0.1
+    DRAIN_TIMEOUT = 10
+    RECYCLE_CHECK_INTERVAL = 5
+
     def __init__(self, group=None, target=None, name=None, args=(), kwargs={}):
         """Create a new instance of Process
 
@@ -31,13 +69,28 @@ class Process(multiprocessing.Process):
         super(Process, self).__init__(group, target, name, args, kwargs)
 
         # Passed in values
-        self.namespace = kwargs['namespace']
+        self.snapshot = kwargs['snapshot']
+        self.snapshot_path = kwargs.get('snapshot_path')
         self.port = kwargs['port']
+        self.replace_socket = kwargs.get('replace_socket', False)
+        self.sockets = kwargs.get('sockets')
+        self.unix_socket = None
+        self.watchdog = None
+        self.stats = kwargs.get('stats')
+        self.stats_area = kwargs.get('stats_area', 0)
+        self.worker = kwargs.get('worker', 0)
 
         # Internal attributes holding instance information
         self.app = None
+        self.drain_deadline = None
         self.http_server = None
-        self.request_counters = dict()
+        self.ioloop = None
+
+        # Set once the HTTPServer is accepting connections
+        self.ready = multiprocessing.Event()
+
+        # Set when the process has crossed a limit and should be replaced
+        self.recycle = multiprocessing.Event()
 
         # Re-setup logging in the new process
         self.logging_config = None
@@ -49,8 +102,29 @@ class Process(multiprocessing.Process):
     def create_application(self):
         """Create and return a new instance of tinman.application.Application"""
         return application.Application(self.settings,
-                                       self.namespace.routes,
-                                       self.port)
+                                       self.snapshot.routes,
+                                       self.port,
+                                       self.worker_stats,
+                                       self.watchdog)
+
+    def create_watchdog(self):
+        """Create the IOLoop watchdog if it is enabled in the configuration.
+
+        :rtype: tinman.watchdog.Watchdog|None
+
+        """
+        settings = self.server_config.get(config.WATCHDOG)
+        if not settings:
+            return None
+        if not isinstance(settings, dict):
+            settings = dict()
+        return watchdog.Watchdog(self.ioloop,
+                                 settings.get(config.INTERVAL,
+                                              watchdog.DEFAULT_INTERVAL),
+                                 settings.get(config.THRESHOLD,
+                                              watchdog.DEFAULT_THRESHOLD),
+                                 settings.get(config.STACKS,
+                                              watchdog.DEFAULT_MAX_STACKS))
 
     def create_http_server(self):
         """Setup the HTTPServer
@@ -64,55 +138,179 @@ class Process(multiprocessing.Process):
     def http_config(self):
         """Return a dictionary of HTTPServer arguments using the default values
         as specified in the HTTPServer class docstrings if no values are
-        specified.
+        specified. The tuning arguments such as max_buffer_size and
+        idle_connection_timeout are only included if they are configured.
 
         :param dict config: The HTTPServer specific section of the config
         :rtype: dict
 
         """
-        return {config.NO_KEEP_ALIVE:
-                    self.namespace.server.get(config.NO_KEEP_ALIVE, False),
+        server_config = self.server_config
+        args = {config.NO_KEEP_ALIVE:
+                    server_config.get(config.NO_KEEP_ALIVE, False),
                 config.SSL_OPTIONS: self.ssl_options,
-                config.XHEADERS: self.namespace.server.get(config.XHEADERS,
-                                                           False)}
+                config.XHEADERS: server_config.get(config.XHEADERS, False)}
+        for setting in self.HTTP_SERVER_SETTINGS:
+            if server_config.get(setting) is not None:
+                args[setting] = server_config[setting]
+        return args
+
+    def check_limits(self):
+        """Ask the controller to replace the process if it has handled the
+        maximum number of requests or its resident memory has grown past the
+        maximum size.
+
+        """
+        if self.recycle.is_set() or self.drain_deadline:
+            return
+        max_requests = self.server_config.get(config.MAX_REQUESTS)
+        max_rss_mb = self.server_config.get(config.MAX_RSS_MB)
+        if max_requests and self.app.request_count >= max_requests:
+            LOGGER.info('Handled %i requests, requesting to be recycled',
+                        self.app.request_count)
+        elif max_rss_mb and utils.resident_memory() >= max_rss_mb * 1048576:
+            LOGGER.info('Resident memory of %.2f MB exceeds %i MB, requesting '
+                        'to be recycled', utils.resident_memory() / 1048576.0,
+                        max_rss_mb)
+        else:
+            return
+        self.recycle.set()
+        os.kill(os.getppid(), signal.SIGUSR1)
+
+    def check_drained(self):
+        """Stop the IOLoop once the application is idle or the drain deadline
+        has passed, logging what was abandoned if it did not finish draining.
+
+        """
+        if self.app.idle:
+            LOGGER.info('Drained all requests, stopping IOLoop')
+            self.ioloop.stop()
+        elif self.ioloop.time() >= self.drain_deadline:
+            LOGGER.warning('Drain timeout exceeded, abandoning %i request(s) '
+                           'and %i pending task(s)',
+                           self.app.requests_in_flight, self.app.pending_tasks)
+            self.ioloop.stop()
+        else:
+            self.ioloop.add_timeout(self.ioloop.time() +
+                                    self.DRAIN_CHECK_INTERVAL,
+                                    self.check_drained)
+
+    def drain(self):
+        """Stop accepting new connections and wait for in-flight requests and
+        pending tasks to finish, up to the drain timeout, before stopping the
+        IOLoop.
+
+        """
+        if self.drain_deadline:
+            LOGGER.debug('Already draining')
+            return
+        LOGGER.info('Stopping HTTP Server and draining %i request(s) and %i '
+                    'pending task(s) for up to %i seconds',
+                    self.app.requests_in_flight, self.app.pending_tasks,
+                    self.drain_timeout)
+        self.drain_deadline = self.ioloop.time() + self.drain_timeout
+        self.http_server.stop()
+        if self.unix_socket:
+            sockets.remove_unix(*self.unix_socket)
+        self.check_drained()
+
+    @property
+    def drain_timeout(self):
+        """Return how long to wait for requests to drain when stopping.
+
+        :rtype: int
+
+        """
+        return self.server_config.get(config.DRAIN_TIMEOUT,
+                                      self.DRAIN_TIMEOUT)
 
     def on_sigabrt(self, signal_unused, frame_unused):
-        """Stop the HTTP Server and IO Loop, shutting down the process
+        """Drain the HTTP Server and stop the IO Loop, shutting down the
+        process
 
         :param int signal_unused: Unused signal number
         :param frame frame_unused: Unused frame the signal was caught in
 
         """
-        LOGGER.info('Stopping HTTP Server and IOLoop')
-        self.http_server.stop()
-        self.ioloop.stop()
+        if not self.ioloop or not self.http_server:
+            LOGGER.info('Stopping before the HTTP Server started')
+            raise SystemExit(0)
+        self.ioloop.add_callback_from_signal(self.drain)
 
     def on_sighup(self, signal_unused, frame_unused):
-        """Reload the configuration
+        """Apply the latest configuration snapshot written by the controller
+        on the IOLoop, between requests. If the IOLoop has not been created
+        yet, the snapshot is read so the process starts with it.
 
         :param int signal_unused: Unused signal number
         :param frame frame_unused: Unused frame the signal was caught in
 
         """
-        # Update HTTP configuration
-        for setting in self.http_config:
-            if getattr(self.http_server, setting) != self.http_config[setting]:
-                LOGGER.debug('Changing HTTPServer %s setting', setting)
-                setattr(self.http_server, setting, self.http_config[setting])
+        if self.ioloop:
+            self.ioloop.add_callback_from_signal(self.reload)
+        else:
+            self.receive_snapshot()
+
+    def reload(self):
+        """Read the latest configuration snapshot and apply it to the
+        HTTPServer and Application if it is newer than the current one.
 
-        # Update Application Settings
-        for setting in self.settings:
-            if self.app.settings[setting] != self.settings[setting]:
-                LOGGER.debug('Changing Application %s setting', setting)
-                self.app.settings[setting] = self.settings[setting]
+        """
+        if not self.receive_snapshot():
+            LOGGER.debug('No new configuration snapshot to apply')
+            return
+        http_config = self.http_config
+        for setting in http_config:
+            self.update_http_server(setting, http_config[setting])
+        if self.app.reload(self.settings, self.snapshot.routes):
+            LOGGER.info('Configuration reloaded (v%i)', self.snapshot.version)
+        else:
+            LOGGER.error('Configuration v%i was not fully applied',
+                         self.snapshot.version)
+
+    def update_http_server(self, setting, value):
+        """Update a HTTPServer setting on the running HTTPServer if it has
+        changed. Changes only apply to new connections and settings that can
+        not be changed on a running HTTPServer are logged and applied the next
+        time the process is started.
+
+        :param str setting: The HTTPServer argument name
+        :param any value: The new value
 
-        # Update the routes
-        self.app.handlers = []
-        self.app.named_handlers = {}
-        routes = self.namespace.config.get(config.ROUTES)
-        self.app.add_handlers(".*$", self.app.prepare_routes(routes))
+        """
+        target, attribute = self.http_server, setting
+        if (not hasattr(self.http_server, setting) and
+                hasattr(self.http_server, 'conn_params') and
+                setting in self.CONNECTION_PARAMETERS):
+            target = self.http_server.conn_params
+            attribute = self.CONNECTION_PARAMETERS[setting]
+        if not hasattr(target, attribute):
+            LOGGER.warning('HTTPServer %s setting can not be changed without '
+                           'restarting', setting)
+        elif getattr(target, attribute) != value:
+            LOGGER.debug('Changing HTTPServer %s setting', setting)
+            setattr(target, attribute, value)
+
+    def receive_snapshot(self):
+        """Read the configuration snapshot the controller last wrote, keeping
+        it if it is newer than the current one. Returns True if a newer
+        snapshot was received.
+
+        :rtype: bool
 
-        LOGGER.info('Configuration reloaded')
+        """
+        if not self.snapshot_path:
+            return False
+        try:
+            value = snapshot.read(self.snapshot_path)
+        except Exception as error:
+            LOGGER.error('Could not read the configuration snapshot from %s: '
+                         '%s', self.snapshot_path, error)
+            return False
+        if not value or value.version <= self.snapshot.version:
+            return False
+        self.snapshot = value
+        return True
 
     def run(self):
         """Called when the process has started
@@ -120,13 +318,19 @@ class Process(multiprocessing.Process):
         :param int port: The HTTP Server port
 
         """
+        # Replace the signal handlers inherited from the controller
+        self.setup_signal_handlers()
+
         LOGGER.debug('Initializing process')
 
         # Setup logging
         self.logging_config = self.setup_logging()
 
-        # Register the signal handlers
-        self.setup_signal_handlers()
+        # Hold on to the IOLoop in case it's needed for responding to signals
+        self.ioloop = eventloop.install(self.server_config.get(config.IOLOOP))
+
+        # Create the IOLoop watchdog if it is enabled
+        self.watchdog = self.create_watchdog()
 
         # Create the application instance
         try:
@@ -137,8 +341,19 @@ class Process(multiprocessing.Process):
         # Create the HTTPServer
         self.http_server = self.create_http_server()
 
-        # Hold on to the IOLoop in case it's needed for responding to signals
-        self.ioloop = ioloop.IOLoop.instance()
+        # Let the controller know the process is ready once the IOLoop starts
+        self.ioloop.add_callback(self.ready.set)
+
+        # Periodically check if the process should be recycled
+        if (self.server_config.get(config.MAX_REQUESTS) or
+                self.server_config.get(config.MAX_RSS_MB)):
+            ioloop.PeriodicCallback(self.check_limits,
+                                    self.RECYCLE_CHECK_INTERVAL * 1000,
+                                    self.ioloop).start()
+
+        # Measure the IOLoop lag and capture the stacks of blocking callbacks
+        if self.watchdog:
+            self.watchdog.start()
 
         # Start the IOLoop, blocking until it is stopped
         try:
@@ -146,6 +361,21 @@ class Process(multiprocessing.Process):
         except KeyboardInterrupt:
             pass
 
+        # Close the shared resources and write any queued access log records
+        self.app.close()
+
+    @property
+    def worker_stats(self):
+        """Return the recorder for the area of this process's slot in the
+        shared request statistics, if the controller allocated them.
+
+        :rtype: tinman.stats.WorkerStats
+
+        """
+        if self.stats:
+            return self.stats.worker(self.stats.slot(self.port, self.worker),
+                                     self.stats_area)
+
     @property
     def settings(self):
         """Return the Application configuration
@@ -153,14 +383,29 @@ class Process(multiprocessing.Process):
         :rtype: dict
 
         """
-        return dict(self.namespace.config)
+        return copy.deepcopy(self.snapshot.config)
+
+    @property
+    def server_config(self):
+        """Return the HTTPServer configuration for the port the process is
+        listening on. Settings in the port's entry in the ports list override
+        the HTTPServer wide settings.
+
+        :rtype: dict
+
+        """
+        server_config = dict(self.snapshot.server)
+        for value in server_config.get(config.PORTS) or []:
+            if isinstance(value, dict) and value.get(config.PORT) == self.port:
+                server_config.update(value)
+        return server_config
 
     def setup_logging(self):
-        return helper_config.LoggingConfig(self.namespace.logging)
+        return helper_config.LoggingConfig(copy.deepcopy(self.snapshot.logging))
 
     @property
     def newrelic_ini_path(self):
-        return self.namespace.config.get(config.NEWRELIC)
+        return self.snapshot.config.get(config.NEWRELIC)
 
     def setup_newrelic(self):
         """Setup the NewRelic python agent"""
@@ -169,11 +414,17 @@ class Process(multiprocessing.Process):
 
     def setup_signal_handlers(self):
         """Called when a child process is spawned to register the signal
-        handlers
+        handlers, restoring the default handlers for the signals the
+        controller handles so they are not invoked on the controller state
+        copied into the child. SIGTERM drains the process like SIGABRT.
 
         """
         LOGGER.debug('Registering signal handlers')
+        for signum in self.DEFAULT_SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
         signal.signal(signal.SIGABRT, self.on_sigabrt)
+        signal.signal(signal.SIGHUP, self.on_sighup)
+        signal.signal(signal.SIGTERM, self.on_sigabrt)
 
     @property
     def ssl_options(self):
@@ -184,14 +435,44 @@ class Process(multiprocessing.Process):
         :rtype: dict
 
         """
-        opts = self.namespace.server.get(config.SSL_OPTIONS) or dict()
+        opts = dict(self.server_config.get(config.SSL_OPTIONS) or dict())
         if config.CERT_REQS in opts:
             opts[config.CERT_REQS] = \
                 self.CERT_REQUIREMENTS[opts[config.CERT_REQS]]
         return opts or None
 
+    def bind_sockets(self, port):
+        """Bind the listening sockets for a worker that does not share the
+        sockets bound by the controller, either its own Unix socket or a TCP
+        socket with SO_REUSEPORT.
+
+        :param int port: The port the worker is configured for
+        :rtype: list
+
+        """
+        server_config = self.server_config
+        backlog = server_config.get(config.BACKLOG, sockets.DEFAULT_BACKLOG)
+        unix_socket = server_config.get(config.UNIX_SOCKET)
+        if unix_socket:
+            path = sockets.unix_path(unix_socket[config.PATH], port,
+                                     self.worker)
+            LOGGER.info('Binding listening socket to %s', path)
+            value = sockets.bind_unix(path,
+                                      unix_socket.get(config.MODE,
+                                                      sockets.DEFAULT_MODE),
+                                      backlog, self.replace_socket)
+            self.unix_socket = path, sockets.inode(path)
+            return value
+        family = server_config.get(config.FAMILY)
+        return sockets.bind(port, server_config.get(config.ADDRESS),
+                            sockets.family(family), backlog,
+                            reuse_port=True,
+                            dual_stack=family == sockets.DUAL_STACK)
+
     def start_http_server(self, port, args):
-        """Start the HTTPServer
+        """Start the HTTPServer, accepting on the listening sockets inherited
+        from the controller or binding its own if the controller did not bind
+        any for the port.
 
         :param int port: The port to run the HTTPServer on
         :param dict args: Dictionary of arguments for HTTPServer
@@ -199,9 +480,10 @@ class Process(multiprocessing.Process):
 
         """
         # Start the HTTP Server
-        LOGGER.info("Starting Tornado v%s HTTPServer on port %i Args: %r",
-                    tornado_version, port, args)
+        LOGGER.info("Starting Tornado v%s HTTPServer worker %i on port %i "
+                    "Args: %r", tornado_version, self.worker, port, args)
         http_server = httpserver.HTTPServer(self.app, **args)
-        http_server.bind(port, family=socket.AF_INET)
-        http_server.start(1)
+        if not self.sockets:
+            self.sockets = self.bind_sockets(port)
+        http_server.add_sockets(self.sockets)
         return http_server
@@ -0,0 +1,190 @@
+"""
+Route dispatch index that narrows the URL specs a request path has to be
+matched against. Routes with a literal pattern are found with a dictionary
+lookup and routes with a regex pattern are only tried if the request path
+starts with the literal prefix of their pattern. The prefixes are kept in a
+dictionary per prefix length, so finding the candidates for a path takes one
+lookup for each distinct prefix length instead of one for each route.
+Candidates are tried in their original order, so the first route in the route
+table to match the request path is always the one that is used, the same as
+trying every route's regex in order.
+
+"""
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+# Characters with a special meaning in a regex outside of a character class
+METACHARACTERS = frozenset('.^$*+?{}[]|()\\')
+
+# Characters that make the character before them optional or repeated
+QUANTIFIERS = frozenset('*+?{')
+
+
+def literal_path(pattern):
+    """Return the path a pattern matches if it only matches one path, or None
+    if it is a regex.
+
+    :param str pattern: The URL pattern
+    :rtype: str|None
+
+    """
+    if not pattern.endswith('$') or pattern.endswith('\\$'):
+        return None
+    prefix, offset = literal_prefix(pattern)
+    return prefix if offset == len(pattern) - 1 else None
+
+
+def literal_prefix(pattern):
+    """Return the literal prefix every path the pattern matches starts with
+    and the offset in the pattern the prefix ends at.
+
+    :param str pattern: The URL pattern
+    :rtype: tuple(str, int)
+
+    """
+    if _has_alternation(pattern):
+        return '', 0
+    prefix, offset = list(), 0
+    while offset < len(pattern):
+        char = pattern[offset]
+        width = 1
+        if char == '\\':
+            if (offset + 1 == len(pattern) or
+                    pattern[offset + 1].isalnum()):
+                break
+            char, width = pattern[offset + 1], 2
+        elif char in METACHARACTERS:
+            break
+        if (offset + width < len(pattern) and
+                pattern[offset + width] in QUANTIFIERS):
+            break
+        prefix.append(char)
+        offset += width
+    return ''.join(prefix), offset
+
+
+def _has_alternation(pattern):
+    """Return True if the pattern has an alternation outside of a group or
+    sets inline flags, either of which mean its leading characters are not
+    required.
+
+    :param str pattern: The URL pattern
+    :rtype: bool
+
+    """
+    if '(?' in pattern and not all([pattern[offset + 2:offset + 3] in
+                                    (':', 'P', '=', '!', '<', '#')
+                                    for offset in _find_all(pattern, '(?')]):
+        return True
+    depth, in_class, offset = 0, False, 0
+    while offset < len(pattern):
+        char = pattern[offset]
+        if char == '\\':
+            offset += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+            if pattern[offset + 1:offset + 2] == '^':
+                offset += 1
+            if pattern[offset + 1:offset + 2] == ']':
+                offset += 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return True
+        offset += 1
+    return False
+
+
+def _find_all(value, substring):
+    """Return the offsets of every occurrence of the substring in the value.
+
+    :param str value: The value to search
+    :param str substring: The substring to find
+    :rtype: list
+
+    """
+    offsets, offset = list(), value.find(substring)
+    while offset >= 0:
+        offsets.append(offset)
+        offset = value.find(substring, offset + 1)
+    return offsets
+
+
+class RouteIndex(object):
+    """Dispatch index for a list of URL specs. The index is built from the
+    list when it is created and does not follow later changes to it, so it
+    has to be replaced when the routes change.
+
+    """
+    def __init__(self, specs):
+        """Build the index for the URL specs.
+
+        :param list specs: The URL specs in the order they are matched in
+
+        """
+        self.size = len(specs)
+        self.specs = specs
+        self._literals = dict()
+        self._prefixes = dict()
+        for position, spec in enumerate(specs):
+            pattern = spec.regex.pattern
+            path = literal_path(pattern)
+            if path is not None:
+                self._literals.setdefault(path, (position, spec))
+            else:
+                self._prefixes.setdefault(literal_prefix(pattern)[0],
+                                          []).append((position, spec))
+        self._lengths = sorted(set([len(prefix)
+                                    for prefix in self._prefixes]))
+        LOGGER.debug('Indexed %i literal and %i regex routes',
+                      len(self._literals), self.size - len(self._literals))
+
+    def match(self, path):
+        """Return the first URL spec that matches the path and its regex match,
+        or (None, None) if no route matches.
+
+        :param str path: The request path
+        :rtype: tuple(tornado.web.URLSpec, re.MatchObject)
+
+        """
+        literal = self._literals.get(path)
+        if literal is None and path.endswith('\n'):
+            literal = self._literals.get(path[:-1])
+        limit = literal[0] if literal else self.size
+        for position, spec in self._candidates(path):
+            if position >= limit:
+                break
+            match = spec.regex.match(path)
+            if match:
+                return spec, match
+        if literal:
+            return literal[1], literal[1].regex.match(path)
+        return None, None
+
+    def _candidates(self, path):
+        """Return the regex routes whose literal prefix the path starts with,
+        in route table order.
+
+        :param str path: The request path
+        :rtype: list
+
+        """
+        candidates = None
+        for length in self._lengths:
+            if length > len(path):
+                break
+            value = self._prefixes.get(path[:length])
+            if not value:
+                continue
+            if candidates is None:
+                candidates = value
+            else:
+                candidates = sorted(candidates + value,
+                                    key=lambda candidate: candidate[0])
+        return candidates or []
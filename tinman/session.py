@@ -2,6 +2,7 @@
 Tinman session classes for the management of session data
 
 """
+import functools
 from tornado import gen
 import logging
 import os
@@ -27,15 +28,19 @@ class Session(mapping.Mapping):
     last_request_at = None
     last_request_uri = None
 
-    def __init__(self, session_id=None, duration=3600, settings=None):
+    def __init__(self, session_id=None, duration=3600, settings=None,
+                 attributes=None):
         """Create a new session instance. If no id is passed in, a new ID is
         created. If an id is passed in, load the session data from storage.
 
         :param str session_id: The session ID
         :param dict settings: Session object configuration
+        :param tinman.application.Attributes attributes: The application
+            attributes shared resources are kept in
 
         """
         super(Session, self).__init__()
+        self._attributes = attributes
         self._duration = duration
         self._settings = settings or dict()
         self.id = session_id or str(uuid.uuid4())
@@ -83,15 +88,19 @@ class FileSession(Session):
     """
     DEFAULT_SUBDIR = 'tinman'
 
-    def __init__(self, session_id=None, duration=None, settings=None):
+    def __init__(self, session_id=None, duration=None, settings=None,
+                 attributes=None):
         """Create a new session instance. If no id is passed in, a new ID is
         created. If an id is passed in, load the session data from storage.
 
         :param str session_id: The session ID
         :param dict settings: Session object configuration
+        :param tinman.application.Attributes attributes: The application
+            attributes shared resources are kept in
 
         """
-        super(FileSession, self).__init__(session_id, duration, settings)
+        super(FileSession, self).__init__(session_id, duration, settings,
+                                          attributes)
         self._storage_dir = self._setup_storage_dir()
         if settings.get('cleanup', True):
             self._cleanup()
@@ -201,35 +210,64 @@ class RedisSession(Session):
               name: session
               duration: 3600
 
+    The redis client is created the first time a session is used and is kept
+    in the application attributes, so it is shared by the sessions in a
+    worker process and disconnected when the application is closed. Sessions
+    created without the application attributes share a client kept on the
+    class instead.
+
     """
-    _redis_client = None
+    _redis_client_instance = None
+    REDIS_CLIENT = 'session_redis_client'
     REDIS_DB = 2
     REDIS_HOST = 'localhost'
     REDIS_PORT = 6379
 
-    def __init__(self, session_id, duration=None, settings=None):
+    def __init__(self, session_id, duration=None, settings=None,
+                 attributes=None):
         """Create a new redis session instance. If no id is passed in, a
         new ID is created. If an id is passed in, load the session data from
         storage.
 
         :param str session_id: The session ID
         :param dict config: Session object configuration
+        :param tinman.application.Attributes attributes: The application
+            attributes the redis client is kept in
 
         """
-        if not RedisSession._redis_client:
-            RedisSession._redis_connect(settings)
-        super(RedisSession, self).__init__(session_id, duration, settings)
+        if attributes is None:
+            if not RedisSession._redis_client_instance:
+                RedisSession._redis_client_instance = \
+                    self._redis_connect(settings or dict())
+        elif self.REDIS_CLIENT not in attributes:
+            attributes.register(self.REDIS_CLIENT,
+                                functools.partial(self._redis_connect,
+                                                  settings),
+                                self._redis_disconnect)
+        super(RedisSession, self).__init__(session_id, duration, settings,
+                                           attributes)
 
     @property
     def _key(self):
         return 's:%s' % self.id
 
+    @property
+    def _redis_client(self):
+        """Return the redis client shared by the sessions in this process.
+
+        :rtype: tornadoredis.Client
+
+        """
+        if self._attributes is None:
+            return RedisSession._redis_client_instance
+        return getattr(self._attributes, self.REDIS_CLIENT)
+
     @classmethod
     def _redis_connect(cls, settings):
-        """Connect to redis and assign the client to the RedisSession class
-        so that it is globally available in this process.
+        """Return a new redis client connected to the configured server.
 
         :param dict settings: The redis session configuration
+        :rtype: tornadoredis.Client
 
         """
         if 'tornadoredis' not in globals():
@@ -239,8 +277,18 @@ class RedisSession(Session):
                   'selected_db': settings.get('db', cls.REDIS_DB)}
         LOGGER.info('Connecting to %(host)s:%(port)s DB %(selected_db)s',
                     kwargs)
-        cls._redis_client = tornadoredis.Client(**kwargs)
-        cls._redis_client.connect()
+        client = tornadoredis.Client(**kwargs)
+        client.connect()
+        return client
+
+    @staticmethod
+    def _redis_disconnect(client):
+        """Disconnect the redis client when the application is closed.
+
+        :param tornadoredis.Client client: The redis client
+
+        """
+        client.disconnect()
 
     @gen.coroutine
     def delete(self):
@@ -249,7 +297,7 @@ class RedisSession(Session):
         :param method callback: The callback method to invoke when done
 
         """
-        result = yield gen.Task(RedisSession._redis_client.delete, self._key)
+        result = yield gen.Task(self._redis_client.delete, self._key)
         LOGGER.debug('Deleted session %s (%r)', self.id, result)
         self.clear()
         raise gen.Return(result)
@@ -262,7 +310,7 @@ class RedisSession(Session):
 
         """
         LOGGER.debug('Fetching session data: %s', self.id)
-        result = yield gen.Task(RedisSession._redis_client.get, self._key)
+        result = yield gen.Task(self._redis_client.get, self._key)
         if result:
             self.loads(result)
             raise gen.Return(True)
@@ -276,7 +324,7 @@ class RedisSession(Session):
         :param method callback: The callback method to invoke when done
 
         """
-        result = yield gen.Task(RedisSession._redis_client.set,
+        result = yield gen.Task(self._redis_client.set,
                                 self._key, self.dumps())
         LOGGER.debug('Saved session %s (%r)', self.id, result)
         raise gen.Return(result)
@@ -0,0 +1,130 @@
+"""
+Picklable configuration snapshots that are handed to each worker process when
+it is spawned. When the configuration is reloaded, the controller writes the
+new snapshot to a file that the workers read when they receive SIGHUP, so the
+size of the configuration never blocks the controller.
+
+A snapshot holds plain python data structures that are not shared with the
+controller's configuration objects. They are not frozen, so anything that
+modifies a value, such as the Application settings, must copy it first.
+
+"""
+import collections
+import copy
+import errno
+import logging
+import os
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import tempfile
+
+LOGGER = logging.getLogger(__name__)
+
+PREFIX = 'tinman-'
+SUFFIX = '.snapshot'
+
+Snapshot = collections.namedtuple('Snapshot', ['version', 'args', 'config',
+                                               'debug', 'logging', 'routes',
+                                               'server'])
+
+
+def create(version, args, config, debug, logging, routes, server):
+    """Create a new configuration snapshot, converting the configuration
+    values to plain python data structures so that the snapshot has no ties
+    to the controller's configuration objects.
+
+    :param int version: The snapshot version
+    :param argparse.Namespace args: The command line arguments
+    :param dict config: The Application configuration
+    :param bool debug: Is debugging enabled
+    :param dict logging: The Logging configuration
+    :param list routes: The Routes configuration
+    :param dict server: The HTTPServer configuration
+    :rtype: Snapshot
+
+    """
+    return Snapshot(version, args, _plain(config), debug, _plain(logging),
+                    _plain(routes), _plain(server) or dict())
+
+
+def create_file():
+    """Create the file snapshots are written to when the configuration is
+    reloaded, returning its path. The file is only readable by the user the
+    controller runs as.
+
+    :rtype: str
+
+    """
+    handle, path = tempfile.mkstemp(SUFFIX, PREFIX)
+    os.close(handle)
+    return path
+
+
+def read(path):
+    """Return the snapshot in the file at the path, or None if no snapshot
+    has been written to it.
+
+    :param str path: The path of the snapshot file
+    :rtype: Snapshot|None
+
+    """
+    try:
+        with open(path, 'rb') as handle:
+            return pickle.load(handle)
+    except EOFError:
+        return None
+    except (IOError, OSError) as error:
+        if error.errno != errno.ENOENT:
+            raise
+        return None
+
+
+def remove(path):
+    """Remove the snapshot file at the path.
+
+    :param str path: The path of the snapshot file
+
+    """
+    try:
+        os.remove(path)
+    except OSError as error:
+        LOGGER.debug('Error removing snapshot file %s: %s', path, error)
+
+
+def write(path, value):
+    """Write the snapshot to the file at the path. The snapshot is written to
+    a temporary file that then replaces the file at the path, so a worker
+    never reads a partially written snapshot.
+
+    :param str path: The path of the snapshot file
+    :param Snapshot value: The snapshot to write
+
+    """
+    handle, temp_path = tempfile.mkstemp(SUFFIX, PREFIX,
+                                         os.path.dirname(path))
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            pickle.dump(value, temp_file, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp_path, path)
+    except Exception:
+        remove(temp_path)
+        raise
+
+
+def _plain(value):
+    """Return a deep copy of the value with any configuration data objects
+    converted to dicts.
+
+    :param any value: The value to convert
+    :rtype: any
+
+    """
+    if hasattr(value, 'dict') and callable(value.dict):
+        value = value.dict()
+    if isinstance(value, dict):
+        return dict([(key, _plain(value[key])) for key in value])
+    elif isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return copy.deepcopy(value)
@@ -0,0 +1,237 @@
+"""
+Listening socket helpers used to bind a port once in the controller and share
+it across all of the worker processes for that port.
+
+"""
+import errno
+import logging
+import os
+import socket
+import stat
+from tornado.platform import auto
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BACKLOG = 128
+DEFAULT_MODE = 0o600
+
+#: Placeholders that are replaced in Unix socket paths
+PORT_VARIABLE = '{port}'
+WORKER_VARIABLE = '{worker}'
+
+#: Address families that may be configured for TCP listeners
+IPV4 = 'ipv4'
+IPV6 = 'ipv6'
+DUAL_STACK = 'dual'
+FAMILIES = {IPV4: socket.AF_INET,
+            IPV6: getattr(socket, 'AF_INET6', None),
+            DUAL_STACK: getattr(socket, 'AF_INET6', None)}
+
+
+def bind(port, address=None, family=socket.AF_INET, backlog=DEFAULT_BACKLOG,
+         reuse_port=False, dual_stack=False):
+    """Create, bind and return the listening sockets for the specified port.
+    When reuse_port is set, SO_REUSEPORT is enabled so that each worker may
+    bind its own socket to the same port, letting the kernel balance new
+    connections across them. When dual_stack is set, IPv6 sockets also accept
+    IPv4 connections as IPv4-mapped addresses.
+
+    :param int port: The port to bind to
+    :param str address: The optional address to bind to
+    :param int family: The socket address family
+    :param int backlog: The listen backlog
+    :param bool reuse_port: Enable SO_REUSEPORT on the sockets
+    :param bool dual_stack: Accept IPv4 connections on IPv6 sockets
+    :rtype: list
+    :raises: ValueError
+
+    """
+    if reuse_port and not hasattr(socket, 'SO_REUSEPORT'):
+        raise ValueError('SO_REUSEPORT is not supported on this platform')
+    if family is None:
+        raise ValueError('IPv6 is not supported on this platform')
+    sockets = list()
+    for info in set(socket.getaddrinfo(address, port, family,
+                                       socket.SOCK_STREAM, 0,
+                                       socket.AI_PASSIVE)):
+        af, socktype, proto, canonname_unused, sockaddr = info
+        try:
+            sock = socket.socket(af, socktype, proto)
+        except socket.error as error:
+            if error.args[0] == errno.EAFNOSUPPORT:
+                continue
+            raise
+        auto.set_close_exec(sock.fileno())
+        if os.name != 'nt':
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if af == socket.AF_INET6 and hasattr(socket, 'IPPROTO_IPV6'):
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY,
+                            0 if dual_stack else 1)
+        sock.setblocking(0)
+        sock.bind(sockaddr)
+        sock.listen(backlog)
+        LOGGER.debug('Bound listening socket to %r', sockaddr)
+        sockets.append(sock)
+    return sockets
+
+
+def bind_unix(path, mode=DEFAULT_MODE, backlog=DEFAULT_BACKLOG,
+              replace=False):
+    """Create, bind and return the listening socket for a Unix domain socket
+    at the specified path, replacing a stale socket file left at the path.
+    A socket file that another process is still listening on is only
+    replaced when replace is set, such as by a worker that is taking over
+    from the worker it replaces. The socket is returned in a list so it can
+    be used interchangeably with the sockets returned by :func:`bind`.
+
+    :param str path: The path of the socket file
+    :param int|str mode: The socket file permissions
+    :param int backlog: The listen backlog
+    :param bool replace: Replace the socket if it is in use
+    :rtype: list
+    :raises: ValueError
+
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise ValueError('Unix domain sockets are not supported on this '
+                         'platform')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    auto.set_close_exec(sock.fileno())
+    sock.setblocking(0)
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            sock.close()
+            raise ValueError('File %s exists and is not a socket' % path)
+        if not replace and in_use(path):
+            sock.close()
+            raise ValueError('Socket %s is in use by another process' % path)
+        LOGGER.debug('Removing socket file %s', path)
+        os.remove(path)
+    except OSError as error:
+        if error.errno != errno.ENOENT:
+            raise
+    sock.bind(path)
+    os.chmod(path, file_mode(mode))
+    sock.listen(backlog)
+    LOGGER.debug('Bound listening socket to %s', path)
+    return [sock]
+
+
+def in_use(path):
+    """Return True if a process is listening on the Unix domain socket at the
+    path, trying to connect to it. A socket that refuses the connection or was
+    removed in the meantime is stale.
+
+    :param str path: The path of the socket file
+    :rtype: bool
+
+    """
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    probe.settimeout(1)
+    try:
+        probe.connect(path)
+    except socket.error as error:
+        if error.errno in (errno.ECONNREFUSED, errno.ENOENT):
+            return False
+        LOGGER.debug('Could not connect to %s: %s', path, error)
+    finally:
+        probe.close()
+    return True
+
+
+def family(name):
+    """Return the socket address family for a configured family name,
+    defaulting to IPv4.
+
+    :param str name: One of ipv4, ipv6 or dual
+    :rtype: int
+    :raises: ValueError
+
+    """
+    if (name or IPV4) not in FAMILIES:
+        raise ValueError('Unsupported address family: %s' % name)
+    return FAMILIES[name or IPV4]
+
+
+def file_mode(value):
+    """Return the socket file permissions for a configured mode, which may
+    either be an integer or an octal string such as "0660".
+
+    :param int|str value: The configured mode
+    :rtype: int
+
+    """
+    if isinstance(value, int):
+        return value
+    return int(str(value), 8)
+
+
+def inode(path):
+    """Return the inode of the socket file at the path, used to make sure a
+    socket file is only removed by the process that bound it.
+
+    :param str path: The path of the socket file
+    :rtype: int|None
+
+    """
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+def remove_unix(path, bound_inode):
+    """Remove the socket file at the path if it is still the one that was
+    bound, leaving it in place if another process has since replaced it.
+
+    :param str path: The path of the socket file
+    :param int bound_inode: The inode of the socket file when it was bound
+
+    """
+    if bound_inode is not None and inode(path) == bound_inode:
+        LOGGER.debug('Removing socket file %s', path)
+        try:
+            os.remove(path)
+        except OSError as error:
+            LOGGER.debug('Error removing socket file %s: %s', path, error)
+
+
+def is_per_worker(path):
+    """Return True if the Unix socket path contains the worker number
+    placeholder, meaning each worker binds its own socket file.
+
+    :param str path: The configured socket file path
+    :rtype: bool
+
+    """
+    return WORKER_VARIABLE in path
+
+
+def unix_path(path, port, worker=0):
+    """Return the socket file path with the port and worker number
+    placeholders replaced.
+
+    :param str path: The configured socket file path
+    :param int port: The port the workers are configured for
+    :param int worker: The worker number
+    :rtype: str
+
+    """
+    return path.replace(PORT_VARIABLE,
+                        str(port)).replace(WORKER_VARIABLE, str(worker))
+
+
+def close(sockets):
+    """Close the list of listening sockets, ignoring sockets that are already
+    closed.
+
+    :param list sockets: The sockets to close
+
+    """
+    for sock in sockets or []:
+        try:
+            sock.close()
+        except socket.error as error:
+            LOGGER.debug('Error closing socket: %s', error)
@@ -0,0 +1,415 @@
+"""
+Cross-worker request statistics kept in a shared memory area that is allocated
+by the controller before the workers are forked. Each worker records request
+counts, status classes and latency histograms per route in its own area of the
+shared memory, so there is no locking or IPC on the request path, and any
+process on the host can read an aggregated view of the whole fleet.
+
+Each worker slot has two areas. When a worker is recycled or replaced by a
+rolling restart, its replacement records in the area the worker is not using,
+so the two processes never write to the same counters while both are running.
+
+The routes are fixed when the shared memory is allocated, so requests for
+routes that are added by a SIGHUP reload are recorded under the other route
+until the controller is restarted.
+
+"""
+import bisect
+import ctypes
+import logging
+import multiprocessing
+
+LOGGER = logging.getLogger(__name__)
+
+#: Upper bounds in seconds for the request latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: The route name requests are recorded under when their route is not known
+OTHER = 'other'
+
+#: The content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+#: The number of areas allocated for each worker slot
+AREAS = 2
+
+# Per-slot header fields
+EXITS = 0
+RESPAWNS = 1
+SHED = 2
+HEADER_FIELDS = 3
+
+# Per-route fields
+REQUESTS = 0
+IN_FLIGHT = 1
+STATUS = 2
+LATENCY = STATUS + len(STATUS_CLASSES)
+LATENCY_SUM = LATENCY + len(BUCKETS) + 1
+ROUTE_FIELDS = LATENCY_SUM + 1
+
+
+def prometheus(value):
+    """Return statistics returned by :meth:`Stats.as_dict` in the Prometheus
+    text exposition format.
+
+    :param dict value: The statistics
+    :rtype: str
+
+    """
+    lines = list()
+
+    def metric(name, kind, description, samples):
+        lines.append('# HELP %s %s' % (name, description))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for suffix, labels, sample in samples:
+            lines.append('%s%s{%s} %s' % (
+                name, suffix,
+                ','.join(['%s="%s"' % (label, _escape(label_value))
+                          for label, label_value in labels]),
+                _number(sample)))
+
+    routes = sorted(value['routes'].items())
+    metric('tinman_requests_total', 'counter',
+           'Requests completed by route and status class',
+           [('', [('route', pattern), ('code', name)], count)
+            for pattern, route in routes
+            for name, count in sorted(route['status'].items())])
+    metric('tinman_requests_in_flight', 'gauge',
+           'Requests in flight by route',
+           [('', [('route', pattern)], route['in_flight'])
+            for pattern, route in routes])
+    samples = list()
+    for pattern, route in routes:
+        for bound, count in route['latency']['buckets']:
+            samples.append(('_bucket', [('route', pattern), ('le', bound)],
+                            count))
+        samples.append(('_sum', [('route', pattern)],
+                        route['latency']['sum']))
+        samples.append(('_count', [('route', pattern)], route['requests']))
+    metric('tinman_request_duration_seconds', 'histogram',
+           'Request duration in seconds by route', samples)
+    for name, key, description in [
+            ('tinman_requests_shed_total', 'shed',
+             'Requests shed by admission control'),
+            ('tinman_worker_exits_total', 'exits', 'Worker process exits'),
+            ('tinman_worker_respawns_total', 'respawns',
+             'Worker process respawns')]:
+        metric(name, 'counter', description,
+               [('', [('port', worker['port']),
+                      ('worker', worker['worker'])], worker[key])
+                for worker in value['workers']])
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    """Escape a Prometheus label value.
+
+    :param any value: The label value
+    :rtype: str
+
+    """
+    return str(value).replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    """Return a sample value in the form Prometheus expects.
+
+    :param int|float value: The sample value
+    :rtype: str
+
+    """
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def route_pattern(route):
+    """Return the URL pattern for a route from the Routes configuration, in
+    the same form as the regex tornado compiles for it.
+
+    :param list route: The route configuration
+    :rtype: str
+
+    """
+    pattern = route[1] if route[0] == 're' else route[0]
+    return pattern if pattern.endswith('$') else '%s$' % pattern
+
+
+class Stats(object):
+    """Shared memory request statistics for all of the worker slots on the
+    host. Create before forking the workers and pass each worker its slot and
+    area via :meth:`Stats.worker`.
+
+    Counters are unsigned integers that are only ever written by the worker
+    process that owns the area, with the exception of the exit and respawn
+    counters that are written by the controller. The controller must not
+    assign an area to a new worker while another worker is using it.
+
+    """
+    def __init__(self, routes, slots):
+        """Allocate the shared memory area for the routes and slots.
+
+        :param list routes: The Routes configuration
+        :param list slots: A list of (port, worker) tuples, one per slot
+
+        """
+        self.routes = [route_pattern(route) for route in routes or []
+                       if isinstance(route, (list, tuple))] + [OTHER]
+        self.slots = list(slots)
+        self._route_index = dict([(pattern, offset) for offset, pattern
+                                  in enumerate(self.routes)])
+        self._slot_size = HEADER_FIELDS + len(self.routes) * ROUTE_FIELDS
+        self._values = multiprocessing.RawArray(ctypes.c_ulonglong,
+                                                len(self.slots) * AREAS *
+                                                self._slot_size)
+        LOGGER.debug('Allocated %i bytes for %i routes across %i slots',
+                     ctypes.sizeof(self._values), len(self.routes),
+                     len(self.slots))
+
+    def add_exit(self, slot):
+        """Increment the exit counter for the slot.
+
+        :param int slot: The worker slot
+
+        """
+        self._values[self._area_offset(slot, 0) + EXITS] += 1
+
+    def add_respawn(self, slot):
+        """Increment the respawn counter for the slot.
+
+        :param int slot: The worker slot
+
+        """
+        self._values[self._area_offset(slot, 0) + RESPAWNS] += 1
+
+    def add_in_flight(self, slot, pattern, area=0):
+        """Increment the requests in flight gauge for the route in the slot.
+
+        :param int slot: The worker slot
+        :param str pattern: The route URL pattern
+        :param int area: The area of the slot the worker records in
+
+        """
+        self._values[self._pattern_offset(slot, area, pattern) +
+                     IN_FLIGHT] += 1
+
+    def add_shed(self, slot, area=0):
+        """Increment the shed request counter for the slot.
+
+        :param int slot: The worker slot
+        :param int area: The area of the slot the worker records in
+
+        """
+        self._values[self._area_offset(slot, area) + SHED] += 1
+
+    def as_dict(self, port=None):
+        """Return the statistics aggregated across every slot, or only the
+        slots for the port if it is specified, along with the per-worker
+        totals.
+
+        :param int port: Only include the workers for this port
+        :rtype: dict
+
+        """
+        slots = [slot for slot, (slot_port, worker_unused)
+                 in enumerate(self.slots) if port in (None, slot_port)]
+        areas = [(slot, area) for slot in slots for area in range(0, AREAS)]
+        routes = dict()
+        for offset, pattern in enumerate(self.routes):
+            routes[pattern] = self._route_dict(
+                [self._route_offset(slot, area, offset)
+                 for slot, area in areas])
+        workers = list()
+        for slot in slots:
+            slot_port, worker = self.slots[slot]
+
+            def total(field):
+                return sum([self._values[self._area_offset(slot, area) +
+                                         field] for area in range(0, AREAS)])
+
+            workers.append({'port': slot_port,
+                            'worker': worker,
+                            'exits': total(EXITS),
+                            'respawns': total(RESPAWNS),
+                            'shed': total(SHED),
+                            'requests': sum([
+                                self._values[self._route_offset(slot, area,
+                                                                route)]
+                                for area in range(0, AREAS)
+                                for route in range(0, len(self.routes))])})
+        return {'routes': routes, 'workers': workers}
+
+    def record(self, slot, pattern, status_code, request_time, area=0):
+        """Record a completed request for the route in the slot.
+
+        :param int slot: The worker slot
+        :param str pattern: The route URL pattern
+        :param int status_code: The response status code
+        :param float request_time: The request duration in seconds
+        :param int area: The area of the slot the worker records in
+
+        """
+        offset = self._pattern_offset(slot, area, pattern)
+        values = self._values
+        values[offset + REQUESTS] += 1
+        status_class = status_code // 100
+        if 1 <= status_class <= len(STATUS_CLASSES):
+            values[offset + STATUS + status_class - 1] += 1
+        values[offset + LATENCY +
+               bisect.bisect_left(BUCKETS, request_time)] += 1
+        values[offset + LATENCY_SUM] += int(request_time * 1000000)
+
+    def remove_in_flight(self, slot, pattern, area=0):
+        """Decrement the requests in flight gauge for the route in the slot.
+
+        :param int slot: The worker slot
+        :param str pattern: The route URL pattern
+        :param int area: The area of the slot the worker records in
+
+        """
+        offset = self._pattern_offset(slot, area, pattern) + IN_FLIGHT
+        if self._values[offset]:
+            self._values[offset] -= 1
+
+    def reset_in_flight(self, slot, area=0):
+        """Zero the requests in flight gauges for every route in the area of
+        the slot. Invoked by the controller before it starts a worker on the
+        area, so requests left in flight by a worker that crashed or was
+        killed are not counted for good.
+
+        :param int slot: The worker slot
+        :param int area: The area of the slot
+
+        """
+        for route in range(0, len(self.routes)):
+            self._values[self._route_offset(slot, area, route) +
+                         IN_FLIGHT] = 0
+
+    def slot(self, port, worker):
+        """Return the slot number for the port and worker number.
+
+        :param int port: The port
+        :param int worker: The worker number
+        :rtype: int
+
+        """
+        return self.slots.index((port, worker))
+
+    def worker(self, slot, area=0):
+        """Return the statistics recorder for a worker slot.
+
+        :param int slot: The worker slot
+        :param int area: The area of the slot the worker records in
+        :rtype: WorkerStats
+
+        """
+        return WorkerStats(self, slot, area)
+
+    def _route_dict(self, offsets):
+        """Return the aggregated values for a route at the offsets.
+
+        :param list offsets: The route offsets to aggregate
+        :rtype: dict
+
+        """
+        def total(field):
+            return sum([self._values[offset + field] for offset in offsets])
+
+        buckets, cumulative = list(), 0
+        for index, bound in enumerate(BUCKETS + ('+Inf',)):
+            cumulative += total(LATENCY + index)
+            buckets.append((bound, cumulative))
+        return {'requests': total(REQUESTS),
+                'in_flight': total(IN_FLIGHT),
+                'status': dict([(name, total(STATUS + index))
+                                for index, name
+                                in enumerate(STATUS_CLASSES)]),
+                'latency': {'buckets': buckets,
+                            'sum': total(LATENCY_SUM) / 1000000.0}}
+
+    def _area_offset(self, slot, area):
+        """Return the offset in the shared memory for the area of the slot.
+
+        :param int slot: The worker slot
+        :param int area: The area of the slot
+        :rtype: int
+
+        """
+        return (slot * AREAS + area) * self._slot_size
+
+    def _pattern_offset(self, slot, area, pattern):
+        """Return the offset in the shared memory for the route with the URL
+        pattern in the area of the slot, using the other route for unknown
+        patterns.
+
+        :param int slot: The worker slot
+        :param int area: The area of the slot
+        :param str pattern: The route URL pattern
+        :rtype: int
+
+        """
+        return self._route_offset(slot, area, self._route_index.get(
+            pattern, len(self.routes) - 1))
+
+    def _route_offset(self, slot, area, route):
+        """Return the offset in the shared memory for the route in the area of
+        the slot.
+
+        :param int slot: The worker slot
+        :param int area: The area of the slot
+        :param int route: The route number
+        :rtype: int
+
+        """
+        return (self._area_offset(slot, area) + HEADER_FIELDS +
+                route * ROUTE_FIELDS)
+
+
+class WorkerStats(object):
+    """The statistics recorder used by a worker to record requests in its
+    area of its slot in the shared statistics.
+
+    """
+    def __init__(self, stats, slot, area=0):
+        """Create a recorder for the area of the slot.
+
+        :param Stats stats: The shared statistics
+        :param int slot: The worker slot
+        :param int area: The area of the slot to record in
+
+        """
+        self.fleet = stats
+        self.slot = slot
+        self.area = area
+
+    def add_in_flight(self, pattern):
+        """Increment the requests in flight gauge for the route.
+
+        :param str pattern: The route URL pattern
+
+        """
+        self.fleet.add_in_flight(self.slot, pattern, self.area)
+
+    def add_shed(self):
+        """Increment the shed request counter."""
+        self.fleet.add_shed(self.slot, self.area)
+
+    def remove_in_flight(self, pattern):
+        """Decrement the requests in flight gauge for the route.
+
+        :param str pattern: The route URL pattern
+
+        """
+        self.fleet.remove_in_flight(self.slot, pattern, self.area)
+
+    def record(self, pattern, status_code, request_time):
+        """Record a completed request.
+
+        :param str pattern: The route URL pattern
+        :param int status_code: The response status code
+        :param float request_time: The request duration in seconds
+
+        """
+        self.fleet.record(self.slot, pattern, status_code, request_time,
+                          self.area)
@@ -1,19 +1,221 @@
 """
-Tornado Output Transforming Classes
+Tornado Output Transforming Classes. The transforms rewrite the response body
+a chunk at a time as it is flushed, carrying the state they need from one
+chunk to the next, so a streamed response is transformed the same way as one
+that is written all at once.
 
 """
+import re
+import zlib
+
 from tornado import web
 
+BROTLI = 'br'
+DEFLATE = 'deflate'
+GZIP = 'gzip'
+
+DEFAULT_CONTENT_TYPES = ('application/javascript', 'application/json',
+                         'application/xhtml+xml', 'application/xml',
+                         'image/svg+xml', 'text/css', 'text/csv',
+                         'text/html', 'text/javascript', 'text/plain',
+                         'text/xml')
+DEFAULT_LEVEL = 6
+DEFAULT_MIN_SIZE = 1024
+
+# zlib window bits for each content encoding
+WBITS = {DEFLATE: zlib.MAX_WBITS, GZIP: 16 + zlib.MAX_WBITS}
+
+NEWLINES = re.compile(b'\n+')
+
+
+def accepted_encodings(request):
+    """Return the quality value of each content encoding in the request's
+    Accept-Encoding header.
+
+    :param tornado.httpserver.HTTPRequest request: The request
+    :rtype: dict
+
+    """
+    accepted = dict()
+    for value in request.headers.get('Accept-Encoding', '').split(','):
+        parts = value.split(';')
+        quality = 1.0
+        for parameter in parts[1:]:
+            name, _sep, number = parameter.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        accepted[parts[0].strip().lower()] = quality
+    return accepted
+
+
+def content_type(headers):
+    """Return the media type of the response without its parameters.
+
+    :param tornado.httputil.HTTPHeaders headers: The response headers
+    :rtype: str
+
+    """
+    return headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+
+class StreamingTransform(web.OutputTransform):
+    """Base class for transforms that rewrite the response body. Subclasses
+    decide if the transform applies to a response in applies, which is
+    invoked with the first chunk, and rewrite each chunk in transform_body.
+    A response that has its Content-Length set before the last chunk is
+    passed through, since its length can not be changed once the headers
+    are sent.
+
+    """
+    def __init__(self, request):
+        super(StreamingTransform, self).__init__(request)
+        self._active = False
+
+    def applies(self, status_code, headers, chunk, finishing):
+        """Return True if the body of the response should be transformed.
+
+        :param int status_code: The response status code
+        :param tornado.httputil.HTTPHeaders headers: The response headers
+        :param bytes chunk: The first chunk of the body
+        :param bool finishing: The first chunk is the whole body
+        :rtype: bool
+
+        """
+        return True
+
+    def transform_body(self, chunk, finishing):
+        """Return the transformed chunk of the body.
+
+        :param bytes chunk: The chunk of the body
+        :param bool finishing: The chunk is the last one
+        :rtype: bytes
 
-class StripBlankLines(web.OutputTransform):
+        """
+        raise NotImplementedError
 
     def transform_first_chunk(self, status_code, headers, chunk, finishing):
-        content_type = headers.get("Content-Type", "").split(";")[0]
-        if content_type.split('/')[0] == 'text':
-            chunk = self.transform_chunk(chunk, finishing)
-            if "Content-Length" in headers:
-                headers["Content-Length"] = str(len(chunk))
+        self._active = ((finishing or 'Content-Length' not in headers) and
+                        self.applies(status_code, headers, chunk, finishing))
+        if self._active:
+            chunk = self.transform_body(chunk, finishing)
+            if 'Content-Length' in headers:
+                headers['Content-Length'] = str(len(chunk))
         return status_code, headers, chunk
 
     def transform_chunk(self, chunk, finishing):
-        return '\n'.join([line for line in chunk.split('\n') if line])
+        if self._active:
+            return self.transform_body(chunk, finishing)
+        return chunk
+
+
+class StripBlankLines(StreamingTransform):
+    """Remove the blank lines from text responses. A run of newlines that is
+    split across chunks is collapsed the same as one inside a chunk.
+
+    """
+    def __init__(self, request):
+        super(StripBlankLines, self).__init__(request)
+        self._newline = False
+        self._started = False
+
+    def applies(self, status_code, headers, chunk, finishing):
+        return content_type(headers).split('/')[0] == 'text'
+
+    def transform_body(self, chunk, finishing):
+        body = chunk.strip(b'\n')
+        if not body:
+            self._newline = self._newline or bool(chunk)
+            return b''
+        prefix = b''
+        if self._started and (self._newline or chunk[0:1] == b'\n'):
+            prefix = b'\n'
+        self._newline = chunk[-1:] == b'\n'
+        self._started = True
+        return prefix + NEWLINES.sub(b'\n', body)
+
+
+class ContentEncoding(StreamingTransform):
+    """Compress responses with gzip or deflate, whichever the client accepts,
+    preferring gzip. Only responses with one of the configured content types
+    are compressed and responses written all at once are only compressed if
+    they are at least min_size bytes. Each chunk is compressed as it is
+    flushed, so streamed responses reach the client as they are written.
+
+    Use the transform in place of the gzip application setting:
+
+        Application:
+          transforms:
+            - name: tinman.transforms.ContentEncoding
+              level: 6
+              min_size: 1024
+              content_types:
+                - application/json
+                - text/*
+
+    """
+    def __init__(self, request, level=DEFAULT_LEVEL,
+                 min_size=DEFAULT_MIN_SIZE, content_types=None):
+        """Create the transform for the request.
+
+        :param tornado.httpserver.HTTPRequest request: The request
+        :param int level: The compression level, 1 to 9
+        :param int min_size: The smallest response body to compress
+        :param list content_types: The content types to compress, where
+            type/* matches any subtype
+
+        """
+        super(ContentEncoding, self).__init__(request)
+        self.content_types = frozenset(content_types or DEFAULT_CONTENT_TYPES)
+        self.encoding = self._accepted_encoding(request)
+        self.level = level
+        self.min_size = min_size
+        self._compressor = None
+
+    def applies(self, status_code, headers, chunk, finishing):
+        value = content_type(headers)
+        return bool(self.encoding and
+                    'Content-Encoding' not in headers and
+                    (value in self.content_types or
+                     '%s/*' % value.split('/')[0] in self.content_types) and
+                    (not finishing or len(chunk) >= self.min_size))
+
+    def transform_body(self, chunk, finishing):
+        if self._compressor is None:
+            self._compressor = zlib.compressobj(self.level, zlib.DEFLATED,
+                                                WBITS[self.encoding])
+        value = self._compressor.compress(chunk)
+        if finishing:
+            return value + self._compressor.flush(zlib.Z_FINISH)
+        return value + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def transform_first_chunk(self, status_code, headers, chunk, finishing):
+        vary = headers.get('Vary')
+        if not vary:
+            headers['Vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            headers['Vary'] = '%s, Accept-Encoding' % vary
+        status_code, headers, chunk = \
+            super(ContentEncoding, self).transform_first_chunk(status_code,
+                                                               headers, chunk,
+                                                               finishing)
+        if self._active:
+            headers['Content-Encoding'] = self.encoding
+        return status_code, headers, chunk
+
+    @staticmethod
+    def _accepted_encoding(request):
+        """Return the content encoding to use for the request, or None if the
+        client does not accept gzip or deflate.
+
+        :param tornado.httpserver.HTTPRequest request: The request
+        :rtype: str|None
+
+        """
+        accepted = accepted_encodings(request)
+        for encoding in [GZIP, DEFLATE]:
+            if accepted.get(encoding, 0.0) > 0.0:
+                return encoding
+        return None
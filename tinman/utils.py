@@ -4,8 +4,15 @@
 """
 import importlib
 import os
+import resource
 import sys
 from socket import gethostname
+from tornado import gen
+from tornado import iostream
+from tornado import version_info
+
+#: Tornado 4.0 and later return a future from RequestHandler.flush
+FLUSH_FUTURE = version_info >= (4, 0)
 
 
 def application_name():
@@ -17,6 +24,25 @@ def application_name():
     return os.path.split(sys.argv[0])[1]
 
 
+@gen.coroutine
+def flush(handler):
+    """Flush the output of the request handler, waiting for it to be written
+    to the client. Raises tornado.iostream.StreamClosedError if the client has
+    closed the connection, since the flush callback of versions of Tornado
+    before 4.0 is never run once the stream is closed.
+
+    :param tornado.web.RequestHandler handler: The request handler
+    :raises: tornado.iostream.StreamClosedError
+
+    """
+    if FLUSH_FUTURE:
+        yield handler.flush()
+    else:
+        if handler.request.connection.stream.closed():
+            raise iostream.StreamClosedError()
+        yield gen.Task(handler.flush)
+
+
 def hostname():
     """Returns the hostname for the machine we're running on
 
@@ -26,6 +52,21 @@ def hostname():
     return gethostname().split(".")[0]
 
 
+def resident_memory():
+    """Returns the resident set size of the current process in bytes, falling
+    back to the peak resident set size where /proc is not available.
+
+    :rtype: int
+
+    """
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        value = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return value if sys.platform == 'darwin' else value * 1024
+
+
 def import_namespaced_class(path):
     """Pass in a string in the format of foo.Bar, foo.bar.Baz, foo.bar.baz.Qux
     and it will return a handle to the class
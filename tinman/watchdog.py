@@ -0,0 +1,145 @@
+"""
+IOLoop watchdog that measures how late the IOLoop runs its scheduled
+callbacks and captures the stack of any callback that blocks the IOLoop for
+longer than a threshold, using the IOLoop's blocking signal threshold support.
+
+"""
+import collections
+import logging
+import traceback
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.1
+DEFAULT_MAX_STACKS = 10
+DEFAULT_THRESHOLD = 0.5
+
+#: The number of recent lag samples percentiles are calculated from
+SAMPLES = 1024
+
+#: The number of distinct blocking stacks that are counted
+MAX_TRACKED_STACKS = 100
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, value):
+    """Return the percentile of a sorted list of values using the nearest
+    rank method.
+
+    :param list values: The sorted values
+    :param int value: The percentile to return
+    :rtype: float
+
+    """
+    if not values:
+        return 0.0
+    return values[max(0, int(round(value / 100.0 * len(values))) - 1)]
+
+
+class Watchdog(object):
+    """Measures the scheduling lag of the IOLoop by comparing when a timeout
+    was due with when it was run, and counts the stacks of callbacks that
+    block the IOLoop for longer than the threshold.
+
+    """
+    def __init__(self, io_loop, interval=DEFAULT_INTERVAL,
+                 threshold=DEFAULT_THRESHOLD, max_stacks=DEFAULT_MAX_STACKS):
+        """Create a new watchdog for the IOLoop.
+
+        :param tornado.ioloop.IOLoop io_loop: The IOLoop to watch
+        :param float interval: Seconds between lag samples
+        :param float threshold: Seconds a callback may block before its
+            stack is captured
+        :param int max_stacks: The number of stacks to report
+
+        """
+        self.blocked = 0
+        self.interval = interval
+        self.io_loop = io_loop
+        self.max_stacks = max_stacks
+        self.samples = collections.deque(maxlen=SAMPLES)
+        self.stacks = dict()
+        self.threshold = threshold
+        self._deadline = None
+        self._timeout = None
+
+    def as_dict(self):
+        """Return the lag percentiles and the most frequent blocking stacks.
+
+        :rtype: dict
+
+        """
+        values = sorted(self.samples)
+        lag = dict([('p%i' % value, percentile(values, value))
+                    for value in PERCENTILES])
+        lag['max'] = values[-1] if values else 0.0
+        lag['samples'] = len(values)
+        stacks = sorted(self.stacks.items(), key=lambda item: item[1],
+                        reverse=True)[:self.max_stacks]
+        return {'blocked': self.blocked,
+                'lag': lag,
+                'stacks': [{'count': count,
+                            'stack': ['%s:%i in %s' % frame
+                                      for frame in stack]}
+                           for stack, count in stacks],
+                'threshold': self.threshold}
+
+    def on_blocked(self, signum_unused, frame):
+        """Invoked by the IOLoop from a signal handler when a callback has
+        blocked it for longer than the threshold, counting the stack of the
+        blocking code.
+
+        :param int signum_unused: Unused signal number
+        :param frame frame: The frame that was executing
+
+        """
+        self.blocked += 1
+        stack = tuple([(filename, lineno, name) for filename, lineno, name, _
+                       in traceback.extract_stack(frame)])
+        if stack in self.stacks or len(self.stacks) < MAX_TRACKED_STACKS:
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        LOGGER.warning('IOLoop blocked for more than %.2f seconds in %s:%i '
+                       '(%s)', self.threshold, *stack[-1])
+
+    def record(self, lag):
+        """Record a lag sample.
+
+        :param float lag: Seconds the IOLoop was late running a timeout
+
+        """
+        self.samples.append(lag)
+
+    def start(self):
+        """Start sampling the IOLoop lag and capturing blocking stacks. Stack
+        capture is skipped if the IOLoop does not support it.
+
+        """
+        try:
+            self.io_loop.set_blocking_signal_threshold(self.threshold,
+                                                       self.on_blocked)
+        except (NotImplementedError, ValueError) as error:
+            LOGGER.warning('Blocking callback stacks will not be captured: '
+                           '%s', error)
+        self._schedule()
+
+    def stop(self):
+        """Stop sampling the IOLoop lag and capturing blocking stacks."""
+        if self._timeout:
+            self.io_loop.remove_timeout(self._timeout)
+            self._timeout = None
+        try:
+            self.io_loop.set_blocking_signal_threshold(None, None)
+        except (NotImplementedError, ValueError):
+            pass
+
+    def _on_timeout(self):
+        """Record how late the timeout was run and schedule the next one."""
+        self.record(max(0.0, self.io_loop.time() - self._deadline))
+        self._schedule()
+
+    def _schedule(self):
+        """Schedule the next lag sample."""
+        self._deadline = self.io_loop.time() + self.interval
+        self._timeout = self.io_loop.add_timeout(self._deadline,
+                                                 self._on_timeout)